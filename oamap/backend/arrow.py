@@ -32,113 +32,359 @@ import numpy
 
 import oamap.schema
 import oamap.generator
+import oamap.dataset
+import oamap.database
+import oamap.proxy
+import oamap.extension.common
 from oamap.util import OrderedDict
 
-def schema(table):
+# Array names are "column:path:kind", where path is the "/"-separated sequence of child indexes from the column's
+# top-level Arrow type down to the node and kind is "mask", "offsets" (list starts/stops or union offsets), "tags",
+# or "data". Arrow validity bitmaps, offsets, and type ids become oamap masks, starts/stops, and tags directly.
+
+def _arrayname(column, path, kind):
+    return "{0}:{1}:{2}".format(column, "/".join(str(x) for x in path), kind)
+
+def _chop(name):
+    column, path, kind = name.rsplit(":", 2)
+    return column, [int(x) for x in path.split("/") if x != ""], kind
+
+################################################################ Arrow to oamap
+
+def schema(table, namespace=""):
+    return _schema(table.schema, namespace=namespace)
+
+def _schema(arrowschema, namespace=""):
     import pyarrow
-    def recurse(node, name, index, nullable):
-        if isinstance(node, pyarrow.lib.ListType):
-            return oamap.schema.List(recurse(node.value_type, name, index + 2, nullable),
-                                     nullable=nullable,
-                                     starts="{0}/{1}".format(name, index + 1),
-                                     stops="{0}/{1}".format(name, index + 1),
-                                     mask="{0}/{1}".format(name, index))
-        elif isinstance(node, pyarrow.lib.DataType):
-            return oamap.schema.Primitive(node.to_pandas_dtype(),
-                                          nullable=nullable,
-                                          data="{0}/{1}".format(name, index + 1),
-                                          mask="{0}/{1}".format(name, index))
+
+    # unsupported types are left out, as unsupported branches are in the ROOT backend
+    def recurse(tpe, nullable, column, path):
+        mask = _arrayname(column, path, "mask") if nullable else None
+
+        if pyarrow.types.is_list(tpe) or pyarrow.types.is_large_list(tpe):
+            content = recurse(tpe.value_type, tpe.value_field.nullable, column, path + [0])
+            if content is None:
+                return None
+            offsets = _arrayname(column, path, "offsets")
+            return oamap.schema.List(content, nullable=nullable, starts=offsets, stops=offsets, mask=mask, namespace=namespace)
+
+        elif pyarrow.types.is_struct(tpe):
+            fields = OrderedDict()
+            for i in range(tpe.num_fields):
+                field = recurse(tpe[i].type, tpe[i].nullable, column, path + [i])
+                if field is not None:
+                    fields[tpe[i].name] = field
+            if len(fields) == 0:
+                return None
+            return oamap.schema.Record(fields, nullable=nullable, mask=mask, namespace=namespace)
+
+        elif pyarrow.types.is_union(tpe):
+            # Arrow unions have no validity bitmap of their own; their possibilities carry the nulls
+            possibilities = [recurse(tpe[i].type, tpe[i].nullable, column, path + [i]) for i in range(tpe.num_fields)]
+            if len(possibilities) == 0 or any(x is None for x in possibilities):
+                return None
+            return oamap.schema.Union(possibilities, tags=_arrayname(column, path, "tags"), offsets=_arrayname(column, path, "offsets"), namespace=namespace)
+
+        elif pyarrow.types.is_string(tpe) or pyarrow.types.is_binary(tpe) or pyarrow.types.is_large_string(tpe) or pyarrow.types.is_large_binary(tpe):
+            offsets = _arrayname(column, path, "offsets")
+            return oamap.schema.List(oamap.schema.Primitive(numpy.uint8, data=_arrayname(column, path, "data"), namespace=namespace),
+                                     nullable=nullable, starts=offsets, stops=offsets, mask=mask, namespace=namespace,
+                                     name="UTF8String" if pyarrow.types.is_string(tpe) or pyarrow.types.is_large_string(tpe) else "ByteString")
+
+        elif pyarrow.types.is_boolean(tpe) or pyarrow.types.is_integer(tpe) or pyarrow.types.is_floating(tpe):
+            return oamap.schema.Primitive(tpe.to_pandas_dtype(), nullable=nullable, data=_arrayname(column, path, "data"), mask=mask, namespace=namespace)
+
         else:
-            raise NotImplementedError(type(node))
-
-    fields = []
-    for n in table.schema.names:
-        field = table.schema.field_by_name(n)
-        fields.append((n, recurse(field.type, n, 0, field.nullable)))
-    
-    return oamap.schema.List(
-        oamap.schema.Record(OrderedDict(fields)),
-        starts="",
-        stops="")
-
-def proxy(table):
+            return None
+
+    fields = OrderedDict()
+    for field in arrowschema:
+        node = recurse(field.type, field.nullable, field.name, [])
+        if node is not None:
+            fields[field.name] = node
+
+    return oamap.schema.List(oamap.schema.Record(fields, namespace=namespace), namespace=namespace)
+
+def dataset(table, namespace=""):
+    # each record batch is a partition
+    batches = table.to_batches()
+    offsets = [0]
+    for batch in batches:
+        offsets.append(offsets[-1] + batch.num_rows)
+
+    return oamap.dataset.Dataset("arrow",
+                                 schema(table, namespace=namespace),
+                                 {namespace: ArrowBackend(batches, namespace)},
+                                 oamap.dataset.SingleThreadExecutor(),
+                                 offsets)
+
+def ipcdataset(path, namespace=None):
     import pyarrow
-    class _ArrayDict(object):
-        def __init__(self, table):
-            self.table = table
-
-        def chop(self, name):
-            slashindex = name.rindex("/")
-            return name[:slashindex], int(name[slashindex + 1 :])
-
-        def frombuffer(self, chunk, bufferindex):
-            def truncate(array, length, offset=0):
-                return array[:length + offset]
-
-            def mask(index, length):
-                buf = chunk.buffers()[index]
-                if buf is None:
-                    return numpy.arange(length, dtype=oamap.generator.Masked.maskdtype)
-                else:
-                    unmasked = truncate(numpy.unpackbits(numpy.frombuffer(buf, dtype=numpy.uint8)).view(numpy.bool_), length)
-                    mask = numpy.empty(len(unmasked), dtype=oamap.generator.Masked.maskdtype)
-                    mask[unmasked] = numpy.arange(unmasked.sum(), dtype=mask.dtype)
-                    mask[~unmasked] = oamap.generator.Masked.maskedvalue
-                    return mask
-
-            def recurse(tpe, index, length):
-                if isinstance(tpe, pyarrow.lib.ListType):
-                    if index == bufferindex:
-                        # list mask
-                        return mask(index, length)
-                    elif index + 1 == bufferindex:
-                        # list starts
-                        return truncate(numpy.frombuffer(chunk.buffers()[index + 1], dtype=numpy.int32), length, 1)
-                    else:
-                        # descend into list
-                        length = truncate(numpy.frombuffer(chunk.buffers()[index + 1], dtype=numpy.int32), length, 1)[-1]
-                        return recurse(tpe.value_type, index + 2, length)
-
-                elif isinstance(tpe, pyarrow.lib.DataType):
-                    if index == bufferindex:
-                        # data mask
-                        return mask(index, length)
-                    elif index + 1 == bufferindex:
-                        # data
-                        return truncate(numpy.frombuffer(chunk.buffers()[index + 1], dtype=tpe.to_pandas_dtype()), length)
-                    else:
-                        raise AssertionError
+    import pyarrow.ipc
 
-                else:
-                    raise NotImplementedError
-                
-            return recurse(chunk.type, 0, len(chunk))
-
-        def getall(self, names):
-            out = {}
-            for name in names:
-                if len(str(name)) == 0:
-                    if isinstance(name, oamap.generator.StartsRole):
-                        out[name] = numpy.array([0], dtype=oamap.generator.ListGenerator.posdtype)
-                    elif isinstance(name, oamap.generator.StopsRole):
-                        out[name] = numpy.array([self.table.num_rows], dtype=oamap.generator.ListGenerator.posdtype)
-                    else:
-                        raise AssertionError
-
-                elif isinstance(name, oamap.generator.StopsRole):
-                    out[name] = out[name.starts][1:]
+    if namespace is None:
+        namespace = "arrowipc({0})".format(repr(path))
 
-                else:
-                    columnname, bufferindex = self.chop(str(name))
-                    column = self.table[self.table.schema.names.index(columnname)]
-                    chunks = column.data.chunks
-                    if len(chunks) == 0:
-                        raise ValueError("Arrow column {0} has no chunks".format(repr(columnname)))
-                    elif len(chunks) == 1:
-                        out[name] = self.frombuffer(chunks[0], bufferindex)
-                    else:
-                        out[name] = numpy.concatenate([self.frombuffer(chunk, bufferindex) for chunk in chunks])
+    # opening a memory-mapped file reads only its footer and the batches' metadata
+    reader = pyarrow.ipc.open_file(pyarrow.memory_map(path, "r"))
+    offsets = [0]
+    for i in range(reader.num_record_batches):
+        offsets.append(offsets[-1] + reader.get_batch(i).num_rows)
+
+    return oamap.dataset.Dataset(path.split("/")[-1].split(".")[0],
+                                 _schema(reader.schema, namespace=namespace),
+                                 {namespace: ArrowIPCBackend(path, namespace)},
+                                 oamap.dataset.SingleThreadExecutor(),
+                                 offsets,
+                                 metadata={"schemafrom": path})
+
+def proxy(table, namespace="", extension=oamap.extension.common):
+    generator = schema(table, namespace=namespace).generator(extension=extension)
+    return oamap.proxy.ListProxy(generator, ArrowArrays(table), generator._newcache(), 0, 1, table.num_rows)
+
+class ArrowBackend(oamap.database.Backend):
+    # in-memory record batches can't be described in JSON, so this backend can't be put into a persistent Database
+    def __init__(self, batches, namespace=""):
+        self._batches = list(batches)
+        self._namespace = namespace
+
+    @property
+    def args(self):
+        return (tuple(id(x) for x in self._batches),)
+
+    @property
+    def namespace(self):
+        return self._namespace
+
+    @property
+    def batches(self):
+        return self._batches
+
+    def instantiate(self, partitionid):
+        return ArrowArrays(self._batches[partitionid])
+
+class ArrowIPCBackend(oamap.database.Backend):
+    def __init__(self, path, namespace=""):
+        self._path = path
+        self._namespace = namespace
+
+    @property
+    def args(self):
+        return (self._path,)
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "path": self._path}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return ArrowIPCBackend(obj["path"], namespace)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def namespace(self):
+        return self._namespace
+
+    def instantiate(self, partitionid):
+        import pyarrow
+        import pyarrow.ipc
+        # the batch's buffers point into the mapping, so its arrays are views of the file's pages
+        return ArrowArrays(pyarrow.ipc.open_file(pyarrow.memory_map(self._path, "r")).get_batch(partitionid))
+
+class ArrowArrays(object):
+    def __init__(self, source):
+        self._source = source
+        self._columns = {}
+        self._arrays = {}
+
+    @property
+    def source(self):
+        return self._source
 
+    def _read(self, columns):
+        import pyarrow
+        for x in columns:
+            if x not in self._columns:
+                column = self._source.column(self._source.schema.get_field_index(x))
+                if isinstance(column, pyarrow.ChunkedArray):
+                    column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+                self._columns[x] = column
+
+    @staticmethod
+    def _extract(array, path, kind):
+        import pyarrow
+
+        for index in path:
+            if isinstance(array, (pyarrow.ListArray, pyarrow.LargeListArray)):
+                array = array.values
+            else:
+                array = array.field(index)
+
+        if kind == "mask":
+            out = numpy.arange(len(array), dtype=oamap.generator.Masked.maskdtype)
+            if array.null_count > 0:
+                out[~array.is_valid().to_numpy(zero_copy_only=False)] = oamap.generator.Masked.maskedvalue
             return out
 
-    return schema(table)(_ArrayDict(table))
+        elif kind == "tags":
+            # Arrow type codes are arbitrary small integers; oamap tags are indexes into the possibilities
+            typecodes = numpy.frombuffer(array.buffers()[1], dtype=numpy.int8)[array.offset : array.offset + len(array)]
+            lookup = numpy.zeros(128, dtype=oamap.generator.UnionGenerator.tagdtype)
+            lookup[array.type.type_codes] = numpy.arange(len(array.type.type_codes))
+            return lookup[typecodes]
+
+        elif kind == "offsets":
+            if isinstance(array, (pyarrow.ListArray, pyarrow.LargeListArray)):
+                return array.offsets.to_numpy()
+            elif isinstance(array, pyarrow.UnionArray):
+                if array.type.mode == "sparse":
+                    return numpy.arange(len(array), dtype=oamap.generator.UnionGenerator.offsetdtype)
+                else:
+                    return numpy.frombuffer(array.buffers()[2], dtype=numpy.int32)[array.offset : array.offset + len(array)]
+            else:
+                dtype = numpy.int64 if pyarrow.types.is_large_string(array.type) or pyarrow.types.is_large_binary(array.type) else numpy.int32
+                return numpy.frombuffer(array.buffers()[1], dtype=dtype)[array.offset : array.offset + len(array) + 1]
+
+        elif kind == "data":
+            if isinstance(array, (pyarrow.StringArray, pyarrow.BinaryArray, pyarrow.LargeStringArray, pyarrow.LargeBinaryArray)):
+                return numpy.frombuffer(array.buffers()[2], dtype=numpy.uint8)
+            if pyarrow.types.is_boolean(array.type):
+                # Arrow bit-packs booleans; masked entries are never read, so any value will do
+                if array.null_count > 0:
+                    array = array.fill_null(False)
+                return array.to_numpy(zero_copy_only=False)
+            else:
+                # a view of the values buffer, whether or not some entries are masked
+                return numpy.frombuffer(array.buffers()[1], dtype=array.type.to_pandas_dtype())[array.offset : array.offset + len(array)]
+
+        else:
+            raise ValueError("unrecognized Arrow array kind {0}".format(repr(kind)))
+
+    def getall(self, roles):
+        chopped = dict((role, _chop(str(role))) for role in roles)
+        self._read(set(column for column, path, kind in chopped.values()))
+
+        out = {}
+        for role, (column, path, kind) in chopped.items():
+            # derived arrays (masks especially) are computed once per partition
+            key = (column, tuple(path), kind)
+            array = self._arrays.get(key, None)
+            if array is None:
+                array = self._arrays[key] = self._extract(self._columns[column], path, kind)
+
+            if isinstance(role, oamap.generator.StartsRole):
+                out[role] = array[:-1]
+            elif isinstance(role, oamap.generator.StopsRole):
+                out[role] = array[1:]
+            else:
+                out[role] = array
+        return out
+
+    def close(self):
+        self._columns = {}
+        self._arrays = {}
+
+################################################################ oamap to Arrow
+
+def toarrow(listproxy):
+    import pyarrow
+
+    if not isinstance(listproxy, oamap.proxy.ListProxy):
+        raise TypeError("only ListProxies can be exported as Arrow Tables, not {0}".format(type(listproxy)))
+
+    generator = listproxy._generator
+    if isinstance(generator, oamap.generator.ExtendedGenerator):
+        generator = generator.generic
+    if not isinstance(generator.content, oamap.generator.RecordGenerator):
+        raise TypeError("only lists of records can be exported as Arrow Tables")
+
+    content = _toarrow(generator.content, listproxy._arrays, listproxy._cache)
+    if listproxy._stride == 1:
+        content = content.slice(listproxy._whence, listproxy._length)
+    else:
+        content = content.take(pyarrow.array(listproxy._whence + listproxy._stride*numpy.arange(listproxy._length)))
+
+    # the top-level records are never masked, so their fields can be taken as they are
+    return pyarrow.Table.from_arrays([content.field(i) for i in range(content.type.num_fields)], names=[x.name for x in content.type])
+
+def _compact(starts, stops):
+    # offsets and content indexes that make arbitrary starts/stops contiguous
+    counts = stops - starts
+    offsets = numpy.empty(len(counts) + 1, dtype=numpy.int32)
+    offsets[0] = 0
+    numpy.cumsum(counts, out=offsets[1:])
+    indexes = numpy.arange(offsets[-1], dtype=numpy.int64) - numpy.repeat(offsets[:-1] - starts, counts)
+    return offsets, indexes
+
+def _toarrow(generator, arrays, cache, masked=True):
+    import pyarrow
+
+    generic = generator.generic if isinstance(generator, oamap.generator.ExtendedGenerator) else generator
+    if masked and isinstance(generic, oamap.generator.Masked):
+        mask = generic._getmask(arrays, cache)
+        valid = (mask != generic.maskedvalue)
+
+        if isinstance(generator, oamap.generator.PrimitiveGenerator):
+            data = generator._getdata(arrays, cache)
+            if len(data) >= len(mask) and (mask[valid] == numpy.nonzero(valid)[0]).all():
+                # masked entries have their own slots in the data, as in Arrow: only the validity bitmap is new
+                return pyarrow.array(data[:len(mask)], mask=~valid)
+            else:
+                return pyarrow.array(data[numpy.where(valid, mask, 0)], mask=~valid)
+
+        else:
+            return _toarrow(generator, arrays, cache, masked=False).take(pyarrow.array(mask, mask=~valid))
+
+    if isinstance(generator, oamap.generator.ExtendedGenerator):
+        if generator.name in ("UTF8String", "ByteString"):
+            starts, stops = generator.generic._getstartsstops(arrays, cache)
+            data = generator.generic.content._getdata(arrays, cache)
+            if len(starts) == 0 or (starts[1:] == stops[:-1]).all():
+                offsets = numpy.append(starts, stops[-1:] if len(stops) > 0 else [0]).astype(numpy.int32)
+            else:
+                offsets, indexes = _compact(starts, stops)
+                data = data[indexes]
+            cls = pyarrow.StringArray if generator.name == "UTF8String" else pyarrow.BinaryArray
+            return cls.from_buffers(len(starts), pyarrow.py_buffer(offsets), pyarrow.py_buffer(numpy.ascontiguousarray(data)))
+        else:
+            return _toarrow(generator.generic, arrays, cache, masked=masked)
+
+    elif isinstance(generator, oamap.generator.PrimitiveGenerator):
+        # zero-copy for numeric types; Arrow bit-packs booleans
+        return pyarrow.array(generator._getdata(arrays, cache))
+
+    elif isinstance(generator, oamap.generator.ListGenerator):
+        starts, stops = generator._getstartsstops(arrays, cache)
+        content = _toarrow(generator.content, arrays, cache)
+        if len(starts) == 0 or (starts[1:] == stops[:-1]).all():
+            offsets = numpy.append(starts, stops[-1:] if len(stops) > 0 else [0]).astype(numpy.int32)
+        else:
+            offsets, indexes = _compact(starts, stops)
+            content = content.take(pyarrow.array(indexes))
+        return pyarrow.ListArray.from_arrays(pyarrow.array(offsets), content)
+
+    elif isinstance(generator, oamap.generator.UnionGenerator):
+        tags, offsets = generator._gettagsoffsets(arrays, cache)
+        possibilities = [_toarrow(x, arrays, cache) for x in generator.possibilities]
+        return pyarrow.UnionArray.from_dense(pyarrow.array(tags, type=pyarrow.int8()), pyarrow.array(offsets, type=pyarrow.int32()), possibilities)
+
+    elif isinstance(generator, (oamap.generator.RecordGenerator, oamap.generator.TupleGenerator)):
+        if isinstance(generator, oamap.generator.RecordGenerator):
+            names = list(generator.fields.keys())
+            fields = [_toarrow(x, arrays, cache) for x in generator.fields.values()]
+        else:
+            names = [str(i) for i in range(len(generator.types))]
+            fields = [_toarrow(x, arrays, cache) for x in generator.types]
+        if len(fields) == 0:
+            raise TypeError("records and tuples without fields cannot be exported to Arrow")
+        length = min(len(x) for x in fields)
+        return pyarrow.StructArray.from_arrays([x.slice(0, length) if len(x) != length else x for x in fields], names=names)
+
+    elif isinstance(generator, oamap.generator.PointerGenerator):
+        raise TypeError("pointers cannot be exported to Arrow")
+
+    else:
+        raise AssertionError(generator)
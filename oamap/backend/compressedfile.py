@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import struct
+
+import numpy
+
+import oamap.database
+import oamap.fillable
+
+class CompressedFileBackend(oamap.database.FilesystemBackend):
+    def __init__(self, directory, compression="zlib", level=None, chunksize=65536):
+        super(CompressedFileBackend, self).__init__(directory, arraysuffix=".oaz")
+        oamap.fillable.compressor(compression, level)   # fail early if the algorithm is not available
+        self._compression = compression
+        self._level = level
+        self._chunksize = chunksize
+
+    @property
+    def args(self):
+        return (self._directory, self._compression, self._level, self._chunksize)
+
+    @property
+    def compression(self):
+        return self._compression
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "directory": self._directory,
+                "compression": self._compression,
+                "level": self._level,
+                "chunksize": self._chunksize}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return CompressedFileBackend(obj["directory"], compression=obj.get("compression", "zlib"), level=obj.get("level", None), chunksize=obj.get("chunksize", 65536))
+
+    def instantiate(self, partitionid):
+        return CompressedArrays(lambda name: self.fullname(partitionid, name, create=False),
+                                lambda name: self.fullname(partitionid, name, create=True),
+                                self._compression, self._level, self._chunksize)
+
+class CompressedArrays(object):
+    def __init__(self, loadname, storename, compression, level, chunksize):
+        self._loadname = loadname
+        self._storename = storename
+        self._compression = compression
+        self._level = level
+        self._chunksize = chunksize
+
+    def __getitem__(self, name):
+        return CompressedFile(self._loadname(name))[:]
+
+    def __setitem__(self, name, value):
+        value = numpy.asarray(value)
+        with oamap.fillable.FillableCompressedFile(self._storename(name), value.dtype, chunksize=self._chunksize, compression=self._compression, level=self._level) as fillable:
+            fillable.extend(value)
+            fillable.update()
+
+class CompressedFile(object):
+    # read-only, random-access view of a file written by oamap.fillable.FillableCompressedFile
+    def __init__(self, filename):
+        magic = oamap.fillable.FillableCompressedFile.magic
+        with open(filename, "rb") as file:
+            if file.read(len(magic)) != magic:
+                raise ValueError("not an oamap compressed file: {0}".format(repr(filename)))
+            file.seek(-(8 + len(magic)), 2)
+            indexsize, = struct.unpack("<Q", file.read(8))
+            if file.read(len(magic)) != magic:
+                raise ValueError("oamap compressed file is truncated (no index): {0}".format(repr(filename)))
+            file.seek(-(indexsize + 8 + len(magic)), 2)
+            index = json.loads(file.read(indexsize).decode("ascii"))
+
+        self._filename = filename
+        self._dtype = numpy.dtype(index["dtype"])
+        self._chunksize = index["chunksize"]
+        self._compression = index["compression"]
+        self._len = index["length"]
+        self._offsets = index["offsets"]
+        self._decompress = oamap.fillable.compressor(self._compression)[1]
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    @property
+    def compression(self):
+        return self._compression
+
+    @property
+    def numchunks(self):
+        return len(self._offsets) - 1
+
+    def __len__(self):
+        return self._len
+
+    def _getchunk(self, chunkindex):
+        with open(self._filename, "rb") as file:
+            file.seek(self._offsets[chunkindex])
+            return numpy.frombuffer(self._decompress(file.read(self._offsets[chunkindex + 1] - self._offsets[chunkindex])), dtype=self._dtype)
+
+    def __getitem__(self, index):
+        return oamap.fillable._getchunked(index, self._len, self._chunksize, self._getchunk, self._dtype)
+
+    def __array__(self, dtype=None):
+        out = self[:]
+        if dtype is not None:
+            out = out.astype(dtype)
+        return out
+
+class CompressedFileDatabase(oamap.database.FilesystemDatabase):
+    def __init__(self, directory, namespace="", compression="zlib", level=None, chunksize=65536):
+        super(CompressedFileDatabase, self).__init__(directory, backends={namespace: CompressedFileBackend(directory, compression=compression, level=level, chunksize=chunksize)}, namespace=namespace)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import numbers
+
+import numpy
+
+import oamap.schema
+import oamap.database
+import oamap.proxy
+import oamap.extension.common
+from oamap.util import OrderedDict
+
+################################################################ reading existing files
+
+def schema(path, grouppath="/", namespace=""):
+    import h5py
+    with h5py.File(path, "r") as file:
+        return _schema(file[grouppath], namespace=namespace)
+
+def _schema(group, namespace=""):
+    import h5py
+
+    # one-dimensional datasets of a group are the fields of a Record; subgroups are nested Records
+    def recurse(node):
+        out = oamap.schema.Record(OrderedDict(), namespace=namespace)
+        for name in sorted(node.keys()):
+            child = node[name]
+            if isinstance(child, h5py.Group):
+                subrecord = recurse(child)
+                if len(subrecord.fields) > 0:
+                    out[name] = subrecord
+            elif isinstance(child, h5py.Dataset) and len(child.shape) == 1 and child.dtype.names is None:
+                out[name] = oamap.schema.Primitive(child.dtype, data=child.name, namespace=namespace)
+        return out
+
+    return oamap.schema.List(recurse(group), namespace=namespace)
+
+def proxy(path, grouppath="/", namespace="", extension=oamap.extension.common):
+    import h5py
+    file = h5py.File(path, "r")
+    group = file[grouppath]
+    schema = _schema(group, namespace=namespace)
+
+    lengths = set(len(x) for x in _datasets(group))
+    if len(lengths) > 1:
+        raise ValueError("datasets in HDF5 group {0} have different lengths: {1}".format(repr(grouppath), sorted(lengths)))
+    numentries = lengths.pop() if len(lengths) == 1 else 0
+
+    generator = schema.generator(extension=extension)
+    return oamap.proxy.ListProxy(generator, HDF5Arrays(file, None), generator._newcache(), 0, 1, numentries)
+
+def _datasets(group):
+    import h5py
+    for child in group.values():
+        if isinstance(child, h5py.Group):
+            for x in _datasets(child):
+                yield x
+        elif isinstance(child, h5py.Dataset) and len(child.shape) == 1 and child.dtype.names is None:
+            yield child
+
+################################################################ HDF5Backend
+
+class HDF5Backend(oamap.database.WritableBackend):
+    # HDF5 files have one writer at a time: use this backend with a single-threaded executor
+    def __init__(self, path, compression=None, level=None, chunksize=65536):
+        if compression not in (None, "gzip", "lzf", "szip"):
+            raise ValueError("compression must be None, 'gzip', 'lzf', or 'szip', not {0}".format(repr(compression)))
+        if not isinstance(chunksize, (numbers.Integral, numpy.integer)) or chunksize <= 0:
+            raise ValueError("chunksize must be a positive integer, not {0}".format(repr(chunksize)))
+        self._path = path
+        self._compression = compression
+        self._level = level
+        self._chunksize = chunksize
+
+    @property
+    def args(self):
+        return (self._path, self._compression, self._level, self._chunksize)
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "path": self._path,
+                "compression": self._compression,
+                "level": self._level,
+                "chunksize": self._chunksize}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return HDF5Backend(obj["path"], compression=obj.get("compression", None), level=obj.get("level", None), chunksize=obj.get("chunksize", 65536))
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def compression(self):
+        return self._compression
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def chunksize(self):
+        return self._chunksize
+
+    def prefix(self, dataset):
+        return dataset + "/obj"
+
+    def instantiate(self, partitionid):
+        return HDF5Arrays(None, str(partitionid), self)
+
+    # each partition is a group of datasets' groups of arrays; derived datasets refer to their sources'
+    # arrays by name, so an array is reference-counted with an attribute and removed when nothing uses it
+    def incref(self, dataset, partitionid, arrayname):
+        import h5py
+        with h5py.File(self._path, "a") as file:
+            partition = file.require_group(str(partitionid))
+            if arrayname in partition:
+                node = partition[arrayname]
+                node.attrs["refcount"] = node.attrs.get("refcount", 0) + 1
+
+    def decref(self, dataset, partitionid, arrayname):
+        import h5py
+        with h5py.File(self._path, "a") as file:
+            partition = file.get(str(partitionid), None)
+            if partition is None or arrayname not in partition:
+                return
+            node = partition[arrayname]
+            refcount = node.attrs.get("refcount", 0) - 1
+            if refcount > 0:
+                node.attrs["refcount"] = refcount
+            else:
+                parent = node.parent
+                del partition[arrayname]
+                while parent.name != "/" and len(parent) == 0:
+                    grandparent = parent.parent
+                    del file[parent.name]
+                    parent = grandparent
+
+class HDF5Arrays(object):
+    # an open file (as from proxy) is kept until close(); a backend's file is opened per call instead,
+    # read-only for getall and appendable only for putall, so no handle outlives the call that needs it
+    def __init__(self, file, partition, backend=None):
+        self._file = file
+        self._partition = partition
+        self._backend = backend
+
+    @property
+    def file(self):
+        return self._file
+
+    @contextlib.contextmanager
+    def _group(self, mode):
+        if self._file is not None:
+            if self._partition is None:
+                yield self._file
+            elif mode == "r":
+                yield self._file[self._partition]
+            else:
+                yield self._file.require_group(self._partition)
+        else:
+            import h5py
+            with h5py.File(self._backend.path, mode) as file:
+                if mode == "r":
+                    yield file[self._partition]
+                else:
+                    yield file.require_group(self._partition)
+
+    def getall(self, roles):
+        # one open file for all requested arrays; each dataset is read straight into its final array
+        out = {}
+        with self._group("r") as group:
+            for role in roles:
+                dataset = group[str(role)]
+                array = numpy.empty(dataset.shape, dtype=dataset.dtype)
+                if array.size > 0:
+                    dataset.read_direct(array)
+                out[role] = array
+        return out
+
+    def __getitem__(self, name):
+        return self.getall([name])[name]
+
+    def putall(self, roles2arrays):
+        with self._group("a") as group:
+            for name, array in roles2arrays.items():
+                self._write(group, str(name), array)
+
+    def __setitem__(self, name, value):
+        self.putall({name: value})
+
+    def _write(self, group, name, value):
+        value = numpy.ascontiguousarray(value)
+        if name in group:
+            del group[name]
+        compression, level, chunksize = None, None, None
+        if self._backend is not None:
+            compression, level, chunksize = self._backend.compression, self._backend.level, self._backend.chunksize
+        if value.size == 0 or (compression is None and chunksize is None):
+            group.create_dataset(name, data=value)
+        else:
+            chunks = (min(chunksize, len(value)),) + value.shape[1:]
+            group.create_dataset(name, data=value, chunks=chunks, compression=compression, compression_opts=level)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -33,36 +33,66 @@ import numpy
 import oamap.database
 
 class NumpyFileBackend(oamap.database.FilesystemBackend):
-    def __init__(self, directory):
-        super(NumpyFileBackend, self).__init__(directory, arraysuffix=".npy")
+    def __init__(self, directory, dedup=False, mmap_mode=None):
+        super(NumpyFileBackend, self).__init__(directory, arraysuffix=".npy", dedup=dedup)
+        if mmap_mode not in (None, "r", "c"):
+            raise ValueError("mmap_mode must be None (read arrays into memory), 'r' (read-only map), or 'c' (copy-on-write map), not {0}".format(repr(mmap_mode)))
+        self._mmap_mode = mmap_mode
+
+    @property
+    def mmap_mode(self):
+        return self._mmap_mode
 
     @property
     def args(self):
-        return (self._directory,)
+        return (self._directory, self._dedup, self._mmap_mode)
 
     def tojson(self):
         return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
-                "directory": self._directory}
+                "directory": self._directory,
+                "dedup": self._dedup,
+                "mmap_mode": self._mmap_mode}
 
     @staticmethod
     def fromjson(obj, namespace):
-        return NumpyFileBackend(obj["directory"])
+        return NumpyFileBackend(obj["directory"], dedup=obj.get("dedup", False), mmap_mode=obj.get("mmap_mode", None))
 
     def instantiate(self, partitionid):
         return NumpyArrays(lambda name: self.fullname(partitionid, name, create=False),
-                           lambda name: self.fullname(partitionid, name, create=True))
+                           lambda name: self.fullname(partitionid, name, create=True),
+                           self.store,
+                           self._mmap_mode)
 
 class NumpyArrays(object):
-    def __init__(self, loadname, storename):
+    def __init__(self, loadname, storename, store=None, mmap_mode=None):
         self._loadname = loadname
         self._storename = storename
+        self._store = store
+        self._mmap_mode = mmap_mode
+
+    def _load(self, name):
+        # with a mmap_mode, pages are only read as the proxies touch them
+        return numpy.load(self._loadname(name), mmap_mode=self._mmap_mode)
+
+    def getall(self, roles):
+        # each array is its own .npy file, so there's nothing to share between them: this is the same as loading
+        # them one by one, and is here so that readers can ask for a partition's arrays all at once
+        return dict((n, self._load(str(n))) for n in roles)
 
     def __getitem__(self, name):
-        return numpy.load(self._loadname(name))
+        return self._load(name)
+
+    def putall(self, roles2arrays):
+        for n, x in roles2arrays.items():
+            self[str(n)] = x
 
     def __setitem__(self, name, value):
-        numpy.save(self._storename(name), value)
+        if self._store is None:
+            numpy.save(self._storename(name), value)
+        else:
+            value = numpy.asarray(value)
+            self._store(self._storename(name), value, lambda filename: numpy.save(filename, value))
 
 class NumpyFileDatabase(oamap.database.FilesystemDatabase):
-    def __init__(self, directory, namespace=""):
-        super(NumpyFileDatabase, self).__init__(directory, backends={namespace: NumpyFileBackend(directory)}, namespace=namespace)
+    def __init__(self, directory, namespace="", dedup=False, mmap_mode=None):
+        super(NumpyFileDatabase, self).__init__(directory, backends={namespace: NumpyFileBackend(directory, dedup=dedup, mmap_mode=mmap_mode)}, namespace=namespace)
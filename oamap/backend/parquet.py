@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import glob
+
+import oamap.dataset
+import oamap.database
+import oamap.proxy
+import oamap.extension.common
+import oamap.backend.arrow
+
+# Array names follow oamap.backend.arrow: the Parquet reader turns definition and repetition levels into Arrow
+# validity bitmaps and offsets, which become oamap masks and starts/stops without assembling any rows.
+
+def dataset(path, namespace=None):
+    import pyarrow.parquet
+
+    if namespace is None:
+        namespace = "parquet({0})".format(repr(path))
+
+    paths = sorted(glob.glob(path))
+    if len(paths) == 0:
+        raise ValueError("path {0} matched no Parquet files".format(repr(path)))
+
+    # each row group is a partition
+    offsets = [0]
+    rowgroups = []
+    for i, x in enumerate(paths):
+        metadata = pyarrow.parquet.ParquetFile(x).metadata
+        for j in range(metadata.num_row_groups):
+            offsets.append(offsets[-1] + metadata.row_group(j).num_rows)
+            rowgroups.append((i, j))
+
+    return oamap.dataset.Dataset(paths[0].split("/")[-1].split(".")[0],
+                                 schema(paths[0], namespace=namespace),
+                                 {namespace: ParquetBackend(paths, rowgroups, namespace)},
+                                 oamap.dataset.SingleThreadExecutor(),
+                                 offsets,
+                                 extension=None,
+                                 packing=None,
+                                 doc=None,
+                                 metadata={"schemafrom": paths[0]})
+
+def proxy(path, namespace="", extension=oamap.extension.common):
+    import pyarrow.parquet
+    file = pyarrow.parquet.ParquetFile(path)
+    generator = schema(path, namespace=namespace).generator(extension=extension)
+    return oamap.proxy.ListProxy(generator, ParquetArrays(file, None), generator._newcache(), 0, 1, file.metadata.num_rows)
+
+def schema(path, namespace=""):
+    import pyarrow.parquet
+    return oamap.backend.arrow._schema(pyarrow.parquet.ParquetFile(path).schema_arrow, namespace=namespace)
+
+################################################################ ParquetBackend
+
+class ParquetBackend(oamap.database.Backend):
+    def __init__(self, paths, rowgroups, namespace):
+        self._paths = tuple(paths)
+        self._rowgroups = tuple(tuple(x) for x in rowgroups)
+        self._namespace = namespace
+
+    @property
+    def args(self):
+        return (self._paths, self._rowgroups)
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "paths": list(self._paths),
+                "rowgroups": [list(x) for x in self._rowgroups]}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return ParquetBackend(obj["paths"], obj["rowgroups"], namespace)
+
+    @property
+    def namespace(self):
+        return self._namespace
+
+    def instantiate(self, partitionid):
+        import pyarrow.parquet
+        pathindex, rowgroup = self._rowgroups[partitionid]
+        return ParquetArrays(pyarrow.parquet.ParquetFile(self._paths[pathindex]), rowgroup)
+
+class ParquetArrays(oamap.backend.arrow.ArrowArrays):
+    def __init__(self, file, rowgroup):
+        super(ParquetArrays, self).__init__(None)
+        self._file = file
+        self._rowgroup = rowgroup
+
+    @property
+    def file(self):
+        return self._file
+
+    @property
+    def rowgroup(self):
+        return self._rowgroup
+
+    def _read(self, columns):
+        # only the requested columns are decoded, each once per row group
+        columns = [x for x in columns if x not in self._columns]
+        if len(columns) > 0:
+            if self._rowgroup is None:
+                table = self._file.read(columns=columns)
+            else:
+                table = self._file.read_row_group(self._rowgroup, columns=columns)
+            for x in columns:
+                self._columns[x] = table.column(x).combine_chunks()
+
+    def close(self):
+        super(ParquetArrays, self).close()
+        self._file = None
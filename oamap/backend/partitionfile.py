@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import mmap
+import os
+import struct
+import uuid
+
+import numpy
+
+import oamap.database
+import oamap.dataset
+
+# file layout: magic, 8-byte header size, JSON header {arrayname: {"offset", "dtype", "shape"}}, aligned array data
+magic = b"oamapP01"
+alignment = 64
+
+class PartitionFileBackend(oamap.database.FilesystemBackend):
+    def __init__(self, directory):
+        super(PartitionFileBackend, self).__init__(directory, arraysuffix=".oap")
+
+    @property
+    def args(self):
+        return (self._directory,)
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "directory": self._directory}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return PartitionFileBackend(obj["directory"])
+
+    def instantiate(self, partitionid):
+        return PartitionFileArrays(self, partitionid)
+
+    # all arrays of a partition share one file, so references are counted per file: the directory
+    # <partitionid>.oap.refs holds an empty marker file for each other dataset that uses its arrays, so that adding
+    # or removing a reference is a single atomic create or unlink, and the file outlives its own dataset until
+    # that directory is empty
+
+    def refsname(self, dataset, partitionid):
+        return self.partitionname(dataset, partitionid) + ".refs"
+
+    def _readrefs(self, dataset, partitionid):
+        try:
+            return sorted(os.listdir(self.refsname(dataset, partitionid)))
+        except OSError:
+            return []
+
+    def incref(self, dataset, partitionid, arrayname):
+        otherdataset, array = PartitionFileArrays._split(arrayname)
+        if otherdataset != dataset:
+            refsname = self.refsname(otherdataset, partitionid)
+            if not os.path.exists(refsname):
+                try:
+                    os.mkdir(refsname)
+                except OSError:
+                    if not os.path.isdir(refsname):
+                        raise
+            open(os.path.join(refsname, dataset), "w").close()
+
+    def decref(self, dataset, partitionid, arrayname):
+        otherdataset, array = PartitionFileArrays._split(arrayname)
+        if otherdataset != dataset:
+            try:
+                os.unlink(os.path.join(self.refsname(otherdataset, partitionid), dataset))
+            except OSError:
+                pass
+            if not os.path.exists(os.path.join(self._directory, "data", otherdataset, "dataset.json")):
+                # possibly the last reference to a deleted dataset's partition
+                self.release(otherdataset, partitionid)
+
+    def release(self, dataset, partitionid):
+        # remove a partition file that no dataset uses anymore (and its dataset's directory, if that was the last)
+        if len(self._readrefs(dataset, partitionid)) == 0:
+            filename = self.partitionname(dataset, partitionid)
+            if os.path.exists(filename):
+                os.unlink(filename)
+            directories = [self.refsname(dataset, partitionid), os.path.join(self._directory, "data", dataset)]
+            if os.path.dirname(dataset) != "":
+                directories.append(os.path.join(self._directory, "data", os.path.dirname(dataset)))
+            for directory in directories:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+
+    def partitionname(self, dataset, partitionid, create=False):
+        directory = os.path.join(self._directory, "data", dataset)
+        if create and not os.path.exists(directory):
+            try:
+                os.mkdir(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        return os.path.join(directory, str(partitionid)) + self._arraysuffix
+
+class PartitionFile(object):
+    def __init__(self, filename):
+        with open(filename, "rb") as file:
+            if file.read(len(magic)) != magic:
+                raise ValueError("not an oamap partition file: {0}".format(repr(filename)))
+            headersize, = struct.unpack("<Q", file.read(8))
+            self._header = json.loads(file.read(headersize).decode("ascii"))
+            # one mapping for the whole partition; arrays are views into it
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._filename = filename
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def keys(self):
+        return self._header.keys()
+
+    def __contains__(self, name):
+        return name in self._header
+
+    def __getitem__(self, name):
+        try:
+            info = self._header[name]
+        except KeyError:
+            raise KeyError("array {0} not found in partition file {1}".format(repr(name), repr(self._filename)))
+        dtype = numpy.dtype(info["dtype"])
+        shape = tuple(info["shape"])
+        count = int(numpy.prod(shape))
+        if count == 0:
+            return numpy.empty(shape, dtype=dtype)
+        else:
+            return numpy.frombuffer(self._mmap, dtype=dtype, count=count, offset=info["offset"]).reshape(shape)
+
+    @staticmethod
+    def write(filename, arrays):
+        arrays = [(n, numpy.ascontiguousarray(x)) for n, x in arrays.items()]
+
+        # the header's size depends on the offsets, which depend on the header's size: lay out the data with room to spare
+        def layout(datastart):
+            header = {}
+            offset = datastart
+            for n, x in arrays:
+                offset = (offset + alignment - 1) // alignment * alignment
+                header[n] = {"offset": offset, "dtype": x.dtype.str, "shape": list(x.shape)}
+                offset += x.nbytes
+            return header
+
+        datastart = alignment
+        while True:
+            header = json.dumps(layout(datastart)).encode("ascii")
+            if len(magic) + 8 + len(header) <= datastart:
+                break
+            datastart = (len(magic) + 8 + len(header) + alignment - 1) // alignment * alignment
+        offsets = json.loads(header.decode("ascii"))
+
+        # write under a private name and rename into place, so that readers never see a partial file
+        tmp = "{0}.{1}.tmp".format(filename, os.getpid())
+        with open(tmp, "wb") as file:
+            file.write(magic)
+            file.write(struct.pack("<Q", len(header)))
+            file.write(header)
+            for n, x in arrays:
+                file.seek(offsets[n]["offset"])
+                file.write(x.tostring())
+        os.rename(tmp, filename)
+
+class PartitionFileArrays(object):
+    def __init__(self, backend, partitionid):
+        self._backend = backend
+        self._partitionid = partitionid
+        self._files = {}
+
+    @staticmethod
+    def _split(name):
+        dataset_part, array = os.path.split(name)
+        dataset, part = os.path.split(dataset_part)
+        return dataset, array
+
+    def _file(self, dataset):
+        out = self._files.get(dataset, None)
+        if out is None:
+            out = self._files[dataset] = PartitionFile(self._backend.partitionname(dataset, self._partitionid))
+        return out
+
+    def getall(self, roles):
+        out = {}
+        for n in roles:
+            dataset, array = self._split(str(n))
+            out[n] = self._file(dataset)[array]
+        return out
+
+    def __getitem__(self, name):
+        dataset, array = self._split(name)
+        return self._file(dataset)[array]
+
+    def putall(self, roles2arrays):
+        bydataset = {}
+        for n, x in roles2arrays.items():
+            dataset, array = self._split(str(n))
+            bydataset.setdefault(dataset, {})[array] = x
+
+        for dataset, arrays in bydataset.items():
+            filename = self._backend.partitionname(dataset, self._partitionid, create=True)
+            if os.path.exists(filename):
+                # a partition is normally written all at once, but arrays added later are merged into the same file
+                old = PartitionFile(filename)
+                refs = self._backend._readrefs(dataset, self._partitionid)
+                overwritten = [n for n in arrays if n in old]
+                if len(refs) > 0 and len(overwritten) > 0:
+                    raise ValueError("arrays {0} of partition {1} of dataset {2} are still used by datasets {3}; delete those before overwriting them".format(", ".join(repr(x) for x in overwritten), self._partitionid, repr(dataset), ", ".join(repr(x) for x in refs)))
+                arrays = dict([(n, old[n]) for n in old.keys() if n not in arrays] + list(arrays.items()))
+            PartitionFile.write(filename, arrays)
+            self._files.pop(dataset, None)
+
+    def __setitem__(self, name, value):
+        # rewrites the whole partition file for one array: writers should use putall
+        self.putall({name: value})
+
+    def close(self):
+        # arrays handed out may still be views of the mappings, so let them close when those are released
+        self._files = {}
+
+class PartitionFileDatabase(oamap.database.FilesystemDatabase):
+    def __init__(self, directory, namespace=""):
+        super(PartitionFileDatabase, self).__init__(directory, backends={namespace: PartitionFileBackend(directory)}, namespace=namespace)
+        self._replaced = {}
+
+    def put(self, dataset, value, namespace=None):
+        try:
+            self._replaced[dataset] = self.get(dataset, timeout=0)
+        except KeyError:
+            self._replaced.pop(dataset, None)
+        super(PartitionFileDatabase, self).put(dataset, value, namespace=namespace)
+
+    def _written(self, data):
+        # a replaced dataset gives up the references that the new one doesn't take over (references are per file,
+        # so one is kept if the new dataset uses any array of the same partition file)
+        old = self._replaced.pop(data.name, None)
+        self._incref(data)
+        if old is not None:
+            keep = set(self._referencedfile(x) for x in self._references(data))
+            for namespace, partitionid, arrayname in self._references(old):
+                if self._referencedfile((namespace, partitionid, arrayname)) not in keep:
+                    self._backends[namespace].decref(old.name, partitionid, arrayname)
+
+    def _referencedfile(self, reference):
+        namespace, partitionid, arrayname = reference
+        if isinstance(self._backends[namespace], PartitionFileBackend):
+            return namespace, partitionid, PartitionFileArrays._split(arrayname)[0]
+        else:
+            return reference
+
+    def delete(self, dataset):
+        ds = self.get(dataset, timeout=0)
+        self._decref(ds)
+
+        self._pending.pop(dataset, None)
+        self._dscache.pop(dataset, None)
+        datasetdir = os.path.join(self._datadir(), dataset)
+        os.unlink(os.path.join(datasetdir, "dataset.json"))
+
+        # partition files that other datasets still use are moved to a tombstone name (unlisted) and those datasets
+        # are pointed there, so that a new dataset with this name starts clean; they go with their last reference
+        tombstone = os.path.join(".orphans", "{0}.{1}".format(dataset, uuid.uuid4().hex))
+        referrers = {}
+        for namespace in set(node.namespace for node in ds.schema.nodes()):
+            backend = self._backends.get(namespace, None)
+            if isinstance(backend, PartitionFileBackend):
+                for partitionid in range(ds.numpartitions if isinstance(ds, oamap.dataset.Dataset) else 1):
+                    refs = backend._readrefs(dataset, partitionid)
+                    if len(refs) == 0:
+                        backend.release(dataset, partitionid)
+                    else:
+                        directory = os.path.join(backend.directory, "data", tombstone)
+                        if not os.path.exists(directory):
+                            os.makedirs(directory)
+                        os.rename(backend.refsname(dataset, partitionid), backend.refsname(tombstone, partitionid))
+                        os.rename(backend.partitionname(dataset, partitionid), backend.partitionname(tombstone, partitionid))
+                        referrers.setdefault(namespace, set()).update(refs)
+
+        for namespace, names in referrers.items():
+            for name in names:
+                self._repoint(name, namespace, dataset, tombstone)
+
+        try:
+            os.rmdir(datasetdir)
+        except OSError:
+            pass
+        self._touch(self._datadir())
+
+    def _repoint(self, dataset, namespace, source, tombstone):
+        # rename a dataset's references to the source's arrays in one namespace to the tombstone's
+        try:
+            ds = self.get(dataset, timeout=0)
+        except KeyError:
+            return
+        old = os.path.join(source, "")
+        new = os.path.join(tombstone, "")
+        for node in ds._schema.nodes():
+            if node.namespace == namespace:
+                for attr in ("data", "starts", "stops", "tags", "offsets", "positions", "mask"):
+                    arrayname = getattr(node, attr, None)
+                    if arrayname is not None and arrayname.startswith(old):
+                        setattr(node, attr, new + arrayname[len(old):])
+
+        dsjson = os.path.join(self._datasetdir(dataset), "dataset.json")
+        tmp = "{0}.{1}.tmp".format(dsjson, os.getpid())
+        with open(tmp, "w") as file:
+            json.dump(self._dataset2json(ds), file)
+        os.rename(tmp, dsjson)
+        self._dscache.pop(dataset, None)
@@ -28,6 +28,12 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import hashlib
+import json
+import os
+import pickle
+import threading
+
 import numpy
 
 import oamap.schema
@@ -35,9 +41,10 @@ import oamap.dataset
 import oamap.database
 import oamap.proxy
 import oamap.backend.packing
+import oamap.version
 from oamap.util import OrderedDict
 
-def dataset(path, treepath, namespace=None, **kwargs):
+def dataset(path, treepath, namespace=None, partitionentries=None, executor=None, **kwargs):
     import uproot
 
     if namespace is None:
@@ -47,16 +54,13 @@ def dataset(path, treepath, namespace=None, **kwargs):
         kwargs["localsource"] = lambda path: uproot.source.file.FileSource(path, chunkbytes=8*1024, limitbytes=None)
     kwargs["total"] = False
     kwargs["blocking"] = True
+    kwargs["executor"] = executor
 
     paths2entries = uproot.tree.numentries(path, treepath, **kwargs)
     if len(paths2entries) == 0:
         raise ValueError("path {0} matched no TTrees".format(repr(path)))
 
-    offsets = [0]
-    paths = []
-    for path, numentries in paths2entries.items():
-        offsets.append(offsets[-1] + numentries)
-        paths.append(path)
+    paths, offsets, entryranges = _partitions(paths2entries, treepath, partitionentries, kwargs["localsource"])
 
     sch = schema(paths[0], treepath, namespace=namespace)
     doc = sch.doc
@@ -64,7 +68,7 @@ def dataset(path, treepath, namespace=None, **kwargs):
 
     return oamap.dataset.Dataset(treepath.split("/")[-1].split(";")[0],
                                  sch,
-                                 {namespace: ROOTBackend(paths, treepath, namespace)},
+                                 {namespace: ROOTBackend(paths, treepath, namespace, entryranges, executor=executor)},
                                  oamap.dataset.SingleThreadExecutor(),
                                  offsets,
                                  extension=None,
@@ -72,16 +76,43 @@ def dataset(path, treepath, namespace=None, **kwargs):
                                  doc=doc,
                                  metadata={"schemafrom": paths[0]})
 
-def proxy(path, treepath, namespace="", extension=oamap.extension.common):
+def _partitions(paths2entries, treepath, partitionentries, localsource):
+    import uproot
+
+    # by default, one partition per file; with partitionentries, files are split at cluster boundaries into
+    # partitions of at least that many entries (except the last in each file), so big files can be spread out
+    offsets = [0]
+    paths = []
+    entryranges = None if partitionentries is None else []
+    for path, numentries in paths2entries.items():
+        if partitionentries is None:
+            offsets.append(offsets[-1] + numentries)
+
+        else:
+            start = 0
+            for clusterstart, clusterstop in uproot.open(path, localsource=localsource)[treepath].clusters():
+                if clusterstop - start >= partitionentries:
+                    entryranges.append((len(paths), start, clusterstop))
+                    offsets.append(offsets[-1] + clusterstop - start)
+                    start = clusterstop
+            if start < numentries or start == 0:
+                entryranges.append((len(paths), start, numentries))
+                offsets.append(offsets[-1] + numentries - start)
+
+        paths.append(path)
+
+    return paths, offsets, entryranges
+
+def proxy(path, treepath, namespace="", extension=oamap.extension.common, executor=None):
     import uproot
     def localsource(path):
         return uproot.source.file.FileSource(path, chunkbytes=8*1024, limitbytes=None)
-    return _proxy(uproot.open(path, localsource=localsource)[treepath], namespace=namespace, extension=extension)
+    return _proxy(uproot.open(path, localsource=localsource)[treepath], namespace=namespace, extension=extension, executor=executor)
 
-def _proxy(tree, namespace="", extension=oamap.extension.common):
+def _proxy(tree, namespace="", extension=oamap.extension.common, executor=None):
     schema = _schema(tree, namespace=namespace)
     generator = schema.generator(extension=extension)
-    return oamap.proxy.ListProxy(generator, ROOTArrays(tree, ROOTBackend([tree._context.sourcepath], tree._context.treename, namespace)), generator._newcache(), 0, 1, tree.numentries)
+    return oamap.proxy.ListProxy(generator, ROOTArrays(tree, ROOTBackend([tree._context.sourcepath], tree._context.treename, namespace, executor=executor)), generator._newcache(), 0, 1, tree.numentries)
 
 def schema(path, treepath, namespace=""):
     import uproot
@@ -89,7 +120,75 @@ def schema(path, treepath, namespace=""):
         return uproot.source.file.FileSource(path, chunkbytes=8*1024, limitbytes=None)
     return _schema(uproot.open(path, localsource=localsource)[treepath], namespace=namespace)
 
+################################################################ SchemaCache
+
+class SchemaCache(object):
+    # schemas derived from TTrees, saved as JSON (without a namespace) and keyed by a fingerprint of the tree's
+    # branch names and types, so that opening another file with the same layout doesn't walk and interpret all of its branches
+    def __init__(self, directory):
+        self._directory = directory
+        self._schemas = {}
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @staticmethod
+    def fingerprint(tree, kind):
+        def decode(x):
+            return x.decode("ascii", "replace") if isinstance(x, bytes) else x
+        branches = []
+        for name, branch in tree.allitems():
+            branches.append([decode(name),
+                             decode(getattr(branch, "fTitle", "")),
+                             decode(getattr(branch, "fClassName", "")),
+                             getattr(branch, "fStreamerType", -1),
+                             getattr(branch, "fType", -1),
+                             [[decode(leaf.fName), decode(leaf.fTitle), type(leaf).__name__] for leaf in getattr(branch, "fLeaves", [])]])
+        description = [kind, decode(tree.title), oamap.version.__version__, branches]
+        return hashlib.sha1(json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        # a new Schema every time: callers may modify what they get
+        obj = self._schemas.get(key, None)
+        if obj is None:
+            try:
+                with open(os.path.join(self._directory, key + ".json")) as file:
+                    obj = self._schemas[key] = json.load(file)
+            except (IOError, OSError, ValueError):
+                return None
+        return oamap.schema.Schema.fromjson(obj)
+
+    def put(self, key, schema):
+        obj = self._schemas[key] = schema.tojson()
+        filename = os.path.join(self._directory, key + ".json")
+        tmp = "{0}.{1}.{2}.tmp".format(filename, os.getpid(), threading.current_thread().ident)
+        with open(tmp, "w") as file:
+            json.dump(obj, file)
+        os.rename(tmp, filename)
+
+# set to a SchemaCache to reuse derived schemas across files (and processes)
+schemacache = None
+
+def _cachedschema(tree, kind, namespace, build):
+    if schemacache is None:
+        return build()
+    # the default namespace depends on the file's path, so the cached copy has none and each caller's is put back
+    key = SchemaCache.fingerprint(tree, kind)
+    out = schemacache.get(key)
+    if out is None:
+        out = build()
+        schemacache.put(key, out.renamespace(**{namespace: ""}))
+        return out
+    else:
+        return out.renamespace(nullto=namespace)
+
 def _schema(tree, namespace=None):
+    return _cachedschema(tree, "root", namespace, lambda: _buildschema(tree, namespace))
+
+def _buildschema(tree, namespace=None):
     import uproot
 
     if namespace is None:
@@ -165,45 +264,166 @@ def _schema(tree, namespace=None):
     return oamap.schema.List(entries, namespace=namespace, doc=doc)
 
 class ROOTBackend(oamap.database.Backend):
-    def __init__(self, paths, treepath, namespace):
+    # the executor (for reading and decompressing baskets in parallel) belongs to this process, so it is not
+    # part of the backend's identity or JSON
+    def __init__(self, paths, treepath, namespace, entryranges=None, executor=None):
         self._paths = tuple(paths)
         self._treepath = treepath
         self._namespace = namespace
+        self._executor = executor
+        if entryranges is None:
+            self._entryranges = None
+        else:
+            self._entryranges = tuple(tuple(x) for x in entryranges)
 
     @property
     def args(self):
-        return (self._paths, self._treepath)
+        return (self._paths, self._treepath, self._entryranges)
 
     def tojson(self):
-        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
-                "paths": list(self._paths),
-                "treepath": self._treepath}
+        out = {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+               "paths": list(self._paths),
+               "treepath": self._treepath}
+        if self._entryranges is not None:
+            out["entryranges"] = [list(x) for x in self._entryranges]
+        return out
 
     @staticmethod
     def fromjson(obj, namespace):
-        return ROOTBackend(obj["paths"], obj["treepath"], namespace)
+        return ROOTBackend(obj["paths"], obj["treepath"], namespace, obj.get("entryranges", None))
 
     @property
     def namespace(self):
         return self._namespace
 
+    @property
+    def entryranges(self):
+        return self._entryranges
+
+    @property
+    def executor(self):
+        return self._executor
+
     def instantiate(self, partitionid):
-        return ROOTArrays.frompath(self._paths[partitionid], self._treepath, self)
+        if self._entryranges is None:
+            return ROOTArrays.frompath(self._paths[partitionid], self._treepath, self)
+        else:
+            pathindex, entrystart, entrystop = self._entryranges[partitionid]
+            return ROOTArrays.frompath(self._paths[pathindex], self._treepath, self, entrystart, entrystop)
         
+################################################################ ArrayCache
+
+class ArrayCache(object):
+    # cache of decompressed branch arrays (installed as oamap.backend.root.cache), least recently used first out when over limitbytes;
+    # with a directory, arrays are also pickled to disk and survive the process (the directory is not trimmed)
+    def __init__(self, limitbytes=100*1024**2, directory=None):
+        self._limitbytes = limitbytes
+        self._directory = directory
+        self._arrays = OrderedDict()
+        self._numbytes = 0
+        self._lock = threading.Lock()
+        if directory is not None and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    @property
+    def limitbytes(self):
+        return self._limitbytes
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def numbytes(self):
+        return self._numbytes
+
+    def __len__(self):
+        return len(self._arrays)
+
+    @staticmethod
+    def _nbytes(array):
+        if isinstance(array, numpy.ndarray):
+            return array.nbytes
+        else:
+            return sum(ArrayCache._nbytes(getattr(array, x)) for x in ("starts", "stops", "content", "jaggedarray") if hasattr(array, x))
+
+    def _filename(self, key):
+        return os.path.join(self._directory, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".pkl")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._arrays:
+                array, numbytes = self._arrays.pop(key)
+                self._arrays[key] = (array, numbytes)
+                return array
+
+        if self._directory is not None:
+            try:
+                with open(self._filename(key), "rb") as file:
+                    array = pickle.load(file)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                pass
+            else:
+                self._remember(key, array)
+                return array
+
+        return None
+
+    def put(self, key, array):
+        if self._directory is not None:
+            filename = self._filename(key)
+            tmp = "{0}.{1}.{2}.tmp".format(filename, os.getpid(), threading.current_thread().ident)
+            with open(tmp, "wb") as file:
+                pickle.dump(array, file, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, filename)
+        self._remember(key, array)
+
+    def _remember(self, key, array):
+        numbytes = self._nbytes(array)
+        if numbytes > self._limitbytes:
+            return
+        with self._lock:
+            if key in self._arrays:
+                self._numbytes -= self._arrays.pop(key)[1]
+            self._arrays[key] = (array, numbytes)
+            self._numbytes += numbytes
+            while self._numbytes > self._limitbytes:
+                oldkey, (oldarray, oldnumbytes) = self._arrays.popitem(last=False)
+                self._numbytes -= oldnumbytes
+
+    def clear(self):
+        with self._lock:
+            self._arrays.clear()
+            self._numbytes = 0
+
+# set to an ArrayCache to share decompressed branches among all ROOTArrays (e.g. cache = ArrayCache(limitbytes=...))
+cache = None
+
 class ROOTArrays(object):
     @staticmethod
-    def frompath(path, treepath, backend):
+    def frompath(path, treepath, backend, entrystart=None, entrystop=None):
         import uproot
         file = uproot.open(path)
-        out = ROOTArrays(file[treepath], backend)
+        out = ROOTArrays(file[treepath], backend, entrystart, entrystop)
         out._source = file._context.source
         return out
 
-    def __init__(self, tree, backend):
+    def __init__(self, tree, backend, entrystart=None, entrystop=None):
         self._tree = tree
         self._backend = backend
+        self._entrystart = entrystart
+        self._entrystop = entrystop
         self._keycache = {}
 
+        # cached arrays are only valid for this version of the file
+        self._path = tree._context.sourcepath
+        try:
+            self._mtime = os.stat(self._path).st_mtime
+        except (OSError, TypeError):
+            self._mtime = None
+        else:
+            self._path = os.path.abspath(self._path)
+
     @property
     def tree(self):
         return self._tree
@@ -224,7 +444,23 @@ class ROOTArrays(object):
             else:
                 return name[:colon], name[colon + 1:]
             
-        arrays = self._tree.arrays(set(chop(x)[0] for x in roles), keycache=self._keycache)
+        arrays = {}
+        branchnames = set(chop(x)[0] for x in roles)
+        if cache is not None:
+            for branchname in branchnames:
+                array = cache.get(self._cachekey(branchname))
+                if array is not None:
+                    arrays[branchname] = array
+
+        # only the baskets overlapping this partition's entry range are read
+        missing = branchnames.difference(arrays)
+        if len(missing) > 0:
+            # all branches are requested at once, so that with an executor their baskets are decompressed in parallel
+            read = self._tree.arrays(missing, entrystart=self._entrystart, entrystop=self._entrystop, keycache=self._keycache, executor=getattr(self._backend, "executor", None), blocking=True)
+            if cache is not None:
+                for branchname, array in read.items():
+                    cache.put(self._cachekey(branchname), array)
+            arrays.update(read)
 
         out = {}
         for role in roles:
@@ -286,6 +522,9 @@ class ROOTArrays(object):
 
         return out
 
+    def _cachekey(self, branchname):
+        return (self._path, self._mtime, self._tree._context.treename, branchname, self._entrystart, self._entrystop)
+
     def close(self):
         if hasattr(self, "_source"):
             self._source.close()
@@ -36,7 +36,7 @@ import oamap.dataset
 import oamap.proxy
 from oamap.util import OrderedDict
 
-def dataset(path, treepath="Events", namespace=None, **kwargs):
+def dataset(path, treepath="Events", namespace=None, partitionentries=None, executor=None, **kwargs):
     import uproot
 
     if namespace is None:
@@ -46,16 +46,13 @@ def dataset(path, treepath="Events", namespace=None, **kwargs):
         kwargs["localsource"] = lambda path: uproot.source.file.FileSource(path, chunkbytes=8*1024, limitbytes=None)
     kwargs["total"] = False
     kwargs["blocking"] = True
+    kwargs["executor"] = executor
 
     paths2entries = uproot.tree.numentries(path, treepath, **kwargs)
     if len(paths2entries) == 0:
         raise ValueError("path {0} matched no TTrees".format(repr(path)))
 
-    offsets = [0]
-    paths = []
-    for path, numentries in paths2entries.items():
-        offsets.append(offsets[-1] + numentries)
-        paths.append(path)
+    paths, offsets, entryranges = oamap.backend.root._partitions(paths2entries, treepath, partitionentries, kwargs["localsource"])
 
     sch = schema(paths[0], namespace=namespace)
     doc = sch.doc
@@ -63,7 +60,7 @@ def dataset(path, treepath="Events", namespace=None, **kwargs):
 
     return oamap.dataset.Dataset(treepath,
                                  sch,
-                                 {namespace: oamap.backend.root.ROOTBackend(paths, treepath, namespace)},
+                                 {namespace: oamap.backend.root.ROOTBackend(paths, treepath, namespace, entryranges, executor=executor)},
                                  oamap.dataset.SingleThreadExecutor(),
                                  offsets,
                                  extension=None,
@@ -71,7 +68,7 @@ def dataset(path, treepath="Events", namespace=None, **kwargs):
                                  doc=doc,
                                  metadata={"schemafrom": paths[0]})
 
-def proxy(path, treepath="Events", namespace=None, extension=oamap.extension.common):
+def proxy(path, treepath="Events", namespace=None, extension=oamap.extension.common, executor=None):
     import uproot
 
     if namespace is None:
@@ -80,16 +77,16 @@ def proxy(path, treepath="Events", namespace=None, extension=oamap.extension.com
     def localsource(path):
         return uproot.source.file.FileSource(path, chunkbytes=8*1024, limitbytes=None)
 
-    return _proxy(uproot.open(path, localsource=localsource)[treepath], namespace=namespace, extension=extension)
+    return _proxy(uproot.open(path, localsource=localsource)[treepath], namespace=namespace, extension=extension, executor=executor)
 
-def _proxy(tree, namespace=None, extension=oamap.extension.common):
+def _proxy(tree, namespace=None, extension=oamap.extension.common, executor=None):
     if namespace is None:
         namespace = "root.cmsnano({0})".format(repr(path))
 
     schema = _schema(tree, namespace=namespace)
     generator = schema.generator(extension=extension)
 
-    return oamap.proxy.ListProxy(generator, oamap.backend.root.ROOTArrays(tree, oamap.backend.root.ROOTBackend([tree._context.sourcepath], tree._context.treename, namespace)), generator._newcache(), 0, 1, tree.numentries)
+    return oamap.proxy.ListProxy(generator, oamap.backend.root.ROOTArrays(tree, oamap.backend.root.ROOTBackend([tree._context.sourcepath], tree._context.treename, namespace, executor=executor)), generator._newcache(), 0, 1, tree.numentries)
 
 def schema(path, treepath="Events", namespace=None):
     import uproot
@@ -103,6 +100,9 @@ def schema(path, treepath="Events", namespace=None):
     return _schema(uproot.open(path, localsource=localsource)[treepath], namespace=namespace)
 
 def _schema(tree, namespace=None):
+    return oamap.backend.root._cachedschema(tree, "root.cmsnano", namespace, lambda: _buildschema(tree, namespace))
+
+def _buildschema(tree, namespace=None):
     if namespace is None:
         namespace = "root.cmsnano({0})".format(repr(path))
 
@@ -123,7 +123,7 @@ def _schema(tree, namespace=None):
                     countbranchname = countbranchname.decode("ascii")
                 if groupname not in groups:
                     groups[groupname] = schema.content[groupname] = \
-                        oamap.schema.List(oamap.schema.Record({}, name=groupname), starts=countbranchname, stops=countbranchname, namespace=namespace)
+                        oamap.schema.List(oamap.schema.Record({}, name=groupname, namespace=namespace), starts=countbranchname, stops=countbranchname, namespace=namespace)
                 assert countbranchname == schema.content[groupname].starts
                 groups[groupname].content[fieldname] = schema.content[name].content
                 del schema.content[name]
@@ -133,12 +133,12 @@ def _schema(tree, namespace=None):
             groupname, fieldname = name[:underscore], name[underscore + 1:]
             if groupname not in groups:
                 groups[groupname] = schema.content[groupname] = \
-                    oamap.schema.Record({}, name=groupname)
+                    oamap.schema.Record({}, name=groupname, namespace=namespace)
             groups[groupname][fieldname] = schema.content[name]
             del schema.content[name]
 
-    hlt = oamap.schema.Record({}, name="HLT")
-    flag = oamap.schema.Record({}, name="Flag")
+    hlt = oamap.schema.Record({}, name="HLT", namespace=namespace)
+    flag = oamap.schema.Record({}, name="Flag", namespace=namespace)
     for name in schema.content.keys():
         if name.startswith("HLT_"):
             hlt[name[4:]] = schema.content[name]
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import tempfile
+
+import oamap.database
+import oamap.backend.numpyfile
+
+# Arrays are .npy files in a memory-backed filesystem (/dev/shm where there is one), read back as read-only
+# memory maps: every process that attaches to a backend by name shares the same physical pages, nothing is
+# pickled or copied. Derived datasets share arrays by hard link, as in any FilesystemBackend.
+
+def _defaultroot():
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    else:
+        return tempfile.gettempdir()
+
+class SharedMemoryBackend(oamap.backend.numpyfile.NumpyFileBackend):
+    def __init__(self, name, root=None):
+        if root is None:
+            root = _defaultroot()
+        self._name = name
+        self._root = root
+        super(SharedMemoryBackend, self).__init__(os.path.join(root, name), mmap_mode="r")
+
+    @property
+    def args(self):
+        return (self._name, self._root)
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "name": self._name,
+                "root": self._root}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return SharedMemoryBackend(obj["name"], obj.get("root", None))
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def root(self):
+        return self._root
+
+    def unlink(self):
+        # shared memory outlives the processes that made it: release it explicitly when no one needs it
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+class SharedMemoryDatabase(oamap.database.FilesystemDatabase):
+    def __init__(self, name, namespace="", root=None):
+        backend = SharedMemoryBackend(name, root)
+        super(SharedMemoryDatabase, self).__init__(backend.directory, backends={namespace: backend}, namespace=namespace)
+        self._name = name
+        self._root = backend.root
+
+    @property
+    def name(self):
+        return self._name
+
+    def unlink(self):
+        shutil.rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+
+import numpy
+import numpy.lib.format
+
+import oamap.database
+
+class SQLiteBackend(oamap.database.WritableBackend):
+    _tables = ("CREATE TABLE IF NOT EXISTS arrays (partitionid INTEGER NOT NULL, name TEXT NOT NULL, dtype TEXT NOT NULL, shape TEXT NOT NULL, data BLOB NOT NULL, refcount INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (partitionid, name))",)
+
+    def __init__(self, path, chunkbytes=1024**2):
+        self._path = path
+        self._chunkbytes = chunkbytes
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def chunkbytes(self):
+        return self._chunkbytes
+
+    @property
+    def args(self):
+        return (self._path, self._chunkbytes)
+
+    def tojson(self):
+        return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
+                "path": self._path,
+                "chunkbytes": self._chunkbytes}
+
+    @staticmethod
+    def fromjson(obj, namespace):
+        return SQLiteBackend(obj["path"], chunkbytes=obj.get("chunkbytes", 1024**2))
+
+    def _sql(self):
+        # connections are made on demand (not pickled with the backend); sharing the file of a SQLiteDatabase
+        # means sharing its connection, so reference counts change in the same transaction as the dataset records
+        return oamap.database._sqliteconnect(self._path, self._tables)
+
+    def instantiate(self, partitionid):
+        return SQLiteArrays(self, partitionid)
+
+    def incref(self, dataset, partitionid, arrayname):
+        with oamap.database._sqliteatomic(self._sql()) as connection:
+            connection.execute("UPDATE arrays SET refcount = refcount + 1 WHERE partitionid = ? AND name = ?", (int(partitionid), arrayname))
+
+    def decref(self, dataset, partitionid, arrayname):
+        with oamap.database._sqliteatomic(self._sql()) as connection:
+            connection.execute("UPDATE arrays SET refcount = refcount - 1 WHERE partitionid = ? AND name = ?", (int(partitionid), arrayname))
+            connection.execute("DELETE FROM arrays WHERE partitionid = ? AND name = ? AND refcount <= 0", (int(partitionid), arrayname))
+
+class SQLiteArrays(object):
+    def __init__(self, backend, partitionid):
+        self._backend = backend
+        self._partitionid = int(partitionid)    # numpy integers would be bound as BLOBs
+
+    @staticmethod
+    def _dtype(descr):
+        descr = json.loads(descr)
+        if isinstance(descr, list):
+            return numpy.dtype([tuple(x) for x in descr])
+        else:
+            return numpy.dtype(descr)
+
+    def _read(self, connection, rowid, nbytes):
+        buf = numpy.empty(nbytes, dtype=numpy.uint8)
+        # incremental blob I/O (Python 3.11+) copies straight out of the database pages, chunk by chunk;
+        # otherwise, the whole BLOB comes back as one bytes object
+        if hasattr(connection, "blobopen"):
+            with connection.blobopen("arrays", "data", rowid, readonly=True) as blob:
+                for start in range(0, nbytes, self._backend.chunkbytes):
+                    chunk = blob.read(self._backend.chunkbytes)
+                    buf[start:start + len(chunk)] = numpy.frombuffer(chunk, dtype=numpy.uint8)
+        elif nbytes > 0:
+            data, = connection.execute("SELECT data FROM arrays WHERE rowid = ?", (rowid,)).fetchone()
+            buf[:] = numpy.frombuffer(data, dtype=numpy.uint8)
+        return buf
+
+    def getall(self, roles):
+        names = dict((str(n), n) for n in roles)
+        connection = self._backend._sql()
+
+        rows = []
+        namelist = list(names)
+        for i in range(0, len(namelist), 500):    # stay below SQLite's limit on host parameters
+            batch = namelist[i : i + 500]
+            rows.extend(connection.execute("SELECT rowid, name, dtype, shape, length(data) FROM arrays WHERE partitionid = ? AND name IN ({0})".format(", ".join("?" for x in batch)), [self._partitionid] + batch).fetchall())
+
+        out = {}
+        for rowid, name, dtype, shape, nbytes in rows:
+            out[names[name]] = self._read(connection, rowid, nbytes).view(self._dtype(dtype)).reshape(json.loads(shape))
+        if len(out) != len(names):
+            missing = [n for n in names if names[n] not in out]
+            raise KeyError("arrays {0} not found in partition {1} of {2}".format(", ".join(repr(x) for x in missing), self._partitionid, repr(self._backend.path)))
+        return out
+
+    def __getitem__(self, name):
+        return self.getall([name])[name]
+
+    def putall(self, roles2arrays):
+        import sqlite3
+        rows = []
+        for n, x in roles2arrays.items():
+            x = numpy.ascontiguousarray(x)
+            rows.append((self._partitionid, str(n), json.dumps(numpy.lib.format.dtype_to_descr(x.dtype)), json.dumps(list(x.shape)), sqlite3.Binary(x.tostring())))
+
+        # replacing an array's data keeps its reference count
+        with oamap.database._sqliteatomic(self._backend._sql()) as connection:
+            connection.executemany("INSERT INTO arrays (partitionid, name, dtype, shape, data) VALUES (?, ?, ?, ?, ?) ON CONFLICT (partitionid, name) DO UPDATE SET dtype = excluded.dtype, shape = excluded.shape, data = excluded.data", rows)
+
+    def __setitem__(self, name, value):
+        self.putall({name: value})
+
+class SQLiteBlobDatabase(oamap.database.SQLiteDatabase):
+    def __init__(self, path, namespace=""):
+        super(SQLiteBlobDatabase, self).__init__(path, backends={namespace: SQLiteBackend(path)}, namespace=namespace)
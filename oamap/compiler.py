@@ -56,7 +56,14 @@ else:
                 self.generator = self.schema.generator()
             else:
                 self.generator = generator
-            super(SchemaType, self).__init__(name="OAMap-Schema{0} {1}".format("" if self.matchable else " (unmatchable)", self.schema.tojsonstring()))
+            # equality goes through 'key', which holds a copy so that later changes to the schema can't change it
+            # (numba keeps types in dicts); the name only has to be readable
+            self._frozen = schema.deepcopy()
+            super(SchemaType, self).__init__(name="OAMap-Schema{0} {1:x}".format("" if self.matchable else " (unmatchable)", hash(self._frozen) & 0xffffffffffffffff))
+
+        @property
+        def key(self):
+            return (self.matchable, self._frozen)
 
         def unmatchable(self):
             return SchemaType(self.schema, generator=self.generator, matchable=False)
@@ -29,14 +29,19 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import collections
+import contextlib
 import glob
+import hashlib
 import json
 import os
 import re
 import shutil
 import sys
+import threading
 import time
 
+import numpy
+
 import oamap.dataset
 import oamap.extension.common
 import oamap.operations
@@ -88,7 +93,7 @@ class WritableBackend(Backend):
         raise NotImplementedError("missing implementation for {0}.decref".format(self.__class__))
 
 class FilesystemBackend(WritableBackend):
-    def __init__(self, directory, arrayprefix="obj", arraysuffix=""):
+    def __init__(self, directory, arrayprefix="obj", arraysuffix="", dedup=False):
         if not os.path.exists(directory):
             os.mkdir(directory)
         if not os.path.exists(os.path.join(directory, "data")):
@@ -96,20 +101,22 @@ class FilesystemBackend(WritableBackend):
         self._directory = directory
         self._arrayprefix = arrayprefix
         self._arraysuffix = arraysuffix
+        self._dedup = dedup
 
     @property
     def args(self):
-        return (self._directory, self._arrayprefix, self._arraysuffix)
+        return (self._directory, self._arrayprefix, self._arraysuffix, self._dedup)
 
     def tojson(self):
         return {"class": self.__class__.__module__ + "." + self.__class__.__name__,
                 "directory": self._directory,
                 "arrayprefix": self._arrayprefix,
-                "arraysuffix": self._arraysuffix}
+                "arraysuffix": self._arraysuffix,
+                "dedup": self._dedup}
 
     @staticmethod
     def fromjson(obj, namespace):
-        return FilesystemBackend(obj["directory"], obj["arrayprefix"], obj["arraysuffix"])
+        return FilesystemBackend(obj["directory"], obj["arrayprefix"], obj["arraysuffix"], obj.get("dedup", False))
 
     @property
     def directory(self):
@@ -123,6 +130,10 @@ class FilesystemBackend(WritableBackend):
     def arraysuffix(self):
         return self._arraysuffix
 
+    @property
+    def dedup(self):
+        return self._dedup
+
     def prefix(self, dataset):
         return os.path.join(dataset, "PART", self._arrayprefix)
 
@@ -153,12 +164,68 @@ class FilesystemBackend(WritableBackend):
         dataset_part, array = os.path.split(arrayname)
         dataset, part = os.path.split(dataset_part)
         if create:
-            if not os.path.exists(os.path.join(self._directory, "data", dataset)):
-                os.mkdir(os.path.join(self._directory, "data", dataset))
-            if not os.path.exists(os.path.join(self._directory, "data", dataset, str(partitionid))):
-                os.mkdir(os.path.join(self._directory, "data", dataset, str(partitionid)))
+            # partitions may be written concurrently by several processes, so losing a mkdir race is fine
+            for directory in (os.path.join(self._directory, "data", dataset), os.path.join(self._directory, "data", dataset, str(partitionid))):
+                if not os.path.exists(directory):
+                    try:
+                        os.mkdir(directory)
+                    except OSError:
+                        if not os.path.isdir(directory):
+                            raise
         return os.path.join(self._directory, "data", dataset, str(partitionid), array) + self._arraysuffix
 
+    # content-addressed store: each distinct array is written once, under its digest, and hard-linked into
+    # the datasets that use it, so the store file's link count is its reference count
+
+    def _storedir(self):
+        return os.path.join(self._directory, "data", ".store")
+
+    def store(self, filename, array, write):
+        # write(filename) puts the array in place; with dedup, it's only called for arrays the store hasn't seen
+        if not self._dedup:
+            write(filename)
+            return
+
+        array = numpy.ascontiguousarray(array)
+        digest = hashlib.sha1()
+        digest.update("{0} {1} {2} ".format(self._arraysuffix, array.dtype.str, array.shape).encode("ascii"))
+        digest.update(array.view(numpy.uint8).reshape(-1) if array.size > 0 else b"")
+        digest = digest.hexdigest()
+
+        directory = os.path.join(self._storedir(), digest[:2])
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        stored = os.path.join(directory, digest) + self._arraysuffix
+
+        if not os.path.exists(stored):
+            # write under a private name and link into place, so that concurrent writers never see a partial file
+            tmp = "{0}.{1}-{2}{3}".format(os.path.join(directory, digest), os.getpid(), id(array), self._arraysuffix)
+            write(tmp)
+            try:
+                os.link(tmp, stored)
+            except OSError:
+                if not os.path.exists(stored):
+                    raise
+            finally:
+                os.unlink(tmp)
+
+        if os.path.exists(filename):
+            os.unlink(filename)
+        os.link(stored, filename)
+
+    def collect(self):
+        # delete stored arrays that no dataset links to anymore
+        out = 0
+        for stored in glob.glob(os.path.join(self._storedir(), "*", "*")):
+            if os.stat(stored).st_nlink <= 1:
+                os.unlink(stored)
+                out += 1
+        return out
+
 ################################################################ DictBackend (concrete)
 
 class DictBackend(WritableBackend):
@@ -331,6 +398,41 @@ class Database(object):
             obj["metadata"] = data._metadata
         return obj
 
+    def _references(self, ds):
+        # (namespace, partitionid, arrayname) of every array in a WritableBackend that the dataset uses
+        if isinstance(ds, oamap.dataset.Dataset):
+            partitions = range(ds.numpartitions)
+            startingpoint = ds.schema.generator().namedschema().content
+        else:
+            partitions = [0]
+            startingpoint = ds.schema.generator().namedschema()
+
+        for node in startingpoint.nodes():
+            if node.namespace in self._backends and isinstance(self._backends[node.namespace], WritableBackend):
+                if isinstance(node, oamap.schema.Primitive):
+                    arraynames = [node.data]
+                elif isinstance(node, oamap.schema.List):
+                    arraynames = [node.starts, node.stops]
+                elif isinstance(node, oamap.schema.Union):
+                    arraynames = [node.tags, node.offsets]
+                elif isinstance(node, oamap.schema.Pointer):
+                    arraynames = [node.positions]
+                else:
+                    arraynames = []
+                if node.nullable:
+                    arraynames.append(node.mask)
+                for partitionid in partitions:
+                    for arrayname in arraynames:
+                        yield node.namespace, partitionid, arrayname
+
+    def _incref(self, ds):
+        for namespace, partitionid, arrayname in self._references(ds):
+            self._backends[namespace].incref(ds.name, partitionid, arrayname)
+
+    def _decref(self, ds):
+        for namespace, partitionid, arrayname in self._references(ds):
+            self._backends[namespace].decref(ds.name, partitionid, arrayname)
+
     def fromdata(self, name, schema, *partitions, **opts):
         try:
             pointer_fromequal = opts.pop("pointer_fromequal", False)
@@ -390,27 +492,7 @@ class Database(object):
         elif isinstance(schema, oamap.schema.List):
             offsets = [0]
             for partitionid, partition in enumerate(partitions):
-                data = generator.fromdata(partition)
-                roles2arrays = dict((x, data._arrays[str(x)]) for x in roles)
-                startsrole = oamap.generator.StartsRole(generator.starts, generator.namespace, None)
-                stopsrole = oamap.generator.StopsRole(generator.stops, generator.namespace, None)
-                startsrole.stops = stopsrole
-                stopsrole.starts = startsrole
-                if schema.nullable:
-                    maskrole = oamap.generator.MaskRole(generator.mask, generator.namespace, {startsrole: roles2arrays[startsrole], stopsrole: roles2arrays[stopsrole]})
-                del roles2arrays[startsrole]
-                del roles2arrays[stopsrole]
-                if schema.nullable:
-                    del roles2arrays[maskrole]
-
-                active = backend.instantiate(partitionid)
-                if hasattr(active, "putall"):
-                    active.putall(roles2arrays)
-                else:
-                    for n, x in roles2arrays.items():
-                        active[str(n)] = x
-
-                offsets.append(offsets[-1] + len(data))
+                offsets.append(offsets[-1] + _fillpartition(generator, backend, partitionid, partition, None, pointer_fromequal))
 
             out = oamap.dataset.Dataset(name, generator.namedschema(), self._backends, self._executor, offsets, extension=extension, packing=packing, doc=doc, metadata=metadata)
 
@@ -419,6 +501,110 @@ class Database(object):
 
         self.put(name, out, namespace=namespace)
 
+    def fromsources(self, name, schema, sources, **opts):
+        loader = opts.pop("loader", _loadjson)
+        executor = opts.pop("executor", self._executor)
+        pointer_fromequal = opts.pop("pointer_fromequal", False)
+        namespace = opts.pop("namespace", self._namespace)
+        extension = opts.pop("extension", None)
+        packing = opts.pop("packing", None)
+        doc = opts.pop("doc", None)
+        metadata = opts.pop("metadata", None)
+        if len(opts) > 0:
+            raise TypeError("unrecognized options: {0}".format(" ".join(opts)))
+
+        if not isinstance(schema, oamap.schema.List):
+            raise TypeError("only lists can be filled from a sequence of sources")
+
+        if namespace not in self._backends:
+            self[namespace] = DictBackend()
+        backend = self[namespace]
+        if not isinstance(backend, WritableBackend):
+            raise ValueError("namespace {0} does not point to a WritableBackend".format(repr(namespace)))
+        if isinstance(backend, DictBackend) and not _inprocess(executor):
+            # arrays filled in another process would stay in that process's copy of the DictBackend
+            raise ValueError("namespace {0} points to an in-memory DictBackend, which can't collect partitions filled by {1}; use a persistent backend (e.g. NumpyFileBackend) or an in-process executor".format(repr(namespace), executor.__class__.__name__))
+
+        def setnamespace(node):
+            node.namespace = namespace
+            return node
+        schema = schema.replace(setnamespace)
+
+        generator = schema.generator(prefix=backend.prefix(name), delimiter=backend.delimiter(), packing=packing)
+        generator._requireall()
+
+        # each partition is loaded, filled, and written by its own task (which may be in another process)
+        tasks = [executor.submit(_fillpartition, generator, backend, partitionid, source, loader, pointer_fromequal) for partitionid, source in enumerate(sources)]
+        offsets = numpy.cumsum([0] + [x.result() for x in tasks], dtype=numpy.int64)
+
+        out = oamap.dataset.Dataset(name, generator.namedschema(), self._backends, self._executor, offsets, extension=extension, packing=packing, doc=doc, metadata=metadata)
+        self.put(name, out, namespace=namespace)
+
+def _inprocess(executor):
+    if isinstance(executor, oamap.dataset.SingleThreadExecutor):
+        return True
+    try:
+        import concurrent.futures
+    except ImportError:
+        return False
+    else:
+        return isinstance(executor, concurrent.futures.ThreadPoolExecutor)
+
+def _loadjson(source):
+    if isinstance(source, basestring):
+        with open(source) as file:
+            return json.load(file)
+    else:
+        return source
+
+def _waitpending(pending, dataset, timeout):
+    # wait on the last task of a put from this Database, reporting a timeout as a missing dataset
+    # (unless the task itself raised it)
+    try:
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+    except ImportError:
+        FutureTimeoutError = ()
+    tasks = pending[dataset]
+    try:
+        return tasks[-1].result(timeout)
+    except FutureTimeoutError:
+        if tasks[-1].done():
+            raise
+        raise KeyError("no dataset named {0} after waiting {1} seconds".format(repr(dataset), timeout))
+    finally:
+        # once the put has finished, successfully or not, it's reported once and no longer pending
+        if tasks[-1].done() and pending.get(dataset, None) is tasks:
+            del pending[dataset]
+
+def _fillpartition(generator, backend, partitionid, partition, loader, pointer_fromequal):
+    if loader is not None:
+        partition = loader(partition)
+
+    roles = generator._togetall({}, generator._newcache(), True, set())
+    data = generator.fromdata(partition, pointer_fromequal=pointer_fromequal)
+    roles2arrays = dict((x, data._arrays[str(x)]) for x in roles)
+
+    # the top-level list is described by the Dataset offsets, not by arrays
+    startsrole = oamap.generator.StartsRole(generator.starts, generator.namespace, None)
+    stopsrole = oamap.generator.StopsRole(generator.stops, generator.namespace, None)
+    startsrole.stops = stopsrole
+    stopsrole.starts = startsrole
+    if generator.schema.nullable:
+        maskrole = oamap.generator.MaskRole(generator.mask, generator.namespace, {startsrole: roles2arrays[startsrole], stopsrole: roles2arrays[stopsrole]})
+    del roles2arrays[startsrole]
+    del roles2arrays[stopsrole]
+    if generator.schema.nullable:
+        del roles2arrays[maskrole]
+
+    active = backend.instantiate(partitionid)
+    if hasattr(active, "putall"):
+        active.putall(roles2arrays)
+    else:
+        for n, x in roles2arrays.items():
+            active[str(n)] = x
+
+    return len(data)
+
 ################################################################ InMemoryDatabase (concrete)
 
 class InMemoryDatabase(Database):
@@ -481,70 +667,13 @@ class InMemoryDatabase(Database):
         self._decref(ds)
         del self._datasets[dataset]
 
-    def _incref(self, ds):
-        if isinstance(ds, oamap.dataset.Dataset):
-            partitions = range(ds.numpartitions)
-            startingpoint = ds.schema.generator().namedschema().content
-        else:
-            partitions = [0]
-            startingpoint = ds.schema.generator().namedschema()
-
-        for node in startingpoint.nodes():
-            if node.namespace in self._backends and isinstance(self._backends[node.namespace], WritableBackend):
-                backend = self._backends[node.namespace]
-                if isinstance(node, oamap.schema.Primitive):
-                    for partitionid in partitions:
-                        backend.incref(ds.name, partitionid, node.data)
-                elif isinstance(node, oamap.schema.List):
-                    for partitionid in partitions:
-                        backend.incref(ds.name, partitionid, node.starts)
-                        backend.incref(ds.name, partitionid, node.stops)
-                elif isinstance(node, oamap.schema.Union):
-                    for partitionid in partitions:
-                        backend.incref(ds.name, partitionid, node.tags)
-                        backend.incref(ds.name, partitionid, node.offsets)
-                elif isinstance(node, oamap.schema.Pointer):
-                    for partitionid in partitions:
-                        backend.incref(ds.name, partitionid, node.positions)
-                if node.nullable:
-                    for partitionid in partitions:
-                        backend.incref(ds.name, partitionid, node.mask)
-
-    def _decref(self, ds):
-        if isinstance(ds, oamap.dataset.Dataset):
-            partitions = range(ds.numpartitions)
-            startingpoint = ds.schema.generator().namedschema().content
-        else:
-            partitions = [0]
-            startingpoint = ds.schema.generator().namedschema()
-
-        for node in startingpoint.nodes():
-            if node.namespace in self._backends and isinstance(self._backends[node.namespace], WritableBackend):
-                backend = self._backends[node.namespace]
-                if isinstance(node, oamap.schema.Primitive):
-                    for partitionid in partitions:
-                        backend.decref(ds.name, partitionid, node.data)
-                elif isinstance(node, oamap.schema.List):
-                    for partitionid in partitions:
-                        backend.decref(ds.name, partitionid, node.starts)
-                        backend.decref(ds.name, partitionid, node.stops)
-                elif isinstance(node, oamap.schema.Union):
-                    for partitionid in partitions:
-                        backend.decref(ds.name, partitionid, node.tags)
-                        backend.decref(ds.name, partitionid, node.offsets)
-                elif isinstance(node, oamap.schema.Pointer):
-                    for partitionid in partitions:
-                        backend.decref(ds.name, partitionid, node.positions)
-                if node.nullable:
-                    for partitionid in partitions:
-                        backend.decref(ds.name, partitionid, node.mask)
-
 ################################################################ FilesystemDatabase (concrete)
 
 class FilesystemDatabase(Database):
     class BackendDict(collections.MutableMapping):
         def __init__(self, backenddir):
             self._backenddir = backenddir
+            self._cache = {}
 
         @staticmethod
         def _mangle(name):
@@ -568,25 +697,59 @@ class FilesystemDatabase(Database):
             return os.path.exists(os.path.join(self._backenddir, self._mangle(namespace)))
 
         def __getitem__(self, namespace):
-            with open(os.path.join(self._backenddir, self._mangle(namespace))) as f:
-                return Backend.fromjson(json.load(f), namespace)
+            # parsed backends are reused until their file changes (possibly by another process)
+            filename = os.path.join(self._backenddir, self._mangle(namespace))
+            stamp = FilesystemDatabase._stamp(filename)
+            cached = self._cache.get(namespace, None)
+            if cached is not None and stamp is not None and cached[0] == stamp:
+                return cached[1]
+            with open(filename) as f:
+                out = Backend.fromjson(json.load(f), namespace)
+            self._cache[namespace] = (stamp, out)
+            return out
 
         def __setitem__(self, namespace, value):
             if not isinstance(value, Backend):
                 raise TypeError("can only assign Backends to Database")
+            self._cache.pop(namespace, None)
             with open(os.path.join(self._backenddir, self._mangle(namespace)), "w") as f:
                 return json.dump(value.tojson(), f)
 
         def __delitem__(self, namespace):
+            self._cache.pop(namespace, None)
             os.unlink(os.path.join(self._backenddir, self._mangle(namespace)))
 
     def __init__(self, directory, backends={}, namespace=""):
         super(FilesystemDatabase, self).__init__(None, {}, namespace)
         self._directory = directory
         self._backends = FilesystemDatabase.BackendDict(self._backenddir())
+        self._pending = {}
+        self._catalog = None
+        self._dscache = {}
         for n, x in backends.items():
             self._backends[n] = x
 
+    # coarsest timestamp resolution to expect (FAT has 2 seconds; NFS and ext3 have 1)
+    _granularity = 2.0
+
+    @staticmethod
+    def _stamp(filename):
+        # None (don't trust a cache) if the file is missing or was modified so recently that another change
+        # within the same timestamp tick, with the same size, would be indistinguishable
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        if abs(time.time() - stat.st_mtime) < FilesystemDatabase._granularity:
+            return None
+        else:
+            return (getattr(stat, "st_mtime_ns", stat.st_mtime), stat.st_size)
+
+    @staticmethod
+    def _touch(datadir):
+        # any change to the set of datasets must change the data directory's mtime, which validates the catalog
+        os.utime(datadir, None)
+
     def _datadir(self):
         name = os.path.join(self._directory, "data")
         if not os.path.exists(name):
@@ -605,20 +768,79 @@ class FilesystemDatabase(Database):
             os.mkdir(name)
         return name
 
+    def _catalogname(self):
+        return os.path.join(self._directory, "catalog.json")
+
     def list(self):
-        out = []
-        for x in glob.glob(os.path.join(self._datadir(), "*", "dataset.json")):
-            directory_dataset, _ = os.path.split(x)
-            _, dataset = os.path.split(directory_dataset)
-            out.append(dataset)
-        return out
+        # the catalog (in memory, else on disk) is valid as long as the data directory's mtime hasn't changed
+        # (and isn't too recent to tell apart from a later change)
+        datadir = self._datadir()
+        stamp = self._stamp(datadir)
+        if stamp is not None:
+            stamp = stamp[0]
+        if stamp is not None and self._catalog is not None and self._catalog[0] == stamp:
+            return list(self._catalog[1])
+
+        catalog = None
+        if stamp is not None:
+            try:
+                with open(self._catalogname()) as f:
+                    catalog = json.load(f)
+            except (IOError, OSError, ValueError):
+                pass
+
+        if catalog is not None and catalog.get("stamp", None) == stamp:
+            out = catalog["datasets"]
+
+        else:
+            out = []
+            for x in glob.glob(os.path.join(datadir, "*", "dataset.json")):
+                directory_dataset, _ = os.path.split(x)
+                _, dataset = os.path.split(directory_dataset)
+                out.append(dataset)
+
+            # written under a private name and renamed into place, so readers never see a partial catalog
+            if stamp is not None:
+                tmp = "{0}.{1}.tmp".format(self._catalogname(), os.getpid())
+                try:
+                    with open(tmp, "w") as f:
+                        json.dump({"stamp": stamp, "datasets": out}, f)
+                    os.rename(tmp, self._catalogname())
+                except (IOError, OSError):
+                    pass
+
+        self._catalog = (stamp, out)
+        return list(out)
+
+    # polling interval bounds (seconds) for datasets being written by someone else
+    _pollmin = 0.001
+    _pollmax = 0.1
 
     def get(self, dataset, timeout=None):
+        start = time.time()
         dsjson = os.path.join(self._datasetdir(dataset), "dataset.json")
+
+        # a put from this Database: wait on the task that writes dataset.json (re-raises its errors)
+        if dataset in self._pending:
+            _waitpending(self._pending, dataset, timeout)
+
+        # otherwise another process may be writing it: poll with exponential backoff
+        delay = self._pollmin
         while not os.path.exists(dsjson):
-            time.sleep(0)
-        with open(dsjson) as ds:
-            return self._json2dataset(dataset, json.load(ds))
+            if timeout is not None:
+                remaining = timeout - (time.time() - start)
+                if remaining <= 0:
+                    raise KeyError("no dataset named {0} after waiting {1} seconds".format(repr(dataset), timeout))
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            delay = min(2*delay, self._pollmax)
+
+        stamp = self._stamp(dsjson)
+        cached = self._dscache.get(dataset, None)
+        if cached is None or stamp is None or cached[0] != stamp:
+            with open(dsjson) as ds:
+                cached = self._dscache[dataset] = (stamp, json.load(ds))
+        return self._json2dataset(dataset, cached[1])
 
     def put(self, dataset, value, namespace=None):
         if isinstance(value, oamap.proxy.Proxy):
@@ -631,23 +853,205 @@ class FilesystemDatabase(Database):
                 raise ValueError("namespace {0} does not point to a FilesystemBackend".format(repr(namespace)))
             value._backends[namespace] = self._backends[namespace]
 
+        datadir = self._datadir()
         dsjson = os.path.join(self._datasetdir(dataset), "dataset.json")
+        self._dscache.pop(dataset, None)
         if os.path.exists(dsjson):
             os.unlink(dsjson)
+        self._touch(datadir)
 
         for ns, backend in value._backends.items():
             if ns not in self._backends:
                 self[ns] = backend
 
         def update(data):
+            self._written(data)
             with open(dsjson, "w") as ds:
                 json.dump(Database._dataset2json(data), ds)
-                return data
+            FilesystemDatabase._touch(datadir)
+            return data
 
-        value.transform(dataset, namespace, update)
+        self._pending[dataset] = value.transform(dataset, namespace, update)
+
+    def _written(self, data):
+        # called with each new dataset just before its dataset.json is written
+        pass
 
     def delete(self, dataset):
+        self._pending.pop(dataset, None)
+        self._dscache.pop(dataset, None)
         try:
             shutil.rmtree(self._datasetdir(dataset))
         except OSError as err:
             raise KeyError(str(err))
+        self._touch(self._datadir())
+
+################################################################ SQLiteDatabase (concrete)
+
+_sqlitelocal = threading.local()
+
+def _sqliteconnect(path, tables=()):
+    # one connection per process, thread, and file: sqlite3 connections can't cross threads or forks, and a
+    # backend that shares the Database's file shares its connection, so its writes join the Database's transactions
+    import sqlite3
+    connections = getattr(_sqlitelocal, "connections", None)
+    if connections is None:
+        connections = _sqlitelocal.connections = {}
+    key = (os.getpid(), os.path.abspath(path))
+    if key not in connections:
+        connections[key] = (sqlite3.connect(path, timeout=60), set())
+    connection, created = connections[key]
+    for sql in tables:
+        if sql not in created:
+            connection.execute(sql)
+            created.add(sql)
+    return connection
+
+@contextlib.contextmanager
+def _sqliteatomic(connection, immediate=False):
+    # commit (or roll back) only at the outermost level, so that nested updates are part of one transaction;
+    # an immediate transaction takes the write lock before its first read, so what it reads can't change under it
+    if getattr(connection, "in_transaction", False):
+        yield connection
+    else:
+        with connection:
+            if immediate:
+                connection.execute("BEGIN IMMEDIATE")
+            yield connection
+
+class SQLiteDatabase(Database):
+    class BackendDict(collections.MutableMapping):
+        def __init__(self, database):
+            self._database = database
+            self._cache = {}
+
+        def __iter__(self):
+            for namespace, in self._database._sql().execute("SELECT namespace FROM backends").fetchall():
+                yield namespace
+
+        def __len__(self):
+            return self._database._sql().execute("SELECT COUNT(*) FROM backends").fetchone()[0]
+
+        def __contains__(self, namespace):
+            return self._database._sql().execute("SELECT 1 FROM backends WHERE namespace = ?", (namespace,)).fetchone() is not None
+
+        def __getitem__(self, namespace):
+            # parsed backends are reused until their JSON changes (possibly by another process)
+            row = self._database._sql().execute("SELECT json FROM backends WHERE namespace = ?", (namespace,)).fetchone()
+            if row is None:
+                raise KeyError(namespace)
+            cached = self._cache.get(namespace, None)
+            if cached is not None and cached[0] == row[0]:
+                return cached[1]
+            out = Backend.fromjson(json.loads(row[0]), namespace)
+            self._cache[namespace] = (row[0], out)
+            return out
+
+        def __setitem__(self, namespace, value):
+            if not isinstance(value, Backend):
+                raise TypeError("can only assign Backends to Database")
+            with _sqliteatomic(self._database._sql()) as connection:
+                connection.execute("INSERT OR REPLACE INTO backends (namespace, json) VALUES (?, ?)", (namespace, json.dumps(value.tojson())))
+
+        def __delitem__(self, namespace):
+            self._cache.pop(namespace, None)
+            with _sqliteatomic(self._database._sql()) as connection:
+                if connection.execute("DELETE FROM backends WHERE namespace = ?", (namespace,)).rowcount == 0:
+                    raise KeyError(namespace)
+
+    _tables = ("CREATE TABLE IF NOT EXISTS backends (namespace TEXT PRIMARY KEY, json TEXT NOT NULL)",
+               "CREATE TABLE IF NOT EXISTS datasets (name TEXT PRIMARY KEY, json TEXT NOT NULL, numpartitions INTEGER, numentries INTEGER)",
+               "CREATE TABLE IF NOT EXISTS offsets (dataset TEXT NOT NULL, partitionid INTEGER NOT NULL, offset INTEGER NOT NULL, PRIMARY KEY (dataset, partitionid))")
+
+    def __init__(self, path, backends={}, namespace="", executor=oamap.dataset.SingleThreadExecutor()):
+        super(SQLiteDatabase, self).__init__(path, {}, namespace, executor)
+        self._path = path
+        self._backends = SQLiteDatabase.BackendDict(self)
+        self._pending = {}
+        self._sql()
+        for n, x in backends.items():
+            self._backends[n] = x
+
+    @property
+    def path(self):
+        return self._path
+
+    def _sql(self):
+        return _sqliteconnect(self._path, self._tables)
+
+    def list(self):
+        out = [name for name, in self._sql().execute("SELECT name FROM datasets ORDER BY name").fetchall()]
+        return out + sorted(x for x in self._pending if x not in out)
+
+    def get(self, dataset, timeout=None):
+        # a put from this Database: wait on its last task, which commits the result (re-raises its errors)
+        if dataset in self._pending:
+            return _waitpending(self._pending, dataset, timeout)
+
+        return self._get(self._sql(), dataset)
+
+    def _get(self, connection, dataset):
+        row = connection.execute("SELECT json FROM datasets WHERE name = ?", (dataset,)).fetchone()
+        if row is None:
+            raise KeyError("no dataset named {0}".format(repr(dataset)))
+        obj = json.loads(row[0])
+        if obj.pop("offsets", None) is not None:
+            obj["offsets"] = [offset for offset, in connection.execute("SELECT offset FROM offsets WHERE dataset = ? ORDER BY partitionid", (dataset,)).fetchall()]
+        return self._json2dataset(dataset, obj)
+
+    def _commit(self, dataset, ds):
+        # called by the put's last task, possibly in an executor thread (with that thread's own connection);
+        # the dataset record, its offsets, and the reference counts of its arrays change together or not at all;
+        # the dataset being replaced is whatever is recorded now (another Database may have replaced it since the put)
+        obj = self._dataset2json(ds)
+        offsets = obj.get("offsets", None)
+        if offsets is not None:
+            obj["offsets"] = True
+        with _sqliteatomic(self._sql(), immediate=True) as connection:
+            try:
+                oldds = self._get(connection, dataset)
+            except KeyError:
+                oldds = None
+            connection.execute("DELETE FROM offsets WHERE dataset = ?", (dataset,))
+            if offsets is None:
+                connection.execute("INSERT OR REPLACE INTO datasets (name, json, numpartitions, numentries) VALUES (?, ?, NULL, NULL)", (dataset, json.dumps(obj)))
+            else:
+                connection.execute("INSERT OR REPLACE INTO datasets (name, json, numpartitions, numentries) VALUES (?, ?, ?, ?)", (dataset, json.dumps(obj), len(offsets) - 1, offsets[-1]))
+                connection.executemany("INSERT INTO offsets (dataset, partitionid, offset) VALUES (?, ?, ?)", [(dataset, i, x) for i, x in enumerate(offsets)])
+            self._incref(ds)
+            if oldds is not None:
+                self._decref(oldds)
+        return ds
+
+    def put(self, dataset, value, namespace=None):
+        if isinstance(value, oamap.proxy.Proxy):
+            value = self._proxy2data(dataset, value, namespace)
+        if not isinstance(value, oamap.dataset._Data):
+            raise TypeError("can only put Datasets in Database")
+        if not value._notransformations():
+            namespace = self._normalize_namespace(namespace)
+            if namespace not in self._backends or not isinstance(self._backends[namespace], WritableBackend):
+                raise ValueError("namespace {0} does not point to a WritableBackend".format(repr(namespace)))
+            value._backends[namespace] = self._backends[namespace]
+
+        # an earlier put of the same name from this Database is committed first
+        if dataset in self._pending:
+            self.get(dataset)
+
+        for ns, backend in value._backends.items():
+            if ns not in self._backends:
+                self[ns] = backend
+
+        # committed as soon as the last task finishes, whether or not anyone calls get
+        tasks = self._pending[dataset] = value.transform(dataset, namespace, lambda data: self._commit(dataset, data))
+        if tasks[-1].done():
+            self.get(dataset)
+
+    def delete(self, dataset):
+        if dataset in self._pending:
+            self.get(dataset)
+        with _sqliteatomic(self._sql(), immediate=True) as connection:
+            ds = self._get(connection, dataset)
+            self._decref(ds)
+            connection.execute("DELETE FROM offsets WHERE dataset = ?", (dataset,))
+            connection.execute("DELETE FROM datasets WHERE name = ?", (dataset,))
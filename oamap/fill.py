@@ -267,7 +267,7 @@ def fromdata(value, generator=None, pointer_fromequal=False):
     if not isinstance(generator, oamap.generator.Generator):
         generator = generator.generator()
 
-    return toarrays(fromdatamore(value, oamap.fillable.arrays(generator), generator=generator, pointer_fromequal=pointer_fromequal))
+    return toarrays(fromdatamore(value, oamap.fillable.contiguousarrays(generator), generator=generator, pointer_fromequal=pointer_fromequal))
 
 def fromdatamore(value, fillables, generator=None, pointer_fromequal=False):
     if generator is None:
@@ -295,6 +295,36 @@ def fromdatamore(value, fillables, generator=None, pointer_fromequal=False):
 
     return fillables
 
+################################################################ limits on partition size for fromiterdata
+
+class Limit(object):
+    # a limit that can be evaluated from running totals, without building per-array dicts for every entry
+    def __call__(self, entries, arrayitems, arraybytes):
+        return self.accept(entries, sum(arrayitems.values()), sum(arraybytes.values()))
+
+    def accept(self, entries, numitems, numbytes):
+        raise NotImplementedError("missing implementation for {0}.accept".format(self.__class__))
+
+class MaxEntries(Limit):
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __repr__(self):
+        return "MaxEntries({0})".format(self.entries)
+
+    def accept(self, entries, numitems, numbytes):
+        return entries <= self.entries
+
+class MaxBytes(Limit):
+    def __init__(self, bytes):
+        self.bytes = bytes
+
+    def __repr__(self):
+        return "MaxBytes({0})".format(self.bytes)
+
+    def accept(self, entries, numitems, numbytes):
+        return numbytes <= self.bytes
+
 def fromiterdata(values, generator=None, limit=lambda entries, arrayitems, arraybytes: False, pointer_fromequal=False):
     if generator is None:
         generator = oamap.inference.fromdata(values).generator()
@@ -303,8 +333,9 @@ def fromiterdata(values, generator=None, limit=lambda entries, arrayitems, array
     if not isinstance(generator, oamap.generator.ListGenerator):
         raise TypeError("non-Lists cannot be filled iteratively")
 
-    # starting set of fillables
-    fillables = oamap.fillable.arrays(generator)
+    # starting set of fillables, which keep running totals of their forefronts in a Tally
+    tally = oamap.fillable.Tally()
+    fillables = oamap.fillable.contiguousarrays(generator, tally=tally)
     factor = dict((n, x.dtype.itemsize) for n, x in fillables.items())
     
     pointers = []
@@ -326,16 +357,27 @@ def fromiterdata(values, generator=None, limit=lambda entries, arrayitems, array
         _fromdata_fill(value, generator.content, fillables, targetids, pointerobjs, (), pointerat)
 
         # criteria for ending a limit based on forefront (_potential_ size), rather than len (_accepted_ size)
-        arrayitems = {}
-        arraybytes = {}
-        for n, x in fillables.items():
-            if n in positions_to_pointerobjs:
-                arrayitems[n] = len(pointerobjs[positions_to_pointerobjs[n]])
-            else:
-                arrayitems[n] = x.forefront()
-            arraybytes[n] = arrayitems[n]*factor[n]
+        if isinstance(limit, Limit):
+            # pointer positions are only filled in _fromdata_finish, so they're counted from the pending objects
+            numitems = tally.items
+            numbytes = tally.bytes
+            for n, x in positions_to_pointerobjs.items():
+                numitems += len(pointerobjs[x])
+                numbytes += len(pointerobjs[x])*factor[n]
+            accepted = limit.accept((stop - start) + 1, numitems, numbytes)
+
+        else:
+            arrayitems = {}
+            arraybytes = {}
+            for n, x in fillables.items():
+                if n in positions_to_pointerobjs:
+                    arrayitems[n] = len(pointerobjs[positions_to_pointerobjs[n]])
+                else:
+                    arrayitems[n] = x.forefront()
+                arraybytes[n] = arrayitems[n]*factor[n]
+            accepted = limit((stop - start) + 1, arrayitems, arraybytes)
 
-        if not limit((stop - start) + 1, arrayitems, arraybytes):
+        if not accepted:
             # accepting this entry would make the limit too large
             fillables[generator.starts].append(start)
             fillables[generator.stops].append(stop)
@@ -344,7 +386,8 @@ def fromiterdata(values, generator=None, limit=lambda entries, arrayitems, array
             yield stop - start, toarrays(fillables)
 
             # and make a new set of fillables (along with everything that depends on it)
-            fillables = oamap.fillable.arrays(generator)
+            tally = oamap.fillable.Tally()
+            fillables = oamap.fillable.contiguousarrays(generator, tally=tally)
 
             pointers = []
             pointerobjs_keys = []
@@ -29,9 +29,16 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import json
 import math
 import struct
 import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 import numpy
 
@@ -40,10 +47,29 @@ import oamap.generator
 if sys.version_info[0] > 2:
     xrange = range
 
+class Tally(object):
+    # running totals of items and bytes appended to a set of fillables (the forefront, not the accepted length)
+    def __init__(self):
+        self.items = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return "<Tally {0} items {1} bytes>".format(self.items, self.bytes)
+
+    def add(self, items, itemsize):
+        self.items += items
+        self.bytes += items*itemsize
+
 class Fillable(object):
+    _tally = None
+
     def __init__(self, dtype):
         raise NotImplementedError
 
+    @property
+    def tally(self):
+        return self._tally
+
     def __len__(self):
         return self._len
 
@@ -60,8 +86,13 @@ class Fillable(object):
         self._len = self.forefront()
 
     def revert(self):
+        self._untally()
         self._chunkindex, self._indexinchunk = divmod(self._len, self.chunksize)
 
+    def _untally(self):
+        if self._tally is not None:
+            self._tally.add(self._len - self.forefront(), self.dtype.itemsize)
+
     def close(self):
         pass
 
@@ -120,29 +151,63 @@ def _makefillables(generator, fillables, makefillable):
     else:
         raise AssertionError("unrecognized generator type: {0}".format(generator))
 
-def arrays(generator, chunksize=8192):
+def arrays(generator, chunksize=8192, tally=None):
+    if not isinstance(generator, oamap.generator.Generator):
+        generator = generator.generator()
+    fillables = {}
+    _makefillables(generator, fillables, lambda name, dtype: FillableArray(dtype, chunksize=chunksize, tally=tally))
+    return fillables
+
+def contiguousarrays(generator, initialsize=1024, growth=2.0, tally=None):
+    if not isinstance(generator, oamap.generator.Generator):
+        generator = generator.generator()
+    fillables = {}
+    _makefillables(generator, fillables, lambda name, dtype: FillableContiguousArray(dtype, initialsize=initialsize, growth=growth, tally=tally))
+    return fillables
+
+def files(generator, directory, chunksize=8192, lendigits=16, tally=None, background=0):
+    if not isinstance(generator, oamap.generator.Generator):
+        generator = generator.generator()
+    if not os.path.exists(directory):
+        os.mkdir(directory)
+    fillables = {}
+    _makefillables(generator, fillables, lambda name, dtype: FillableFile(os.path.join(directory, name), dtype, chunksize=chunksize, lendigits=lendigits, tally=tally, background=background))
+    return fillables
+
+def numpyfiles(generator, directory, chunksize=8192, lendigits=16, tally=None, background=0):
+    if not isinstance(generator, oamap.generator.Generator):
+        generator = generator.generator()
+    if not os.path.exists(directory):
+        os.mkdir(directory)
+    fillables = {}
+    _makefillables(generator, fillables, lambda name, dtype: FillableNumpyFile(os.path.join(directory, name), dtype, chunksize=chunksize, lendigits=lendigits, tally=tally, background=background))
+    return fillables
+
+def memmapfiles(generator, directory, initialsize=8192, growth=2.0, lendigits=16, tally=None):
     if not isinstance(generator, oamap.generator.Generator):
         generator = generator.generator()
+    if not os.path.exists(directory):
+        os.mkdir(directory)
     fillables = {}
-    _makefillables(generator, fillables, lambda name, dtype: FillableArray(dtype, chunksize=chunksize))
+    _makefillables(generator, fillables, lambda name, dtype: FillableMemmapFile(os.path.join(directory, name), dtype, initialsize=initialsize, growth=growth, lendigits=lendigits, tally=tally))
     return fillables
 
-def files(generator, directory, chunksize=8192, lendigits=16):
+def memmapnumpyfiles(generator, directory, initialsize=8192, growth=2.0, lendigits=16, tally=None):
     if not isinstance(generator, oamap.generator.Generator):
         generator = generator.generator()
     if not os.path.exists(directory):
         os.mkdir(directory)
     fillables = {}
-    _makefillables(generator, fillables, lambda name, dtype: FillableFile(os.path.join(directory, name), dtype, chunksize=chunksize, lendigits=lendigits))
+    _makefillables(generator, fillables, lambda name, dtype: FillableMemmapNumpyFile(os.path.join(directory, name), dtype, initialsize=initialsize, growth=growth, lendigits=lendigits, tally=tally))
     return fillables
 
-def numpyfiles(generator, directory, chunksize=8192, lendigits=16):
+def compressedfiles(generator, directory, chunksize=8192, compression="zlib", level=None, tally=None):
     if not isinstance(generator, oamap.generator.Generator):
         generator = generator.generator()
     if not os.path.exists(directory):
         os.mkdir(directory)
     fillables = {}
-    _makefillables(generator, fillables, lambda name, dtype: FillableNumpyFile(os.path.join(directory, name), dtype, chunksize=chunksize, lendigits=lendigits))
+    _makefillables(generator, fillables, lambda name, dtype: FillableCompressedFile(os.path.join(directory, name), dtype, chunksize=chunksize, compression=compression, level=level, tally=tally))
     return fillables
 
 ################################################################ FillableArray
@@ -150,13 +215,14 @@ def numpyfiles(generator, directory, chunksize=8192, lendigits=16):
 class FillableArray(Fillable):
     # Numpy arrays and list items have 96+8 byte (80+8 byte) overhead in Python 2 (Python 3)
     # compared to 8192 1-byte values (8-byte values), this is 1% overhead (0.1% overhead)
-    def __init__(self, dtype, chunksize=8192):
+    def __init__(self, dtype, chunksize=8192, tally=None):
         if not isinstance(dtype, numpy.dtype):
             dtype = numpy.dtype(dtype)
         self._data = [numpy.empty(chunksize, dtype=dtype)]
         self._len = 0
         self._indexinchunk = 0
         self._chunkindex = 0
+        self._tally = tally
 
     @property
     def dtype(self):
@@ -175,8 +241,13 @@ class FillableArray(Fillable):
 
         self._data[self._chunkindex][self._indexinchunk] = value
         self._indexinchunk += 1
+        if self._tally is not None:
+            self._tally.add(1, self._data[0].itemsize)
 
     def extend(self, values):
+        if self._tally is not None:
+            self._tally.add(len(values), self._data[0].itemsize)
+
         chunkindex = self._chunkindex
         indexinchunk = self._indexinchunk
 
@@ -285,10 +356,123 @@ class FillableArray(Fillable):
             chunkindex, indexinchunk = divmod(index, self.chunksize)
             return self._data[chunkindex][indexinchunk]
 
+################################################################ FillableContiguousArray
+
+class FillableContiguousArray(Fillable):
+    # one buffer, reallocated by a constant factor when full: amortized O(1) appends and [:] is a view, not a copy
+    def __init__(self, dtype, initialsize=1024, growth=2.0, tally=None):
+        if not isinstance(dtype, numpy.dtype):
+            dtype = numpy.dtype(dtype)
+        if growth <= 1:
+            raise ValueError("growth must be greater than 1")
+        self._data = numpy.empty(max(1, initialsize), dtype=dtype)
+        self._growth = growth
+        self._len = 0
+        self._forefront = 0
+        self._tally = tally
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def capacity(self):
+        return self._data.shape[0]
+
+    def forefront(self):
+        return self._forefront
+
+    def revert(self):
+        self._untally()
+        self._forefront = self._len
+
+    def _grow(self, minimum):
+        # views handed out by __getitem__ keep the old buffer; they only cover accepted (immutable) items
+        newdata = numpy.empty(max(minimum, int(math.ceil(self._data.shape[0] * self._growth))), dtype=self._data.dtype)
+        newdata[:self._forefront] = self._data[:self._forefront]
+        self._data = newdata
+
+    def append(self, value):
+        if self._forefront >= self._data.shape[0]:
+            self._grow(self._forefront + 1)
+
+        self._data[self._forefront] = value
+        self._forefront += 1
+        if self._tally is not None:
+            self._tally.add(1, self._data.itemsize)
+
+    def extend(self, values):
+        if self._tally is not None:
+            self._tally.add(len(values), self._data.itemsize)
+
+        if self._forefront + len(values) > self._data.shape[0]:
+            self._grow(self._forefront + len(values))
+
+        self._data[self._forefront : self._forefront + len(values)] = values
+        self._forefront += len(values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.start is None and index.stop is None and index.step is None:
+                return self._data[:self._len]
+            else:
+                return self._data[:self._len][index]
+
+        else:
+            lenself = len(self)
+            normalindex = index if index >= 0 else index + lenself
+            if not 0 <= normalindex < lenself:
+                raise IndexError("index {0} is out of bounds for size {1}".format(index, lenself))
+            return self._data[normalindex]
+
 ################################################################ FillableFile
 
+class _BackgroundWriter(object):
+    # writes (position, bytes) pairs to a file in FIFO order on a separate thread; at most queuesize are pending
+    def __init__(self, file, queuesize):
+        self._file = file
+        self._queue = queue.Queue(queuesize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    try:
+                        pos, data = item
+                        self._file.seek(pos)
+                        self._file.write(data)
+                    except Exception as err:
+                        self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def write(self, pos, data):
+        self._raise()
+        self._queue.put((pos, data))
+
+    def sync(self):
+        self._queue.join()
+        self._raise()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raise()
+
 class FillableFile(Fillable):
-    def __init__(self, filename, dtype, chunksize=8192, lendigits=16):
+    def __init__(self, filename, dtype, chunksize=8192, lendigits=16, tally=None, background=0):
         if not isinstance(dtype, numpy.dtype):
             dtype = numpy.dtype(dtype)
         self._data = numpy.zeros(chunksize, dtype=dtype)  # 'zeros', not 'empty' for security
@@ -296,7 +480,13 @@ class FillableFile(Fillable):
         self._indexinchunk = 0
         self._chunkindex = 0
         self._filename = filename
+        self._tally = tally
         self._openfile(filename, lendigits)
+        if background > 0:
+            # up to 'background' chunks may be queued for writing while filling continues
+            self._writer = _BackgroundWriter(self._file, background)
+        else:
+            self._writer = None
 
     def _openfile(self, filename, lendigits):
         open(filename, "wb", 0).close()
@@ -319,17 +509,32 @@ class FillableFile(Fillable):
     def append(self, value):
         self._data[self._indexinchunk] = value
         self._indexinchunk += 1
+        if self._tally is not None:
+            self._tally.add(1, self._data.itemsize)
 
         if self._indexinchunk == self.chunksize:
             self._flush()
             self._indexinchunk = 0
             self._chunkindex += 1
 
+    def _write(self, pos, data):
+        if self._writer is None:
+            self._file.seek(pos)
+            self._file.write(data)
+        else:
+            self._writer.write(pos, data)
+
+    def _sync(self):
+        if self._writer is not None:
+            self._writer.sync()
+
     def _flush(self):
-        self._file.seek(self._datapos + self._chunkindex*self.chunksize*self.dtype.itemsize)
-        self._file.write(self._data.tostring())
-        
+        self._write(self._datapos + self._chunkindex*self.chunksize*self.dtype.itemsize, self._data.tostring())
+
     def extend(self, values):
+        if self._tally is not None:
+            self._tally.add(len(values), self._data.itemsize)
+
         chunkindex = self._chunkindex
         indexinchunk = self._indexinchunk
 
@@ -340,8 +545,7 @@ class FillableFile(Fillable):
             values = values[tofill:]
 
             if indexinchunk == self.chunksize:
-                self._file.seek(self._datapos + chunkindex*self.chunksize*self.dtype.itemsize)
-                self._file.write(self._data.tostring())
+                self._write(self._datapos + chunkindex*self.chunksize*self.dtype.itemsize, self._data.tostring())
                 indexinchunk = 0
                 chunkindex += 1
 
@@ -349,8 +553,10 @@ class FillableFile(Fillable):
         self._indexinchunk = indexinchunk
 
     def revert(self):
+        self._untally()
         chunkindex, self._indexinchunk = divmod(self._len, self.chunksize)
         if self._chunkindex != chunkindex:
+            self._sync()
             self._file.seek(self._datapos + chunkindex*self.chunksize*self.dtype.itemsize)
             olddata = numpy.frombuffer(self._file.read(self.chunksize*self.dtype.itemsize), dtype=self.dtype)
             self._data[:len(olddata)] = olddata
@@ -358,9 +564,13 @@ class FillableFile(Fillable):
         self._chunkindex = chunkindex
 
     def close(self):
-        if hasattr(self, "_file"):
-            self._flush()
-            self._file.close()
+        if hasattr(self, "_file") and not self._file.closed:
+            try:
+                self._flush()
+                if getattr(self, "_writer", None) is not None:
+                    self._writer.close()
+            finally:
+                self._file.close()
 
     def __del__(self):
         self.close()
@@ -374,6 +584,7 @@ class FillableFile(Fillable):
     def __getitem__(self, value):
         if not self._file.closed:
             self._flush()
+            self._sync()
 
         if isinstance(value, slice):
             lenself = len(self)
@@ -388,13 +599,13 @@ class FillableFile(Fillable):
 
         else:
             lenself = len(self)
-            normalindex = index if index >= 0 else index + lenself
+            normalindex = value if value >= 0 else value + lenself
             if not 0 <= normalindex < lenself:
-                raise IndexError("index {0} is out of bounds for size {1}".format(index, lenself))
+                raise IndexError("index {0} is out of bounds for size {1}".format(value, lenself))
 
+            itemsize = self.dtype.itemsize
             if not self._file.closed:
                 # since the file's still open, get it from here instead of making a new filehandle
-                itemsize = self.dtype.itemsize
                 try:
                     self._file.seek(self._datapos + normalindex*itemsize)
                     return numpy.frombuffer(self._file.read(itemsize), self.dtype)[0]
@@ -406,31 +617,346 @@ class FillableFile(Fillable):
                     file.seek(self._datapos + normalindex*itemsize)
                     return numpy.frombuffer(file.read(itemsize), self.dtype)[0]
 
-################################################################ FillableNumpyFile (FillableFile with a self-describing header)
+################################################################ FillableMemmapFile (FillableFile as a memory-mapped, preallocated file)
+
+class FillableMemmapFile(Fillable):
+    # the file is grown by a constant factor (ftruncate) and remapped, so appends are memory stores, not syscalls
+    def __init__(self, filename, dtype, initialsize=8192, growth=2.0, lendigits=16, tally=None):
+        if not isinstance(dtype, numpy.dtype):
+            dtype = numpy.dtype(dtype)
+        if growth <= 1:
+            raise ValueError("growth must be greater than 1")
+        self._dtype = dtype
+        self._growth = growth
+        self._len = 0
+        self._forefront = 0
+        self._filename = filename
+        self._tally = tally
+        self._data = None
+        self._openfile(filename, lendigits)
+        self._remap(max(1, initialsize))
 
-class FillableNumpyFile(FillableFile):
     def _openfile(self, filename, lendigits):
-        magic = b"\x93NUMPY\x01\x00"
-        header1 = "{{'descr': {0}, 'fortran_order': False, 'shape': (".format(repr(str(self.dtype))).encode("ascii")
-        header2 = "{0}, }}".format(repr((10**lendigits - 1,))).encode("ascii")[1:]
+        open(filename, "wb", 0).close()
+        self._datapos = 0
+        # a plain file has no header
+
+    def _writelength(self):
+        pass
 
-        unpaddedlen = len(magic) + 2 + len(header1) + len(header2)
-        paddedlen = int(math.ceil(float(unpaddedlen) / self.dtype.itemsize)) * self.dtype.itemsize
-        header2 = header2 + b" " * (paddedlen - unpaddedlen)
-        self._lenpos = len(magic) + 2 + len(header1)
-        self._datapos = len(magic) + 2 + len(header1) + len(header2)
-        assert self._datapos % self.dtype.itemsize == 0
+    def _remap(self, capacity):
+        if self._data is not None:
+            # growing is already a round of syscalls, so the header's length is brought up to date here too
+            self._data.flush()
+            self._writelength()
+        with open(self._filename, "r+b") as file:
+            file.truncate(self._datapos + capacity*self._dtype.itemsize)
+        # views handed out by __getitem__ keep the old mapping alive; they only cover accepted items
+        self._data = numpy.memmap(self._filename, self._dtype, "r+", self._datapos, (capacity,), "C")
 
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def capacity(self):
+        return 0 if self._data is None else self._data.shape[0]
+
+    @property
+    def closed(self):
+        return self._data is None
+
+    def forefront(self):
+        return self._forefront
+
+    def revert(self):
+        self._untally()
+        self._forefront = self._len
+
+    def append(self, value):
+        if self._forefront >= self._data.shape[0]:
+            self._remap(max(self._forefront + 1, int(math.ceil(self._data.shape[0] * self._growth))))
+
+        self._data[self._forefront] = value
+        self._forefront += 1
+        if self._tally is not None:
+            self._tally.add(1, self._dtype.itemsize)
+
+    def extend(self, values):
+        if self._tally is not None:
+            self._tally.add(len(values), self._dtype.itemsize)
+
+        if self._forefront + len(values) > self._data.shape[0]:
+            self._remap(max(self._forefront + len(values), int(math.ceil(self._data.shape[0] * self._growth))))
+
+        self._data[self._forefront : self._forefront + len(values)] = values
+        self._forefront += len(values)
+
+    def flush(self):
+        if self._data is not None:
+            self._data.flush()
+            self._writelength()
+
+    def close(self):
+        if getattr(self, "_data", None) is not None:
+            self.flush()
+            self._data = None
+            # drop the preallocated tail so that the file holds exactly the accepted items
+            with open(self._filename, "r+b") as file:
+                file.truncate(self._datapos + self._len*self._dtype.itemsize)
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self, *args, **kwds):
+        return self
+
+    def __exit__(self, *args, **kwds):
+        self.close()
+
+    def __getitem__(self, index):
+        if self._data is not None:
+            # reads are memory loads; the length in the file's header is only written by append/extend (on growth), flush, and close
+            array = self._data[:self._len]
+        elif self._len == 0:
+            array = numpy.empty(0, dtype=self._dtype)
+        else:
+            array = numpy.memmap(self._filename, self._dtype, "r", self._datapos, self._len, "C")
+
+        if isinstance(index, slice):
+            if index.start is None and index.stop is None and index.step is None:
+                return array
+            else:
+                return array[index]
+
+        else:
+            lenself = len(self)
+            normalindex = index if index >= 0 else index + lenself
+            if not 0 <= normalindex < lenself:
+                raise IndexError("index {0} is out of bounds for size {1}".format(index, lenself))
+            return array[normalindex]
+
+class FillableMemmapNumpyFile(FillableMemmapFile):
+    def _openfile(self, filename, lendigits):
+        header, self._lenpos, self._datapos, self._formatter = _numpyheader(self._dtype, lendigits)
+        with open(filename, "wb") as file:
+            file.write(header)
+
+    def _writelength(self):
+        with open(self._filename, "r+b") as file:
+            file.seek(self._lenpos)
+            file.write(self._formatter.format(len(self)).encode("ascii"))
+
+################################################################ FillableNumpyFile (FillableFile with a self-describing header)
+
+class FillableNumpyFile(FillableFile):
+    def _openfile(self, filename, lendigits):
+        header, self._lenpos, self._datapos, self._formatter = _numpyheader(self.dtype, lendigits)
         open(filename, "wb", 0).close()
         self._file = open(filename, "r+b", 0)
-        self._formatter = "{0:%dd}" % lendigits
-        self._file.write(magic)
-        self._file.write(struct.pack("<H", len(header1) + len(header2)))
-        self._file.write(header1)
-        self._file.write(self._formatter.format(len(self)).encode("ascii"))
-        self._file.write(header2[lendigits:])
+        self._file.write(header)
 
     def _flush(self):
         super(FillableNumpyFile, self)._flush()
-        self._file.seek(self._lenpos)
-        self._file.write(self._formatter.format(len(self)).encode("ascii"))
+        self._write(self._lenpos, self._formatter.format(len(self)).encode("ascii"))
+
+def _numpyheader(dtype, lendigits):
+    # a version 1.0 .npy header whose shape has room for lendigits digits, to be overwritten as the array grows
+    magic = b"\x93NUMPY\x01\x00"
+    header1 = "{{'descr': {0}, 'fortran_order': False, 'shape': (".format(repr(str(dtype))).encode("ascii")
+    header2 = "{0}, }}".format(repr((10**lendigits - 1,))).encode("ascii")[1:]
+
+    unpaddedlen = len(magic) + 2 + len(header1) + len(header2)
+    paddedlen = int(math.ceil(float(unpaddedlen) / dtype.itemsize)) * dtype.itemsize
+    header2 = header2 + b" " * (paddedlen - unpaddedlen)
+    lenpos = len(magic) + 2 + len(header1)
+    datapos = len(magic) + 2 + len(header1) + len(header2)
+    assert datapos % dtype.itemsize == 0
+
+    formatter = "{0:%dd}" % lendigits
+    header = magic + struct.pack("<H", len(header1) + len(header2)) + header1 + formatter.format(0).encode("ascii") + header2[lendigits:]
+    return header, lenpos, datapos, formatter
+
+################################################################ FillableCompressedFile (FillableFile with each chunk compressed)
+
+def compressor(name, level=None):
+    if name == "zlib":
+        import zlib
+        if level is None:
+            level = -1
+        return lambda data: zlib.compress(data, level), zlib.decompress
+
+    elif name == "lzma":
+        try:
+            import lzma
+        except ImportError:
+            from backports import lzma
+        return lambda data: lzma.compress(data, preset=level), lzma.decompress
+
+    elif name == "lz4":
+        import lz4.frame
+        if level is None:
+            level = 0
+        return lambda data: lz4.frame.compress(data, compression_level=level), lz4.frame.decompress
+
+    elif name == "zstd":
+        import zstandard
+        if level is None:
+            level = 3
+        compressor = zstandard.ZstdCompressor(level=level)
+        decompressor = zstandard.ZstdDecompressor()
+        return compressor.compress, decompressor.decompress
+
+    else:
+        raise ValueError("unrecognized compression algorithm: {0}".format(repr(name)))
+
+def _getchunked(index, length, chunksize, getchunk, dtype):
+    # index into a sequence of chunks, decompressing only the chunks that the index touches
+    if isinstance(index, slice):
+        start, stop, step = index.indices(length)
+        if step > 0:
+            lo, hi = start, stop
+        else:
+            lo, hi = stop + 1, start + 1
+        if hi <= lo:
+            return numpy.empty(0, dtype=dtype)
+
+        first, last = lo // chunksize, (hi - 1) // chunksize
+        array = numpy.concatenate([getchunk(i) for i in xrange(first, last + 1)])[lo - first*chunksize : hi - first*chunksize]
+        if step > 0:
+            return array[::step]
+        else:
+            return array[::-1][::-step]
+
+    else:
+        normalindex = index if index >= 0 else index + length
+        if not 0 <= normalindex < length:
+            raise IndexError("index {0} is out of bounds for size {1}".format(index, length))
+        chunkindex, indexinchunk = divmod(normalindex, chunksize)
+        return getchunk(chunkindex)[indexinchunk]
+
+class FillableCompressedFile(Fillable):
+    # file layout: magic, compressed chunks, JSON index (dtype, chunksize, compression, length, chunk offsets), 8-byte index size, magic
+    magic = b"oamapZ01"
+
+    def __init__(self, filename, dtype, chunksize=8192, compression="zlib", level=None, tally=None):
+        if not isinstance(dtype, numpy.dtype):
+            dtype = numpy.dtype(dtype)
+        self._data = numpy.zeros(chunksize, dtype=dtype)  # 'zeros', not 'empty' for security
+        self._len = 0
+        self._indexinchunk = 0
+        self._chunkindex = 0
+        self._filename = filename
+        self._tally = tally
+        self._compression = compression
+        self._compress, self._decompress = compressor(compression, level)
+        self._offsets = [len(self.magic)]   # chunk i is in bytes [offsets[i], offsets[i + 1])
+        self._file = open(filename, "w+b")
+        self._file.write(self.magic)
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def chunksize(self):
+        return self._data.shape[0]
+
+    @property
+    def compression(self):
+        return self._compression
+
+    def append(self, value):
+        self._data[self._indexinchunk] = value
+        self._indexinchunk += 1
+        if self._tally is not None:
+            self._tally.add(1, self._data.itemsize)
+
+        if self._indexinchunk == self.chunksize:
+            self._flush(self._data)
+            self._indexinchunk = 0
+            self._chunkindex += 1
+
+    def _flush(self, data):
+        compressed = self._compress(data.tostring())
+        self._file.seek(self._offsets[-1])
+        self._file.write(compressed)
+        self._offsets.append(self._offsets[-1] + len(compressed))
+
+    def extend(self, values):
+        if self._tally is not None:
+            self._tally.add(len(values), self._data.itemsize)
+
+        while len(values) > 0:
+            tofill = min(len(values), self.chunksize - self._indexinchunk)
+            self._data[self._indexinchunk : self._indexinchunk + tofill] = values[:tofill]
+            self._indexinchunk += tofill
+            values = values[tofill:]
+
+            if self._indexinchunk == self.chunksize:
+                self._flush(self._data)
+                self._indexinchunk = 0
+                self._chunkindex += 1
+
+    def _readchunk(self, chunkindex):
+        self._file.seek(self._offsets[chunkindex])
+        return numpy.frombuffer(self._decompress(self._file.read(self._offsets[chunkindex + 1] - self._offsets[chunkindex])), dtype=self.dtype)
+
+    def _rewind(self):
+        # drop everything beyond the accepted length, including compressed chunks that have already been written
+        chunkindex, self._indexinchunk = divmod(self._len, self.chunksize)
+        if self._chunkindex != chunkindex:
+            olddata = self._readchunk(chunkindex)
+            self._data[:len(olddata)] = olddata
+            del self._offsets[chunkindex + 1:]
+            self._file.truncate(self._offsets[-1])
+        self._chunkindex = chunkindex
+
+    def revert(self):
+        self._untally()
+        self._rewind()
+
+    def close(self):
+        if hasattr(self, "_file") and not self._file.closed:
+            try:
+                self._rewind()
+                if self._indexinchunk > 0:
+                    self._flush(self._data[:self._indexinchunk])
+                index = json.dumps({"dtype": self.dtype.str, "chunksize": self.chunksize, "compression": self._compression, "length": self._len, "offsets": self._offsets}).encode("ascii")
+                self._file.seek(self._offsets[-1])
+                self._file.write(index)
+                self._file.write(struct.pack("<Q", len(index)))
+                self._file.write(self.magic)
+                self._file.truncate()
+            finally:
+                self._file.close()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self, *args, **kwds):
+        return self
+
+    def __exit__(self, *args, **kwds):
+        self.close()
+
+    def _getchunk(self, chunkindex):
+        if not self._file.closed and chunkindex == self._chunkindex:
+            return self._data
+        elif not self._file.closed:
+            return self._readchunk(chunkindex)
+        else:
+            with open(self._filename, "rb") as file:
+                file.seek(self._offsets[chunkindex])
+                return numpy.frombuffer(self._decompress(file.read(self._offsets[chunkindex + 1] - self._offsets[chunkindex])), dtype=self.dtype)
+
+    def __getitem__(self, index):
+        return _getchunked(index, len(self), self.chunksize, self._getchunk, self.dtype)
@@ -28,6 +28,7 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import copy
 import sys
 import datetime
 import os
@@ -131,6 +132,16 @@ class Generator(object):
         self.id = self.nextid()
         self._required = False
 
+    def _copy(self, memo=None):
+        # same structure and schema, but new ids and no runtime state (like _new, but leaves the original alone)
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = memo[id(self)] = copy.copy(self)
+            out.id = self.nextid()
+            out._required = False
+        return memo[id(self)]
+
     def fromdata(self, value, pointer_fromequal=False):
         import oamap.fill
         return self(oamap.fill.fromdata(value, generator=self, pointer_fromequal=pointer_fromequal))
@@ -388,6 +399,14 @@ class ListGenerator(Generator):
             super(ListGenerator, self)._new(memo)
             self.content._new(memo)
 
+    def _copy(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = super(ListGenerator, self)._copy(memo)
+            out.content = self.content._copy(memo)
+        return memo[id(self)]
+
     def _toget(self, arrays, cache):
         starts = StartsRole(self.starts, self.namespace, None)
         stops = StopsRole(self.stops, self.namespace, None)
@@ -529,6 +548,14 @@ class UnionGenerator(Generator):
             for x in self.possibilities:
                 x._new(memo)
 
+    def _copy(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = super(UnionGenerator, self)._copy(memo)
+            out.possibilities = [x._copy(memo) for x in self.possibilities]
+        return memo[id(self)]
+
     def _toget(self, arrays, cache):
         tags = TagsRole(self.tags, self.namespace, None)
         offsets = OffsetsRole(self.offsets, self.namespace, None)
@@ -664,6 +691,14 @@ class RecordGenerator(Generator):
             for x in self.fields.values():
                 x._new(memo)
 
+    def _copy(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = super(RecordGenerator, self)._copy(memo)
+            out.fields = OrderedDict((n, x._copy(memo)) for n, x in self.fields.items())
+        return memo[id(self)]
+
     def _toget(self, arrays, cache):
         return OrderedDict()
 
@@ -754,6 +789,14 @@ class TupleGenerator(Generator):
             for x in self.types:
                 x._new(memo)
 
+    def _copy(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = super(TupleGenerator, self)._copy(memo)
+            out.types = [x._copy(memo) for x in self.types]
+        return memo[id(self)]
+
     def _toget(self, arrays, cache):
         return OrderedDict()
 
@@ -846,6 +889,14 @@ class PointerGenerator(Generator):
             super(PointerGenerator, self)._new(memo)
             self.target._new(memo)
 
+    def _copy(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = super(PointerGenerator, self)._copy(memo)
+            out.target = self.target._copy(memo)
+        return memo[id(self)]
+
     def _toget(self, arrays, cache):
         return OrderedDict([(PositionsRole(self.positions, self.namespace), (self.positionsidx, self.posdtype))])
 
@@ -968,6 +1019,14 @@ class ExtendedGenerator(Generator):
             super(ExtendedGenerator, self)._new(memo)
             self.generic._new(memo)
 
+    def _copy(self, memo=None):
+        if memo is None:
+            memo = {}
+        if id(self) not in memo:
+            out = super(ExtendedGenerator, self)._copy(memo)
+            out.generic = self.generic._copy(memo)
+        return memo[id(self)]
+
     def _toget(self, arrays, cache):
         return self.generic._toget(arrays, cache)
 
@@ -30,6 +30,8 @@
 
 import re
 import numbers
+import itertools
+import random
 import sys
 import math
 
@@ -43,341 +45,429 @@ if sys.version_info[0] > 2:
 
 ################################################################ inferring schemas from data
 
-def fromdata(obj, limit=None):
-    if limit is None or (isinstance(limit, (numbers.Integral, numpy.integer)) and limit >= 0):
-        pass
-    else:
-        raise TypeError("limit must be None or a non-negative integer, not {0}".format(limit))
-
-    class Intermediate(object):
-        def __init__(self, nullable):
-            self.nullable = nullable
-
-    class Unknown(Intermediate):
-        def resolve(self):
-            raise TypeError("could not resolve a type (e.g. all examples of a List-typed attribute are empty, can't determine its content type)")
-
-    class Boolean(Intermediate):
-        def resolve(self):
-            return oamap.schema.Primitive(numpy.dtype(numpy.bool_), nullable=self.nullable)
-
-    class Number(Intermediate):
-        max_uint8 = numpy.iinfo(numpy.uint8).max
-        max_uint16 = numpy.iinfo(numpy.uint16).max
-        max_uint32 = numpy.iinfo(numpy.uint32).max
-        max_uint64 = numpy.iinfo(numpy.uint64).max
-        min_int8 = numpy.iinfo(numpy.int8).min
-        max_int8 = numpy.iinfo(numpy.int8).max
-        min_int16 = numpy.iinfo(numpy.int16).min
-        max_int16 = numpy.iinfo(numpy.int16).max
-        min_int32 = numpy.iinfo(numpy.int32).min
-        max_int32 = numpy.iinfo(numpy.int32).max
-        min_int64 = numpy.iinfo(numpy.int64).min
-        max_int64 = numpy.iinfo(numpy.int64).max
-        def __init__(self, nullable, min, max, whole, real):
-            Intermediate.__init__(self, nullable)
-            self.min = min
-            self.max = max
-            self.whole = whole
-            self.real = real
-        def resolve(self):
-            if self.whole:
-                if self.min >= 0:
-                    if self.max <= self.max_uint8:
-                        t = numpy.uint8
-                    elif self.max <= self.max_uint16:
-                        t = numpy.uint16
-                    elif self.max <= self.max_uint32:
-                        t = numpy.uint32
-                    elif self.max <= self.max_uint64:
-                        t = numpy.uint64
-                    else:
-                        t = numpy.float64
+class Intermediate(object):
+    def __init__(self, nullable):
+        self.nullable = nullable
+
+class Unknown(Intermediate):
+    def resolve(self):
+        raise TypeError("could not resolve a type (e.g. all examples of a List-typed attribute are empty, can't determine its content type)")
+
+class Boolean(Intermediate):
+    def resolve(self):
+        return oamap.schema.Primitive(numpy.dtype(numpy.bool_), nullable=self.nullable)
+
+class Number(Intermediate):
+    max_uint8 = numpy.iinfo(numpy.uint8).max
+    max_uint16 = numpy.iinfo(numpy.uint16).max
+    max_uint32 = numpy.iinfo(numpy.uint32).max
+    max_uint64 = numpy.iinfo(numpy.uint64).max
+    min_int8 = numpy.iinfo(numpy.int8).min
+    max_int8 = numpy.iinfo(numpy.int8).max
+    min_int16 = numpy.iinfo(numpy.int16).min
+    max_int16 = numpy.iinfo(numpy.int16).max
+    min_int32 = numpy.iinfo(numpy.int32).min
+    max_int32 = numpy.iinfo(numpy.int32).max
+    min_int64 = numpy.iinfo(numpy.int64).min
+    max_int64 = numpy.iinfo(numpy.int64).max
+    def __init__(self, nullable, min, max, whole, real):
+        Intermediate.__init__(self, nullable)
+        self.min = min
+        self.max = max
+        self.whole = whole
+        self.real = real
+    def resolve(self):
+        if self.whole:
+            if self.min >= 0:
+                if self.max <= self.max_uint8:
+                    t = numpy.uint8
+                elif self.max <= self.max_uint16:
+                    t = numpy.uint16
+                elif self.max <= self.max_uint32:
+                    t = numpy.uint32
+                elif self.max <= self.max_uint64:
+                    t = numpy.uint64
                 else:
-                    if self.min_int8 <= self.min and self.max <= self.max_int8:
-                        t = numpy.int8
-                    elif self.min_int16 <= self.min and self.max <= self.max_int16:
-                        t = numpy.int16
-                    elif self.min_int32 <= self.min and self.max <= self.max_int32:
-                        t = numpy.int32
-                    elif self.min_int64 <= self.min and self.max <= self.max_int64:
-                        t = numpy.int64
-                    else:
-                        t = numpy.float64
-            elif self.real:
-                t = numpy.float64
+                    t = numpy.float64
             else:
-                t = numpy.complex128
-            return oamap.schema.Primitive(numpy.dtype(t), nullable=self.nullable)
+                if self.min_int8 <= self.min and self.max <= self.max_int8:
+                    t = numpy.int8
+                elif self.min_int16 <= self.min and self.max <= self.max_int16:
+                    t = numpy.int16
+                elif self.min_int32 <= self.min and self.max <= self.max_int32:
+                    t = numpy.int32
+                elif self.min_int64 <= self.min and self.max <= self.max_int64:
+                    t = numpy.int64
+                else:
+                    t = numpy.float64
+        elif self.real:
+            t = numpy.float64
+        else:
+            t = numpy.complex128
+        return oamap.schema.Primitive(numpy.dtype(t), nullable=self.nullable)
+
+class String(Intermediate):
+    def __init__(self, nullable, utf8):
+        Intermediate.__init__(self, nullable)
+        self.utf8 = utf8
+    def resolve(self):
+        return oamap.schema.List(oamap.schema.Primitive(numpy.uint8), nullable=self.nullable, name=("UTF8String" if self.utf8 else "ByteString"))
+
+class IntermediateList(Intermediate):
+    def __init__(self, nullable, content):
+        Intermediate.__init__(self, nullable)
+        self.content = content
+    def resolve(self):
+        return oamap.schema.List(self.content.resolve(), nullable=self.nullable)
+
+class IntermediateRecord(Intermediate):
+    def __init__(self, nullable, fields, name):
+        Intermediate.__init__(self, nullable)
+        self.fields = fields
+        self.name = name
+    def resolve(self):
+        return oamap.schema.Record(dict((n, x.resolve()) for n, x in self.fields.items()), nullable=self.nullable, name=self.name)
+
+class IntermediateTuple(Intermediate):
+    def __init__(self, nullable, types):
+        Intermediate.__init__(self, nullable)
+        self.types = types
+    def resolve(self):
+        return oamap.schema.Tuple([x.resolve() for x in self.types], nullable=self.nullable)
+
+# Unions are special for type-inference
+class IntermediateUnion(Intermediate):
+    def __init__(self, nullable, possibilities):
+        Intermediate.__init__(self, nullable)
+        self.possibilities = possibilities
+    def resolve(self):
+        return oamap.schema.Union([x.resolve() for x in self.possibilities], nullable=self.nullable)
+
+# no Pointers in type-inference (we'd have to keep a big map of *everything*!)
+
+def flatten(possibilities):
+    # unions are expanded in place, so that the order is the order of first appearance, whether possibilities
+    # are unified all at once (unify) or as they stream in (unifyall)
+    return [y for x in possibilities for y in (x.possibilities if isinstance(x, IntermediateUnion) else [x])]
+
+def unify2(x, y):
+    nullable = x.nullable or y.nullable
+
+    if isinstance(x, Unknown) and isinstance(y, Unknown):
+        return Unknown(nullable)
+
+    elif isinstance(x, Unknown):
+        y.nullable = nullable
+        return y
+
+    elif isinstance(y, Unknown):
+        x.nullable = nullable
+        return x
+
+    elif isinstance(x, Boolean) and isinstance(y, Boolean):
+        return Boolean(nullable)
+
+    elif isinstance(x, Number) and isinstance(y, Number):
+        return Number(nullable, min(x.min, y.min), max(x.max, y.max), x.whole and y.whole, x.real and y.real)
+
+    elif isinstance(x, String) and isinstance(y, String):
+        return String(nullable, x.utf8 or y.utf8)
+
+    elif isinstance(x, IntermediateList) and isinstance(y, IntermediateList):
+        return IntermediateList(nullable, unify2(x.content, y.content))
+
+    elif isinstance(x, IntermediateRecord) and isinstance(y, IntermediateRecord) and set(x.fields) == set(y.fields) and (x.name is None or y.name is None or x.name == y.name):
+        return IntermediateRecord(nullable, dict((n, unify2(x.fields[n], y.fields[n])) for n in x.fields), name=(y.name if x.name is None else x.name))
+
+    elif isinstance(x, IntermediateTuple) and isinstance(y, IntermediateTuple) and len(x.types) == len(y.types):
+        return IntermediateTuple(nullable, [unify2(xi, yi) for xi, yi in zip(x.types, y.types)])
+
+    elif isinstance(x, IntermediateUnion) and isinstance(y, IntermediateUnion):
+        return unify(x.possibilities + y.possibilities)
+
+    elif isinstance(x, IntermediateUnion):
+        return unify(x.possibilities + [y])
+
+    elif isinstance(y, IntermediateUnion):
+        return unify([x] + y.possibilities)
 
-    class String(Intermediate):
-        def __init__(self, nullable, utf8):
-            Intermediate.__init__(self, nullable)
-            self.utf8 = utf8
-        def resolve(self):
-            return oamap.schema.List(oamap.schema.Primitive(numpy.uint8), nullable=self.nullable, name=("UTF8String" if self.utf8 else "ByteString"))
+    else:
+        # can't be unified
+        return IntermediateUnion(nullable, flatten([x, y]))
 
-    class IntermediateList(Intermediate):
-        def __init__(self, nullable, content):
-            Intermediate.__init__(self, nullable)
-            self.content = content
-        def resolve(self):
-            return oamap.schema.List(self.content.resolve(), nullable=self.nullable)
+def unify(possibilities):
+    if len(possibilities) == 0:
+        return Unknown(False)
 
-    class IntermediateRecord(Intermediate):
-        def __init__(self, nullable, fields, name):
-            Intermediate.__init__(self, nullable)
-            self.fields = fields
-            self.name = name
-        def resolve(self):
-            return oamap.schema.Record(dict((n, x.resolve()) for n, x in self.fields.items()), nullable=self.nullable, name=self.name)
+    elif len(possibilities) == 1:
+        return possibilities[0]
 
-    class IntermediateTuple(Intermediate):
-        def __init__(self, nullable, types):
-            Intermediate.__init__(self, nullable)
-            self.types = types
-        def resolve(self):
-            return oamap.schema.Tuple([x.resolve() for x in self.types], nullable=self.nullable)
+    elif len(possibilities) == 2:
+        return unify2(possibilities[0], possibilities[1])
 
-    # Unions are special for type-inference
-    class IntermediateUnion(Intermediate):
-        def __init__(self, nullable, possibilities):
-            Intermediate.__init__(self, nullable)
-            self.possibilities = possibilities
-        def resolve(self):
-            return oamap.schema.Union([x.resolve() for x in self.possibilities], nullable=self.nullable)
+    else:
+        distinct = []
+        for x in flatten(possibilities):
+            adddistinct(distinct, x)
 
-    # no Pointers in type-inference (we'd have to keep a big map of *everything*!)
+        if len(distinct) == 1:
+            return distinct[0]
+        else:
+            return IntermediateUnion(False, flatten(distinct))
+
+def adddistinct(distinct, x):
+    for i, y in enumerate(distinct):
+        merged = unify2(x, y)
+        if not isinstance(merged, IntermediateUnion):
+            distinct[i] = merged
+            return
+    distinct.append(x)
+
+def unifyall(intermediates):
+    # same as unify(list(intermediates)), but merges as it goes, so that the intermediates are never all in memory
+    held = []
+    distinct = None
+    for x in intermediates:
+        if distinct is None:
+            held.append(x)
+            if len(held) < 3:
+                continue
+            distinct = []
+            toadd = flatten(held)
+        else:
+            toadd = flatten([x])
 
-    def flatten(possibilities):
-        return [y for x in possibilities if isinstance(x, IntermediateUnion) for y in x.possibilities] + [x for x in possibilities if not isinstance(x, IntermediateUnion)]
+        for y in toadd:
+            adddistinct(distinct, y)
 
-    def unify2(x, y):
-        nullable = x.nullable or y.nullable
+    if distinct is None:
+        return unify(held)
+    elif len(distinct) == 1:
+        return distinct[0]
+    else:
+        return IntermediateUnion(False, flatten(distinct))
 
-        if isinstance(x, Unknown) and isinstance(y, Unknown):
-            return Unknown(nullable)
+def buildintermediate(obj, limit, memo):
+    if id(obj) in memo:
+        raise ValueError("cyclic reference in Python object at {0} (Pointer types cannot be inferred)".format(obj))
 
-        elif isinstance(x, Unknown):
-            y.nullable = nullable
-            return y
+    # by copying, rather than modifying in-place (memo.add), we find cyclic references, rather than DAGs
+    memo = memo.union(set([id(obj)]))
 
-        elif isinstance(y, Unknown):
-            x.nullable = nullable
-            return x
+    if obj is None:
+        return Unknown(True)
 
-        elif isinstance(x, Boolean) and isinstance(y, Boolean):
-            return Boolean(nullable)
+    elif obj is False or obj is True:
+        return Boolean(False)
 
-        elif isinstance(x, Number) and isinstance(y, Number):
-            return Number(nullable, min(x.min, y.min), max(x.max, y.max), x.whole and y.whole, x.real and y.real)
+    elif isinstance(obj, (numbers.Integral, numpy.integer)):
+        return Number(False, int(obj), int(obj), True, True)
 
-        elif isinstance(x, String) and isinstance(y, String):
-            return String(nullable, x.utf8 or y.utf8)
+    elif isinstance(obj, (numbers.Real, numpy.floating)):
+        return Number(False, float(obj), float(obj), False, True)
 
-        elif isinstance(x, IntermediateList) and isinstance(y, IntermediateList):
-            return IntermediateList(nullable, unify2(x.content, y.content))
+    elif isinstance(obj, (numbers.Complex, numpy.complex)):
+        return Number(False, float("-inf"), float("inf"), False, False)
 
-        elif isinstance(x, IntermediateRecord) and isinstance(y, IntermediateRecord) and set(x.fields) == set(y.fields) and (x.name is None or y.name is None or x.name == y.name):
-            return IntermediateRecord(nullable, dict((n, unify2(x.fields[n], y.fields[n])) for n in x.fields), name=(y.name if x.name is None else x.name))
+    elif isinstance(obj, bytes):
+        return String(False, False)
 
-        elif isinstance(x, IntermediateTuple) and isinstance(y, IntermediateTuple) and len(x.types) == len(y.types):
-            return IntermediateTuple(nullable, [unify2(xi, yi) for xi, yi in zip(x.types, y.types)])
+    elif isinstance(obj, basestring):
+        return String(False, True)
 
-        elif isinstance(x, IntermediateUnion) and isinstance(y, IntermediateUnion):
-            return unify(x.possibilities + y.possibilities)
+    elif isinstance(obj, dict):
+        return IntermediateRecord(False, dict((n, buildintermediate(x, limit, memo)) for n, x in obj.items()), None)
 
-        elif isinstance(x, IntermediateUnion):
-            return unify(x.possibilities + [y])
+    elif isinstance(obj, tuple) and hasattr(obj, "_fields"):
+        # this is a namedtuple; interpret it as a Record, rather than a Tuple
+        return IntermediateRecord(False, dict((n, buildintermediate(getattr(obj, n), limit, memo)) for n in obj._fields), obj.__class__.__name__)
 
-        elif isinstance(y, IntermediateUnion):
-            return unify([x] + y.possibilities)
+    elif isinstance(obj, tuple):
+        return IntermediateTuple(False, [buildintermediate(x, limit, memo) for x in obj])
 
+    else:
+        try:
+            limited = []
+            for x in obj:
+                if limit is None or len(limited) < limit:
+                    limited.append(x)
+                else:
+                    break
+        except TypeError:
+            # not iterable, so interpret it as a Record
+            return IntermediateRecord(False, dict((n, buildintermediate(getattr(obj, n), limit, memo)) for n in dir(obj) if not n.startswith("_") and not callable(getattr(obj, n))), obj.__class__.__name__)
         else:
-            # can't be unified
-            return IntermediateUnion(nullable, flatten([x, y]))
-
-    def unify(possibilities):
-        if len(possibilities) == 0:
-            return Unknown(False)
+            # iterable, so interpret it as a List (unified as we go, so that all the intermediates never exist at once)
+            return IntermediateList(False, unifyall(buildintermediate(x, None, memo) for x in limited))
 
-        elif len(possibilities) == 1:
-            return possibilities[0]
-
-        elif len(possibilities) == 2:
-            return unify2(possibilities[0], possibilities[1])
-
-        else:
-            distinct = []
-            for x in flatten(possibilities):
-                found = False
 
-                for i, y in enumerate(distinct):
-                    merged = unify2(x, y)
-                    if not isinstance(merged, IntermediateUnion):
-                        distinct[i] = merged
-                        found = True
-                        break
+def fromdata(obj, limit=None):
+    if limit is None or (isinstance(limit, (numbers.Integral, numpy.integer)) and limit >= 0):
+        pass
+    else:
+        raise TypeError("limit must be None or a non-negative integer, not {0}".format(limit))
 
-                if not found:
-                    distinct.append(x)
+    return buildintermediate(obj, limit, set()).resolve()
 
-            if len(distinct) == 1:
-                return distinct[0]
+def _sampled(iterable, first, sample, seed):
+    # all of the first 'first' items, then a uniform reservoir sample of 'sample' items from the rest
+    iterable = iter(iterable)
+    if first is None and sample is None:
+        for x in iterable:
+            yield x
+        return
+
+    if first is not None:
+        for x in itertools.islice(iterable, first):
+            yield x
+
+    if sample is not None and sample > 0:
+        rand = random.Random(seed)
+        reservoir = []
+        for i, x in enumerate(iterable):
+            if i < sample:
+                reservoir.append(x)
             else:
-                return IntermediateUnion(False, flatten(distinct))
-
-    def buildintermediate(obj, limit, memo):
-        if id(obj) in memo:
-            raise ValueError("cyclic reference in Python object at {0} (Pointer types cannot be inferred)".format(obj))
-
-        # by copying, rather than modifying in-place (memo.add), we find cyclic references, rather than DAGs
-        memo = memo.union(set([id(obj)]))
-
-        if obj is None:
-            return Unknown(True)
-
-        elif obj is False or obj is True:
-            return Boolean(False)
-
-        elif isinstance(obj, (numbers.Integral, numpy.integer)):
-            return Number(False, int(obj), int(obj), True, True)
-
-        elif isinstance(obj, (numbers.Real, numpy.floating)):
-            return Number(False, float(obj), float(obj), False, True)
-
-        elif isinstance(obj, (numbers.Complex, numpy.complex)):
-            return Number(False, float("-inf"), float("inf"), False, False)
+                j = rand.randint(0, i)
+                if j < sample:
+                    reservoir[j] = x
+        for x in reservoir:
+            yield x
+
+def _chunked(iterable, chunksize):
+    chunk = []
+    for x in iterable:
+        chunk.append(x)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+def _inferchunk(chunk):
+    return unifyall(buildintermediate(x, None, set()) for x in chunk)
+
+def _inparallel(executor, chunks, maxpending=16):
+    # keep a bounded number of chunks in flight so that a long input is never all in memory at once
+    pending = []
+    for chunk in chunks:
+        pending.append(executor.submit(_inferchunk, chunk))
+        if len(pending) >= maxpending:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+def fromiterdata(iterable, first=None, sample=None, seed=None, executor=None, chunksize=1000):
+    for n, x in ("first", first), ("sample", sample):
+        if x is None or (isinstance(x, (numbers.Integral, numpy.integer)) and x >= 0):
+            pass
+        else:
+            raise TypeError("{0} must be None or a non-negative integer, not {1}".format(n, x))
+    if not isinstance(chunksize, (numbers.Integral, numpy.integer)) or chunksize <= 0:
+        raise TypeError("chunksize must be a positive integer, not {0}".format(chunksize))
 
-        elif isinstance(obj, bytes):
-            return String(False, False)
+    items = _sampled(iterable, first, sample, seed)
 
-        elif isinstance(obj, basestring):
-            return String(False, True)
+    if executor is None:
+        content = unifyall(buildintermediate(x, None, set()) for x in items)
 
-        elif isinstance(obj, dict):
-            return IntermediateRecord(False, dict((n, buildintermediate(x, limit, memo)) for n, x in obj.items()), None)
+    else:
+        # intermediates are plain objects, so partial results from worker processes can be unified here
+        content = unifyall(_inparallel(executor, _chunked(items, chunksize)))
 
-        elif isinstance(obj, tuple) and hasattr(obj, "_fields"):
-            # this is a namedtuple; interpret it as a Record, rather than a Tuple
-            return IntermediateRecord(False, dict((n, buildintermediate(getattr(obj, n), limit, memo)) for n in obj._fields), obj.__class__.__name__)
+    return oamap.schema.List(content.resolve())
 
-        elif isinstance(obj, tuple):
-            return IntermediateTuple(False, [buildintermediate(x, limit, memo) for x in obj])
+################################################################ inferring schemas from a namespace
 
-        else:
-            try:
-                limited = []
-                for x in obj:
-                    if limit is None or len(limited) < limit:
-                        limited.append(x)
-                    else:
-                        break
-            except TypeError:
-                # not iterable, so interpret it as a Record
-                return IntermediateRecord(False, dict((n, buildintermediate(getattr(obj, n), limit, memo)) for n in dir(obj) if not n.startswith("_") and not callable(getattr(obj, n))), obj.__class__.__name__)
+def fromnames(arraynames, prefix="object", delimiter="-"):
+    # parse the names once into a trie of delimiter-separated tokens; None marks a node that is itself an array name
+    def insert(trie, tokens):
+        node = trie
+        for i, token in enumerate(tokens):
+            if token.startswith("D"):
+                # dtype descriptions may contain the delimiter: the whole remainder is one key
+                node = node.setdefault(("D", delimiter.join(tokens[i:])), OrderedDict())
+                break
+            elif token == "P" and i + 1 < len(tokens):
+                # internal Pointer positions name their target prefix, which contains delimiters
+                node = node.setdefault(("P", delimiter.join(tokens[i + 1:])), OrderedDict())
+                break
             else:
-                # iterable, so interpret it as a List
-                return IntermediateList(False, unify([buildintermediate(x, None, memo) for x in obj]))
+                node = node.setdefault(token, OrderedDict())
+        node[None] = True
 
-    return buildintermediate(obj, limit, set()).resolve()
+    def isarray(node, token):
+        return token in node and None in node[token]
 
-################################################################ inferring schemas from a namespace
-
-def fromnames(arraynames, prefix="object", delimiter="-"):
-    def filter(arraynames, prefix):
-        return [x for x in arraynames if x.startswith(prefix)]
-    
-    def recurse(arraynames, prefix, byname, internalpointers):
-        prefixdelimiter = prefix + delimiter
+    def recurse(node, prefix, byname, internalpointers):
         name = None
-        for n in arraynames:
-            if n.startswith(prefixdelimiter):
-                if n[len(prefixdelimiter)] == "N":
-                    match = oamap.schema.Schema._identifier.match(n[len(prefixdelimiter) + 1:])
-                    if match is not None:
-                        name = match.group(0)
-                        break
+        for token in node:
+            if isinstance(token, basestring) and token.startswith("N"):
+                match = oamap.schema.Schema._identifier.match(token[1:])
+                if match is not None and len(match.group(0)) == len(token) - 1:
+                    name = match.group(0)
+                    break
 
         if name is not None:
-            prefix = prefixdelimiter + "N" + name
-            prefixdelimiter = prefix + delimiter
-            
-        mask      = prefixdelimiter + "M"
-        starts    = prefixdelimiter + "B"
-        stops     = prefixdelimiter + "E"
-        content   = prefixdelimiter + "L"
-        tags      = prefixdelimiter + "T"
-        offsets   = prefixdelimiter + "O"
-        uniondata = prefixdelimiter + "U"
-        field     = prefixdelimiter + "F"
-        positions = prefixdelimiter + "P"
-        external  = prefixdelimiter + "X"
-        primitive = prefixdelimiter + "D"
-
-        nullable = mask in arraynames
-        if not nullable:
-            mask = None
-
-        if starts in arraynames and stops in arraynames:
+            node = node["N" + name]
+            prefix = prefix + delimiter + "N" + name
+
+        prefixdelimiter = prefix + delimiter
+        nullable = isarray(node, "M")
+
+        if isarray(node, "B") and isarray(node, "E"):
             byname[prefix] = None
-            byname[prefix] = oamap.schema.List(recurse(filter(arraynames, content), content, byname, internalpointers), nullable=nullable, starts=None, stops=None, mask=None, name=name, doc=None)
+            if "L" not in node:
+                raise KeyError("missing array names: nothing found as {0} contents".format(repr(prefixdelimiter + "L")))
+            byname[prefix] = oamap.schema.List(recurse(node["L"], prefixdelimiter + "L", byname, internalpointers), nullable=nullable, starts=None, stops=None, mask=None, name=name, doc=None)
 
-        elif tags in arraynames:
+        elif isarray(node, "T"):
             possibilities = []
-            while True:
-                possibility = uniondata + repr(len(possibilities))
-                if any(x.startswith(possibility) for x in arraynames):
-                    possibilities.append(possibility)
-                else:
-                    break
+            while "U" + repr(len(possibilities)) in node:
+                possibilities.append("U" + repr(len(possibilities)))
             byname[prefix] = None
-            byname[prefix] = oamap.schema.Union([recurse(filter(arraynames, x), x, byname, internalpointers) for x in possibilities], nullable=nullable, tags=None, offsets=None, mask=None, name=name, doc=None)
-
-        elif any(x.startswith(field) for x in arraynames):
-            pattern = re.compile("^" + field + "(" + oamap.schema.Schema._identifier.pattern + ")")
-            fields = {}
-            for x in arraynames:
-                matches = pattern.match(x)
-                if matches is not None:
-                    if matches.group(1) not in fields:
-                        fields[matches.group(1)] = []
-                    fields[matches.group(1)].append(x)
+            byname[prefix] = oamap.schema.Union([recurse(node[x], prefixdelimiter + x, byname, internalpointers) for x in possibilities], nullable=nullable, tags=None, offsets=None, mask=None, name=name, doc=None)
+
+        elif any(isinstance(token, basestring) and token.startswith("F") for token in node):
+            fields = []
+            for token in node:
+                if isinstance(token, basestring) and token.startswith("F"):
+                    match = oamap.schema.Schema._identifier.match(token[1:])
+                    if match is not None and len(match.group(0)) == len(token) - 1:
+                        fields.append(match.group(0))
 
             types = []
-            while True:
-                tpe = field + repr(len(types))
-                if any(x.startswith(tpe) for x in arraynames):
-                    types.append(tpe)
-                else:
-                    break
+            while "F" + repr(len(types)) in node:
+                types.append("F" + repr(len(types)))
 
-            if len(fields) >= 0 and len(types) == 0:
-                byname[prefix] = oamap.schema.Record(oamap.schema.OrderedDict([(n, recurse(fields[n], field + n, byname, internalpointers)) for n in sorted(fields)]), nullable=nullable, mask=None, name=name, doc=None)
-            elif len(fields) == 0 and len(types) > 0:
-                byname[prefix] = oamap.schema.Tuple([recurse(filter(arraynames, n), n, byname, internalpointers) for n in types], nullable=nullable, mask=None, name=name, doc=None)
+            if len(types) == 0:
+                byname[prefix] = oamap.schema.Record(oamap.schema.OrderedDict([(n, recurse(node["F" + n], prefixdelimiter + "F" + n, byname, internalpointers)) for n in sorted(fields)]), nullable=nullable, mask=None, name=name, doc=None)
+            elif len(fields) == 0:
+                byname[prefix] = oamap.schema.Tuple([recurse(node[x], prefixdelimiter + x, byname, internalpointers) for x in types], nullable=nullable, mask=None, name=name, doc=None)
             else:
                 raise KeyError("ambiguous set of array names: may be Record or Tuple at {0}".format(repr(prefix)))
 
-        elif any(x.startswith(positions) for x in arraynames):
-            if positions in arraynames:
+        elif "P" in node or any(isinstance(token, tuple) and token[0] == "P" for token in node):
+            if isarray(node, "P"):
                 # external
+                if "X" not in node:
+                    raise KeyError("missing array names: nothing found as {0} contents".format(repr(prefixdelimiter + "X")))
                 byname2 = {}
                 internalpointers2 = []
-                target = finalize(recurse(filter(arraynames, external), external, byname2, internalpointers2), byname2, internalpointers2)
+                target = finalize(recurse(node["X"], prefixdelimiter + "X", byname2, internalpointers2), byname2, internalpointers2)
                 byname[prefix] = oamap.schema.Pointer(target, nullable=nullable, positions=None, mask=None, name=name, doc=None)
 
             else:
                 # internal
-                matches = [x[len(positions) + 1:] for x in arraynames if x.startswith(positions)]
+                matches = [token[1] for token in node if isinstance(token, tuple) and token[0] == "P"]
                 if len(matches) != 1:
                     raise KeyError("ambiguous set of array names: more than one internal Pointer at {0}".format(repr(prefix)))
                 target = None   # placeholder! see finalize
                 byname[prefix] = oamap.schema.Pointer(target, nullable=nullable, positions=None, mask=None, name=name, doc=None)
                 internalpointers.append((byname[prefix], matches[0]))
 
-        elif any(x.startswith(primitive) for x in arraynames):
-            matches = [x[len(primitive) - 1:] for x in arraynames if x.startswith(primitive)]
+        elif any(isinstance(token, tuple) and token[0] == "D" for token in node):
+            matches = [token[1] for token in node if isinstance(token, tuple) and token[0] == "D"]
             if len(matches) != 1:
                 raise KeyError("ambiguous set of array names: more than one Primitive at {0}".format(repr(prefix)))
             dtype = oamap.schema.Primitive._str2dtype(matches[0], delimiter)
@@ -396,6 +486,12 @@ def fromnames(arraynames, prefix="object", delimiter="-"):
                 raise KeyError("Pointer's internal target is {0}, but there is no object with that prefix".format(repr(targetname)))
         return out
 
+    trie = OrderedDict()
+    prefixdelimiter = prefix + delimiter
+    for n in arraynames:
+        if n.startswith(prefixdelimiter):
+            insert(trie, n[len(prefixdelimiter):].split(delimiter))
+
     byname = {}
     internalpointers = []
-    return finalize(recurse(filter(arraynames, prefix), prefix, byname, internalpointers), byname, internalpointers)
+    return finalize(recurse(trie, prefix, byname, internalpointers), byname, internalpointers)
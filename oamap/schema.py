@@ -36,6 +36,7 @@ import json
 import numbers
 import re
 import sys
+import weakref
 from types import ModuleType
 
 import numpy
@@ -62,9 +63,68 @@ class Schema(object):
     _identifier = re.compile("[a-zA-Z][a-zA-Z_0-9]*")   # forbid starting with underscore in field names
     _baddelimiter = re.compile("[a-zA-Z_0-9]")          # could be confused with field names or integers
 
+    # structural hashes are cached on each node, and each node remembers the nodes whose hashes were computed from
+    # its own; changing a node drops its cached hash and those of all of these ancestors (and nothing else)
+
     def __init__(self, *args, **kwds):
         raise TypeError("Kind cannot be instantiated directly")
 
+    def __getstate__(self):
+        # caches and their weak references to parents don't travel with a pickled or copied schema
+        return dict((n, x) for n, x in self.__dict__.items() if n not in ("_hashcache", "_hashparents"))
+
+    def _mutated(self):
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            if "_hashcache" in node.__dict__:
+                del node.__dict__["_hashcache"]
+                for parent in node.__dict__.get("_hashparents", {}).values():
+                    parent = parent()
+                    if parent is not None:
+                        stack.append(parent)
+
+    def __hash__(self):
+        return self._structhash([])[0]
+
+    def _structhash(self, path):
+        # returns the hash and the depth of the shallowest node on the path that it refers back to (for cycles through Pointers)
+        cached = self.__dict__.get("_hashcache")
+        if cached is not None:
+            return cached, len(path)
+
+        for depth, node in enumerate(path):
+            if node is self:
+                return hash((Schema, len(path) - depth)), depth
+
+        path.append(self)
+        try:
+            out, reach = self._hashnode(path)
+        finally:
+            path.pop()
+
+        if reach >= len(path):
+            # no references to anything above this node, so this is also its hash as a standalone schema
+            self.__dict__["_hashcache"] = out
+        else:
+            # on a Pointer cycle: not cacheable, but changing it must still invalidate the nodes that were cached
+            self.__dict__["_hashcache"] = None
+        return out, reach
+
+    def _hashchildren(self, children, path):
+        hashes = []
+        reach = len(path)
+        for x in children:
+            parents = x.__dict__.get("_hashparents")
+            if parents is None:
+                parents = x.__dict__["_hashparents"] = {}
+            if id(self) not in parents or parents[id(self)]() is not self:
+                parents[id(self)] = weakref.ref(self)
+            h, r = x._structhash(path)
+            hashes.append(h)
+            reach = min(reach, r)
+        return tuple(hashes), reach
+
     @property
     def nullable(self):
         return self._nullable
@@ -73,6 +133,7 @@ class Schema(object):
     def nullable(self, value):
         if value is not True and value is not False:
             raise TypeError("nullable must be True or False, not {0}".format(repr(value)))
+        self._mutated()
         self._nullable = value
 
     @property
@@ -83,6 +144,7 @@ class Schema(object):
     def mask(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("mask must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._mask = value
 
     @property
@@ -93,6 +155,7 @@ class Schema(object):
     def namespace(self, value):
         if not isinstance(value, basestring):
             raise TypeError("namespace must be a string, not {0}".format(repr(value)))
+        self._mutated()
         self._namespace = value
 
     @property
@@ -103,6 +166,7 @@ class Schema(object):
     def packing(self, value):
         if not (value is None or isinstance(value, oamap.backend.packing.PackedSource)):
             raise TypeError("packing must be None or a PackedSource, not {0}".format(repr(value)))
+        self._mutated()
         self._packing = value
 
     def _packingcopy(self, source=None):
@@ -130,6 +194,7 @@ class Schema(object):
 
     @name.setter
     def name(self, value):
+        self._mutated()
         if value is None:
             self._name = value
             return
@@ -148,6 +213,7 @@ class Schema(object):
     def doc(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("doc must be None or a string, not {0}".format(repr(value)))
+        self._mutated()
         self._doc = value
 
     @property
@@ -156,6 +222,7 @@ class Schema(object):
 
     @metadata.setter
     def metadata(self, value):
+        self._mutated()
         self._metadata = value
 
     def _labels(self):
@@ -343,12 +410,49 @@ class Schema(object):
     def __call__(self, arrays, prefix="object", delimiter="-", extension=oamap.extension.common, packing=None):
         return self.generator(prefix=prefix, delimiter=delimiter, extension=self._normalize_extension(extension), packing=packing)(arrays)
 
+    _generatorcache = OrderedDict()    # fingerprint -> generator, least recently used first
+    _generatorcachesize = 256
+
     def generator(self, prefix="object", delimiter="-", extension=oamap.extension.common, packing=None):
         if self._baddelimiter.match(delimiter) is not None:
             raise ValueError("delimiters must not contain /{0}/".format(self._baddelimiter.pattern))
+        extension = self._normalize_extension(extension)
+
+        try:
+            key = self._fingerprint(prefix, delimiter, extension, packing)
+            hash(key)
+        except TypeError:
+            # something in the schema (e.g. metadata) is not hashable, so it's not cacheable
+            return self._makegenerator(prefix, delimiter, extension, packing)
+
+        cache = Schema._generatorcache
+        if key in cache:
+            out = cache.pop(key)
+        else:
+            # build from a private copy so that later changes to this schema can't reach the cached generator
+            private = copy.deepcopy(self)
+            out = private._makegenerator(prefix, delimiter, extension, packing)
+            key = (private,) + key[1:]
+            while len(cache) >= self._generatorcachesize:
+                cache.popitem(last=False)
+        cache[key] = out
+
+        # the cached generator is never handed out; each caller gets its own ids, runtime state, and schemas
+        # (one deepcopy memo for all of them, so that schemas shared among generators stay shared)
+        generators = {}
+        out = out._copy(generators)
+        schemas = {}
+        for x in generators.values():
+            if "schema" in x.__dict__:
+                x.schema = copy.deepcopy(x.schema, schemas)
+        return out
+
+    def _fingerprint(self, prefix, delimiter, extension, packing):
+        return (self, prefix, delimiter, tuple(extension), None if packing is None else repr(packing))
+
+    def _makegenerator(self, prefix, delimiter, extension, packing):
         cacheidx = [0]
         memo = OrderedDict()
-        extension = self._normalize_extension(extension)
         if packing is not None:
             packing = packing.copy()
         return self._finalizegenerator(self._generator(prefix, delimiter, cacheidx, memo, set(), extension, packing), cacheidx, memo, extension, packing)
@@ -432,6 +536,7 @@ class Primitive(Schema):
             raise NotImplementedError("record-array dtypes are not supported yet")
         if value.subdtype is not None:
             raise NotImplementedError("multidimensional dtypes are not supported yet")
+        self._mutated()
         self._dtype = value
 
     _byteorder_transform = {"!": True, ">": True, "<": False, "|": False, "=": numpy.dtype(">f8").isnative}
@@ -481,6 +586,7 @@ class Primitive(Schema):
     def data(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("data must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._data = value
 
     def _hasarraynames(self, memo):
@@ -611,8 +717,10 @@ class Primitive(Schema):
     def _contains(self, schema, memo):
         return self == schema
 
-    def __hash__(self):
-        return hash((Primitive, self._dtype, self._nullable, self._data, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata)))
+    __hash__ = Schema.__hash__
+
+    def _hashnode(self, path):
+        return hash((Primitive, self._dtype, self._nullable, self._data, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata))), len(path)
 
     def __eq__(self, other, memo=None):
         return isinstance(other, Primitive) and self._dtype == other._dtype and self._nullable == other._nullable and self._data == other._data and self._mask == other._mask and self._namespace == other._namespace and self._packing == other._packing and self._name == other._name and self._doc == other._doc and self._metadata == other._metadata
@@ -716,6 +824,7 @@ class List(Schema):
             value = Primitive(value)
         if not isinstance(value, Schema):
             raise TypeError("content must be a Schema, not {0}".format(repr(value)))
+        self._mutated()
         self._content = value
 
     @property
@@ -726,6 +835,7 @@ class List(Schema):
     def starts(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("starts must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._starts = value
 
     @property
@@ -736,6 +846,7 @@ class List(Schema):
     def stops(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("stops must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._stops = value
 
     def _hasarraynames(self, memo):
@@ -920,11 +1031,18 @@ class List(Schema):
         else:
             return self._content._contains(schema, memo)
 
-    def __hash__(self):
-        return hash((List, self._content, self._nullable, self._starts, self._stops, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata)))
+    __hash__ = Schema.__hash__
+
+    def _hashnode(self, path):
+        content, reach = self._hashchildren([self._content], path)
+        return hash((List, content, self._nullable, self._starts, self._stops, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata))), reach
 
     def __eq__(self, other, memo=None):
         if memo is None:
+            if self is other:
+                return True
+            if not isinstance(other, Schema) or hash(self) != hash(other):
+                return False
             memo = {}
         if id(self) in memo:
             return memo[id(self)] == id(other)
@@ -1038,6 +1156,7 @@ class Union(Schema):
     def tags(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("tags must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._tags = value
 
     @property
@@ -1048,6 +1167,7 @@ class Union(Schema):
     def offsets(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("offsets must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._offsets = value
 
     def _extend(self, possibilities, start):
@@ -1062,6 +1182,7 @@ class Union(Schema):
             raise TypeError("possibilities must be an iterable of Schemas, not {0}".format(repr(possibilities)))
         except AssertionError as err:
             raise TypeError(err.message)
+        self._mutated()
         self._possibilities = start + trial
 
     def append(self, possibility):
@@ -1069,6 +1190,7 @@ class Union(Schema):
             possibility = Primitive(possibility)
         if not isinstance(possibility, Schema):
             raise TypeError("possibilities must be Schemas, not {0}".format(repr(possibility)))
+        self._mutated()
         self._possibilities.append(possibility)
 
     def insert(self, index, possibility):
@@ -1076,6 +1198,7 @@ class Union(Schema):
             possibility = Primitive(possibility)
         if not isinstance(possibility, Schema):
             raise TypeError("possibilities must be Schemas, not {0}".format(repr(possibility)))
+        self._mutated()
         self._possibilities.insert(index, possibility)
 
     def extend(self, possibilities):
@@ -1091,6 +1214,7 @@ class Union(Schema):
             value = Primitive(value)
         if not isinstance(value, Schema):
             raise TypeError("possibilities must be Schemas, not {0}".format(repr(value)))
+        self._mutated()
         self._possibilities[index] = value
 
     def _hasarraynames(self, memo):
@@ -1288,11 +1412,18 @@ class Union(Schema):
         else:
             return any(x._contains(schema, memo) for x in self._possibilities)
 
-    def __hash__(self):
-        return hash((Union, self._possibilities, self._nullable, self._tags, self._offsets, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata)))
+    __hash__ = Schema.__hash__
+
+    def _hashnode(self, path):
+        possibilities, reach = self._hashchildren(self._possibilities, path)
+        return hash((Union, possibilities, self._nullable, self._tags, self._offsets, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata))), reach
 
     def __eq__(self, other, memo=None):
         if memo is None:
+            if self is other:
+                return True
+            if not isinstance(other, Schema) or hash(self) != hash(other):
+                return False
             memo = {}
         if id(self) in memo:
             return memo[id(self)] == id(other)
@@ -1403,6 +1534,7 @@ class Record(Schema):
             raise TypeError("fields must be a dict from strings to Schemas; {0} is not a dict".format(repr(fields)))
         except AssertionError as err:
             raise TypeError(err.message)
+        self._mutated()
         self._fields = OrderedDict(start + trial)
 
     def __getitem__(self, index):
@@ -1415,9 +1547,11 @@ class Record(Schema):
             value = Primitive(value)
         if not isinstance(value, Schema):
             raise TypeError("field values must be Schemas, not {0}".format(repr(value)))
+        self._mutated()
         self._fields[index] = value
 
     def __delitem__(self, index):
+        self._mutated()
         del self._fields[index]
 
     def _hasarraynames(self, memo):
@@ -1613,11 +1747,20 @@ class Record(Schema):
         else:
             return any(x._contains(schema, memo) for x in self._fields.values())
 
-    def __hash__(self):
-        return hash((Record, tuple(self._fields.items()), self._nullable, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata)))
+    __hash__ = Schema.__hash__
+
+    def _hashnode(self, path):
+        # field order does not matter for equality, so it must not matter for the hash
+        names = sorted(self._fields)
+        fields, reach = self._hashchildren([self._fields[n] for n in names], path)
+        return hash((Record, tuple(zip(names, fields)), self._nullable, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata))), reach
 
     def __eq__(self, other, memo=None):
         if memo is None:
+            if self is other:
+                return True
+            if not isinstance(other, Schema) or hash(self) != hash(other):
+                return False
             memo = {}
         if id(self) in memo:
             return memo[id(self)] == id(other)
@@ -1707,6 +1850,7 @@ class Tuple(Schema):
             raise TypeError("types must be an iterable of Schemas, not {0}".format(repr(types)))
         except AssertionError as err:
             raise TypeError(err.message)
+        self._mutated()
         self._types = start + trial
 
     def append(self, item):
@@ -1714,6 +1858,7 @@ class Tuple(Schema):
             item = Primitive(item)
         if not isinstance(item, Schema):
             raise TypeError("types must be Schemas, not {0}".format(repr(item)))
+        self._mutated()
         self._types.append(item)
 
     def insert(self, index, item):
@@ -1721,6 +1866,7 @@ class Tuple(Schema):
             item = Primitive(item)
         if not isinstance(item, Schema):
             raise TypeError("types must be Schemas, not {0}".format(repr(item)))
+        self._mutated()
         self._types.insert(index, item)
 
     def extend(self, types):
@@ -1736,6 +1882,7 @@ class Tuple(Schema):
             value = Primitive(value)
         if not isinstance(item, Schema):
             raise TypeError("types must be Schemas, not {0}".format(repr(value)))
+        self._mutated()
         self._types[index] = value
 
     def _hasarraynames(self, memo):
@@ -1929,11 +2076,18 @@ class Tuple(Schema):
         else:
             return any(x._contains(schema, memo) for x in self._types)
 
-    def __hash__(self):
-        return hash((Tuple, self._types, self._nullable, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata)))
+    __hash__ = Schema.__hash__
+
+    def _hashnode(self, path):
+        types, reach = self._hashchildren(self._types, path)
+        return hash((Tuple, types, self._nullable, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata))), reach
 
     def __eq__(self, other, memo=None):
         if memo is None:
+            if self is other:
+                return True
+            if not isinstance(other, Schema) or hash(self) != hash(other):
+                return False
             memo = {}
         if id(self) in memo:
             return memo[id(self)] == id(other)
@@ -2012,6 +2166,7 @@ class Pointer(Schema):
             raise TypeError("target must be None or a Schema, not {0}".format(repr(value)))
         if value is self:
             raise TypeError("Pointer may not point directly at itself (it would never resolve to a value)")
+        self._mutated()
         self._target = value
 
     @property
@@ -2022,6 +2177,7 @@ class Pointer(Schema):
     def positions(self, value):
         if not (value is None or isinstance(value, basestring)):
             raise TypeError("positions must be None or an array name (string), not {0}".format(repr(value)))
+        self._mutated()
         self._positions = value
 
     def _hasarraynames(self, memo):
@@ -2227,11 +2383,21 @@ class Pointer(Schema):
         else:
             return self._target._contains(schema, memo)
 
-    def __hash__(self):
-        return hash((Pointer, self._target, self._nullable, self._positions, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata)))
+    __hash__ = Schema.__hash__
+
+    def _hashnode(self, path):
+        if self._target is None:
+            target, reach = None, len(path)
+        else:
+            target, reach = self._hashchildren([self._target], path)
+        return hash((Pointer, target, self._nullable, self._positions, self._mask, self._namespace, self._packing, self._name, self._doc, oamap.util.python2hashable(self._metadata))), reach
 
     def __eq__(self, other, memo=None):
         if memo is None:
+            if self is other:
+                return True
+            if not isinstance(other, Schema) or hash(self) != hash(other):
+                return False
             memo = {}
         if id(self) in memo:
             return memo[id(self)] == id(other)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+import numpy
+
+import oamap.database
+import oamap.generator
+import oamap.proxy
+from oamap.schema import *
+from oamap.backend.arrow import *
+
+class TestBackendArrow(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_dataset(self):
+        try:
+            import pyarrow
+        except ImportError:
+            return
+
+        union = pyarrow.UnionArray.from_dense(pyarrow.array([0, 5, 0, 5], pyarrow.int8()), pyarrow.array([0, 0, 1, 1], pyarrow.int32()), [pyarrow.array([1, 2]), pyarrow.array([1.5, None])], type_codes=[0, 5])
+        table = pyarrow.Table.from_arrays([pyarrow.array([1, 2, None, 4], pyarrow.int32()),
+                                           pyarrow.array([[1.1], [], None, [4.4, None]]),
+                                           pyarrow.array(["a", "bc", None, "d"]),
+                                           pyarrow.array([{"a": 1, "b": [1]}, None, {"a": 3, "b": []}, {"a": 4, "b": None}]),
+                                           union],
+                                          ["x", "y", "s", "r", "u"])
+        table = pyarrow.concat_tables([table.slice(0, 3), table.slice(3)])
+
+        expect = [{"x": 1, "y": [1.1], "s": "a", "r": {"a": 1, "b": [1]}, "u": 1},
+                  {"x": 2, "y": [], "s": "bc", "r": None, "u": 1.5},
+                  {"x": None, "y": None, "s": None, "r": {"a": 3, "b": []}, "u": 2},
+                  {"x": 4, "y": [4.4, None], "s": "d", "r": {"a": 4, "b": None}, "u": None}]
+
+        self.assertEqual(oamap.proxy.tojson(proxy(table)), expect)
+
+        ds = dataset(table)
+        self.assertEqual(ds.numpartitions, 2)
+        self.assertEqual([oamap.proxy.tojson(x) for x in ds], expect)
+
+        self.assertEqual(toarrow(proxy(table)).to_pylist(), expect)
+
+    def test_toarrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            return
+
+        schema = List(Record({"a": "int32", "b": List("float64", nullable=True), "c": Primitive("f8", nullable=True), "d": Union([Primitive("i8"), List("i8")])}))
+        values = [{"a": 1, "b": [1.1], "c": None, "d": 3}, {"a": 2, "b": None, "c": 2.5, "d": [1, 2]}, {"a": 3, "b": [], "c": 1.0, "d": 5}]
+        obj = schema.fromdata(values)
+
+        table = toarrow(obj)
+        self.assertEqual(table.to_pylist(), values)
+        self.assertEqual(toarrow(obj[1:]).to_pylist(), values[1:])
+        self.assertEqual(toarrow(obj[::2]).to_pylist(), values[::2])
+
+        # primitive buffers are shared, not copied
+        self.assertTrue(numpy.shares_memory(table.column("a").chunk(0).to_numpy(), obj._arrays[obj._generator.content.fields["a"].data]))
+
+    def test_ipcdataset(self):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            return
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.arrow")
+            table = pyarrow.Table.from_arrays([pyarrow.array([1, 2, None, 4], pyarrow.int32()), pyarrow.array([[1.1], [], None, [4.4]])], ["x", "y"])
+            with pyarrow.OSFile(path, "wb") as sink:
+                writer = pyarrow.ipc.new_file(sink, table.schema)
+                for batch in table.to_batches(max_chunksize=3):
+                    writer.write_batch(batch)
+                writer.close()
+
+            ds = ipcdataset(path)
+            self.assertEqual(ds.numpartitions, 2)
+            self.assertEqual([oamap.proxy.tojson(x) for x in ds], [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": None, "y": None}, {"x": 4, "y": [4.4]}])
+
+            backend = ds._backends[list(ds._backends)[0]]
+            self.assertEqual(oamap.database.Backend.fromjson(backend.tojson(), backend.namespace), backend)
+
+            # numeric arrays are views of the mapped file, even with masked entries
+            arrays = backend.instantiate(0)
+            role = oamap.generator.DataRole("x::data", "")
+            self.assertFalse(arrays.getall([role])[role].flags.owndata)
+
+        finally:
+            shutil.rmtree(tmpdir)
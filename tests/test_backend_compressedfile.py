@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+import numpy
+
+from oamap.schema import *
+from oamap.backend.compressedfile import *
+
+class TestBackendCompressedfile(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_CompressedFile(self):
+        filename = tempfile.mktemp()
+        try:
+            data = numpy.arange(1000, dtype=numpy.int32)
+            CompressedArrays(lambda name: filename, lambda name: filename, "zlib", None, 64)["data"] = data
+            f = CompressedFile(filename)
+            self.assertEqual(len(f), 1000)
+            self.assertEqual(f.numchunks, 16)
+            self.assertEqual(f.dtype, numpy.dtype(numpy.int32))
+            self.assertTrue(numpy.array_equal(f[:], data))
+            self.assertTrue(numpy.array_equal(f[100:900:7], data[100:900:7]))
+            self.assertEqual(f[-1], 999)
+            self.assertTrue(os.path.getsize(filename) < data.nbytes)
+        finally:
+            os.remove(filename)
+
+    def test_database(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = CompressedFileDatabase(tmpdir)
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}], [{"x": 4, "y": [4.4]}])
+
+            self.assertEqual([(obj.x, list(obj.y)) for obj in db.data.one], [(1, [1.1]), (2, []), (3, [3.3, 3.3]), (4, [4.4])])
+
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+import numpy
+
+import oamap.database
+from oamap.schema import *
+from oamap.backend.hdf5 import *
+
+class TestBackendHDF5(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_database(self):
+        try:
+            import h5py
+        except ImportError:
+            return
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.hdf5")
+            db = oamap.database.InMemoryDatabase(backends={"": HDF5Backend(path, compression="gzip", chunksize=2)})
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}], [{"x": 4, "y": [4.4]}])
+
+            with h5py.File(path, "r") as file:
+                self.assertEqual(sorted(file.keys()), ["0", "1"])
+                self.assertEqual(file["0/one/obj-L-Fx-Di4"].chunks, (2,))
+                self.assertEqual(file["0/one/obj-L-Fx-Di4"].compression, "gzip")
+
+            db.data.two = db.data.one.define("z", lambda obj: obj.x + len(obj.y))
+            self.assertEqual([(obj.x, list(obj.y), obj.z) for obj in db.data.two], [(1, [1.1], 2), (2, [], 2), (3, [3.3, 3.3], 5), (4, [4.4], 5)])
+
+            # reads only open the file read-only and release it afterward
+            with h5py.File(path, "r") as file:
+                self.assertEqual([obj.x for obj in db.data.one], [1, 2, 3, 4])
+            self.assertEqual(h5py.h5f.get_obj_count(h5py.h5f.OBJ_ALL, h5py.h5f.OBJ_FILE), 0)
+
+            del db.data.one
+            self.assertEqual([(obj.x, obj.z) for obj in db.data.two], [(1, 2), (2, 2), (3, 5), (4, 5)])
+
+            del db.data.two
+            with h5py.File(path, "r") as file:
+                self.assertEqual(list(file.keys()), [])
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_proxy(self):
+        try:
+            import h5py
+        except ImportError:
+            return
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.hdf5")
+            with h5py.File(path, "w") as file:
+                file["a"] = numpy.arange(5, dtype=numpy.int32)
+                file.create_group("sub")["b"] = numpy.arange(5)*1.5
+
+            self.assertEqual(schema(path), List(Record({"a": Primitive("i4", data="/a"), "sub": Record({"b": Primitive("f8", data="/sub/b")})})))
+            p = proxy(path)
+            self.assertEqual([(obj.a, obj.sub.b) for obj in p], [(0, 0.0), (1, 1.5), (2, 3.0), (3, 4.5), (4, 6.0)])
+            p._arrays.close()
+
+        finally:
+            shutil.rmtree(tmpdir)
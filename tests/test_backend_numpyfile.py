@@ -29,12 +29,15 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import math
+import os
 import tempfile
+import time
 import shutil
 
 import unittest
 
 from oamap.schema import *
+import oamap.database
 from oamap.backend.numpyfile import *
 
 class TestBackendNumpyfile(unittest.TestCase):
@@ -56,3 +59,191 @@ class TestBackendNumpyfile(unittest.TestCase):
 
         finally:
             shutil.rmtree(tmpdir)
+
+    def test_fromsources(self):
+        import json
+        try:
+            import concurrent.futures
+        except ImportError:
+            return
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            sources = []
+            for i in range(4):
+                sources.append(os.path.join(tmpdir, "source{0}.json".format(i)))
+                with open(sources[-1], "w") as f:
+                    json.dump([{"x": 3*i + j, "y": [1.1]*j} for j in range(3)], f)
+
+            db = NumpyFileDatabase(tmpdir)
+            with concurrent.futures.ProcessPoolExecutor(2) as executor:
+                db.fromsources("one", List(Record({"x": "int32", "y": List("float64")})), sources, executor=executor)
+
+            one = db.data.one
+            self.assertEqual(one.numpartitions, 4)
+            self.assertEqual([obj.x for obj in one], list(range(12)))
+            self.assertEqual([len(obj.y) for obj in one], [0, 1, 2]*4)
+
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dedup(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = NumpyFileDatabase(tmpdir, dedup=True)
+            schema = List(Record({"x": "int32", "y": List("float64")}))
+            data = [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}]
+            db.fromdata("one", schema, data)
+            db.fromdata("two", schema, data)
+            db.fromdata("three", schema, data[:2])
+
+            one = sorted(os.listdir(os.path.join(tmpdir, "data", "one", "0")))
+            two = sorted(os.listdir(os.path.join(tmpdir, "data", "two", "0")))
+            self.assertEqual([x.replace("one", "") for x in one], [x.replace("two", "") for x in two])
+            for x, y in zip(one, two):
+                self.assertTrue(os.path.samefile(os.path.join(tmpdir, "data", "one", "0", x), os.path.join(tmpdir, "data", "two", "0", y)))
+
+            del db.data.one
+            self.assertEqual(db[""].collect(), 0)
+            self.assertEqual([(obj.x, list(obj.y)) for obj in db.data.two], [(1, [1.1]), (2, []), (3, [3.3, 3.3])])
+
+            del db.data.two
+            self.assertTrue(db[""].collect() > 0)
+            self.assertEqual([(obj.x, list(obj.y)) for obj in db.data.three], [(1, [1.1]), (2, [])])
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_mmap_mode(self):
+        import numpy
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = NumpyFileDatabase(tmpdir, mmap_mode="r")
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}])
+
+            db2 = oamap.database.FilesystemDatabase(tmpdir)
+            self.assertEqual(db2[""].mmap_mode, "r")
+            self.assertEqual([(obj.x, list(obj.y)) for obj in db2.data.one], [(1, [1.1]), (2, []), (3, [3.3, 3.3])])
+
+            arrays = db2[""].instantiate(0)
+            names = [n for n in os.listdir(os.path.join(tmpdir, "data", "one", "0"))]
+            loaded = arrays.getall(["one/PART/" + n[:-4] for n in names])
+            self.assertEqual(len(loaded), len(names))
+            self.assertTrue(all(isinstance(x, numpy.memmap) for x in loaded.values()))
+
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_get_timeout(self):
+        import time
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = NumpyFileDatabase(tmpdir)
+            start = time.time()
+            self.assertRaises(KeyError, lambda: db.get("missing", timeout=0.05))
+            self.assertTrue(time.time() - start < 5)
+
+            db.fromdata("one", List("int32"), [1, 2, 3])
+            self.assertEqual(list(db.get("one", timeout=0)), [1, 2, 3])
+
+            # a put still running in this Database times out the same way
+            try:
+                import concurrent.futures
+            except ImportError:
+                pass
+            else:
+                import threading
+                db.fromdata("rec", List(Record({"x": "int32"})), [{"x": 1}, {"x": 2}])
+                release = threading.Event()
+                def slow(obj):
+                    release.wait()
+                    return obj.x * 10
+                with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                    rec = db.data.rec
+                    rec._executor = executor
+                    db.data.two = rec.define("z", slow)
+                    try:
+                        self.assertRaises(KeyError, lambda: db.get("two", timeout=0.05))
+                    finally:
+                        release.set()
+                    self.assertEqual([obj.z for obj in db.get("two")], [10, 20])
+
+                    # a failed put raises once, and then the name is not pending anymore
+                    def bad(obj):
+                        raise RuntimeError("fail in a worker")
+                    db.data.three = rec.define("z", bad)
+                    self.assertRaises(RuntimeError, lambda: db.get("three"))
+                    self.assertRaises(KeyError, lambda: db.get("three", timeout=0))
+                    db.data.three = rec.define("z", lambda obj: obj.x + 1)
+                    self.assertEqual([obj.z for obj in db.get("three")], [2, 3])
+                del db.data.three
+                del db.data.rec
+                del db.data.two
+
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_catalog(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = NumpyFileDatabase(tmpdir)
+            self.assertEqual(db.list(), [])
+            db.fromdata("one", List("int32"), [1, 2, 3])
+            db.fromdata("two", List("int32"), [4, 5])
+            self.assertEqual(sorted(db.list()), ["one", "two"])
+            # the catalog (and backends) are only cached once their mtimes are older than the timestamp granularity
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "catalog.json")))
+            past = time.time() - 10
+            os.utime(os.path.join(tmpdir, "data"), (past, past))
+            for x in os.listdir(os.path.join(tmpdir, "backends")):
+                os.utime(os.path.join(tmpdir, "backends", x), (past, past))
+            self.assertEqual(sorted(db.list()), ["one", "two"])
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, "catalog.json")))
+
+            db2 = oamap.database.FilesystemDatabase(tmpdir)
+            self.assertEqual(sorted(db2.list()), ["one", "two"])
+            self.assertTrue(db2[""] is db2[""])
+
+            del db.data.one
+            self.assertEqual(db2.list(), ["two"])
+            db2.fromdata("three", List("int32"), [6])
+            self.assertEqual(sorted(db.list()), ["three", "two"])
+            self.assertEqual(list(db.data.three), [6])
+
+            db.fromdata("three", List("int32"), [7, 8])
+            self.assertEqual(list(db2.data.three), [7, 8])
+
+            del db.data.two
+            del db.data.three
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_coarse_timestamps(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = NumpyFileDatabase(tmpdir)
+            db.fromdata("one", List("int32"), [1, 2, 3], doc="a")
+            dsjson = os.path.join(tmpdir, "data", "one", "dataset.json")
+
+            # a same-size rewrite within one (1 second) timestamp tick can't be seen in the file's stamp
+            tick = int(time.time())
+            os.utime(dsjson, (tick, tick))
+            self.assertEqual(db.data.one.doc, "a")
+            with open(dsjson) as f:
+                before = f.read()
+            with open(dsjson, "w") as f:
+                f.write(before.replace('"doc": "a"', '"doc": "b"'))
+            os.utime(dsjson, (tick, tick))
+            self.assertEqual(db.data.one.doc, "b")
+
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
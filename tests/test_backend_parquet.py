@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+import oamap.generator
+import oamap.proxy
+from oamap.backend.parquet import *
+
+class TestBackendParquet(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_parquet(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            return
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.parquet")
+            table = pyarrow.Table.from_arrays([pyarrow.array([1, 2, None, 4], pyarrow.int32()),
+                                               pyarrow.array([[1.1], [], None, [4.4, None]]),
+                                               pyarrow.array(["a", "bc", None, "d"]),
+                                               pyarrow.array([{"a": 1, "b": [1]}, None, {"a": 3, "b": []}, {"a": 4, "b": None}])],
+                                              ["x", "y", "s", "r"])
+            pyarrow.parquet.write_table(table, path, row_group_size=3)
+
+            expect = [{"x": 1, "y": [1.1], "s": "a", "r": {"a": 1, "b": [1]}},
+                      {"x": 2, "y": [], "s": "bc", "r": None},
+                      {"x": None, "y": None, "s": None, "r": {"a": 3, "b": []}},
+                      {"x": 4, "y": [4.4, None], "s": "d", "r": {"a": 4, "b": None}}]
+
+            self.assertEqual(oamap.proxy.tojson(proxy(path)), expect)
+
+            ds = dataset(path)
+            self.assertEqual(ds.numpartitions, 2)
+            self.assertEqual([oamap.proxy.tojson(x) for x in ds], expect)
+
+            # only the columns that are touched are decoded
+            arrays = ParquetBackend([path], [(0, 0), (0, 1)], "").instantiate(1)
+            role = oamap.generator.DataRole("x::data", "")
+            self.assertEqual(arrays.getall([role])[role].tolist(), [4])
+            self.assertEqual(list(arrays._columns), ["x"])
+
+        finally:
+            shutil.rmtree(tmpdir)
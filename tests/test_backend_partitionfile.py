@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+import numpy
+
+from oamap.schema import *
+from oamap.backend.partitionfile import *
+
+class TestBackendPartitionfile(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_PartitionFile(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, "0.oap")
+            arrays = {"a": numpy.arange(10, dtype=numpy.int32), "b": numpy.array([[1.1, 2.2], [3.3, 4.4]]), "c": numpy.array([], dtype=numpy.uint8)}
+            PartitionFile.write(filename, arrays)
+            f = PartitionFile(filename)
+            self.assertEqual(sorted(f.keys()), ["a", "b", "c"])
+            for n, x in arrays.items():
+                self.assertEqual(f[n].dtype, x.dtype)
+                self.assertEqual(f[n].tolist(), x.tolist())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_database(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = PartitionFileDatabase(tmpdir)
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}], [{"x": 4, "y": [4.4]}])
+
+            self.assertEqual(sorted(x for x in os.listdir(os.path.join(tmpdir, "data", "one")) if x.endswith(".oap")), ["0.oap", "1.oap"])
+
+            db.data.two = db.data.one.define("z", lambda obj: obj.x + len(obj.y))
+
+            self.assertEqual([(obj.x, list(obj.y), obj.z) for obj in db.data.two], [(1, [1.1], 2), (2, [], 2), (3, [3.3, 3.3], 5), (4, [4.4], 5)])
+
+            del db.data.one
+            del db.data.two
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_delete_source(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = PartitionFileDatabase(tmpdir)
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}], [{"x": 3, "y": [3.3, 3.3]}])
+            db.data.two = db.data.one.define("z", lambda obj: obj.x + len(obj.y))
+
+            # the source's partition files outlive it while the derived dataset uses them
+            del db.data.one
+            self.assertEqual(db.list(), ["two"])
+            self.assertEqual([(obj.x, list(obj.y), obj.z) for obj in db.data.two], [(1, [1.1], 2), (2, [], 2), (3, [3.3, 3.3], 5)])
+            self.assertEqual(PartitionFileDatabase(tmpdir).data.two[2].y[1], 3.3)
+
+            # and go away with the last reference
+            del db.data.two
+            self.assertEqual(db.list(), [])
+            self.assertEqual(os.listdir(os.path.join(tmpdir, "data")), [])
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_concurrent_refs(self):
+        import threading
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = PartitionFileDatabase(tmpdir)
+            db.fromdata("one", List("int32"), [1, 2, 3])
+            backend = db[""]
+            arrayname = db.data.one.schema.content.data
+
+            # references taken at the same time by many writers are all kept
+            def take(i):
+                for j in range(20):
+                    backend.incref("derived{0}-{1}".format(i, j), 0, arrayname)
+            threads = [threading.Thread(target=take, args=(i,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(backend._readrefs("one", 0)), 160)
+
+            for i in range(8):
+                for j in range(20):
+                    backend.decref("derived{0}-{1}".format(i, j), 0, arrayname)
+            self.assertEqual(backend._readrefs("one", 0), [])
+            self.assertEqual(list(db.data.one), [1, 2, 3])
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_recreate_source(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = PartitionFileDatabase(tmpdir)
+            db.fromdata("one", List(Record({"x": "int32"})), [{"x": 1}, {"x": 2}])
+            db.data.two = db.data.one.define("z", lambda obj: obj.x * 10)
+
+            # a new dataset with the deleted one's name doesn't see its surviving files
+            del db.data.one
+            db.fromdata("one", List(Record({"x": "int32"})), [{"x": 5}, {"x": 6}, {"x": 7}])
+            self.assertEqual([obj.x for obj in db.data.one], [5, 6, 7])
+            self.assertEqual([(obj.x, obj.z) for obj in db.data.two], [(1, 10), (2, 20)])
+            self.assertEqual([(obj.x, obj.z) for obj in PartitionFileDatabase(tmpdir).data.two], [(1, 10), (2, 20)])
+
+            # replacing a dataset keeps the references that the new one still needs
+            db.data.two = db.data.two.define("w", lambda obj: obj.z + 1)
+            self.assertEqual([(obj.x, obj.w) for obj in db.data.two], [(1, 11), (2, 21)])
+
+            del db.data.one
+            del db.data.two
+            self.assertEqual(os.listdir(os.path.join(tmpdir, "data")), [])
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_replace_source(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            db = PartitionFileDatabase(tmpdir)
+            db.fromdata("one", List(Record({"x": "int32"})), [{"x": 1}, {"x": 2}])
+            db.fromdata("three", List(Record({"x": "int32"})), [{"x": 3}, {"x": 4}])
+            db.data.two = db.data.one.define("z", lambda obj: obj.x * 10)
+            self.assertEqual(db[""]._readrefs("one", 0), ["two"])
+
+            # a derived dataset put again with another source releases the first one
+            db.data.two = db.data.three.define("z", lambda obj: obj.x * 10)
+            self.assertEqual(db[""]._readrefs("one", 0), [])
+            self.assertEqual(db[""]._readrefs("three", 0), ["two"])
+
+            del db.data.one
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "data", ".orphans")))
+            self.assertEqual([(obj.x, obj.z) for obj in db.data.two], [(3, 30), (4, 40)])
+
+            del db.data.two
+            del db.data.three
+            self.assertEqual(os.listdir(os.path.join(tmpdir, "data")), [])
+
+        finally:
+            shutil.rmtree(tmpdir)
@@ -29,6 +29,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import math
+import os
 import tempfile
 import shutil
 
@@ -36,6 +37,8 @@ import unittest
 
 import oamap.backend.root
 import oamap.database
+import oamap.generator
+import oamap.dataset
 
 class TestBackendRoot(unittest.TestCase):
     def runTest(self):
@@ -61,3 +64,98 @@ class TestBackendRoot(unittest.TestCase):
         db.data.one = dataset.define("pz", lambda x: x.pt * math.sinh(x.eta), at="Electron", numba=False)
 
         self.assertEqual(repr(db.data.one[0].Electron[0].pz), "-17.956890574044056")
+
+    def test_partitionentries(self):
+        whole = oamap.backend.root.dataset("tests/samples/mc10events.root", "Events")
+        clustered = oamap.backend.root.dataset("tests/samples/mc10events.root", "Events", partitionentries=1)
+
+        backend = list(clustered._backends.values())[0]
+        self.assertEqual(len(backend.entryranges), clustered.numpartitions)
+        self.assertEqual(oamap.database.Backend.fromjson(backend.tojson(), backend.namespace), backend)
+        self.assertEqual([[x.pt for x in event.Electron] for event in clustered], [[x.pt for x in event.Electron] for event in whole])
+
+        # an explicit entry range reads only that part of the tree
+        arrays = oamap.backend.root.ROOTBackend(backend._paths, "Events", backend.namespace, [(0, 3, 7)])
+        part = oamap.dataset.Dataset("part", clustered.schema, {backend.namespace: arrays}, oamap.dataset.SingleThreadExecutor(), [0, 4])
+        self.assertEqual([[x.pt for x in event.Electron] for event in part], [[x.pt for x in event.Electron] for event in whole][3:7])
+
+    def test_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        oldcache = oamap.backend.root.cache
+        self.assertIsNone(oldcache)    # opt-in
+        try:
+            oamap.backend.root.cache = oamap.backend.root.ArrayCache(directory=tmpdir)
+            expect = [[x.pt for x in event.Electron] for event in oamap.backend.root.dataset("tests/samples/mc10events.root", "Events")]
+            self.assertTrue(len(oamap.backend.root.cache) > 0)
+            self.assertTrue(len(os.listdir(tmpdir)) > 0)
+
+            # a new process (here, a new cache on the same directory) finds the decompressed arrays on disk
+            oamap.backend.root.cache = oamap.backend.root.ArrayCache(directory=tmpdir)
+            dataset = oamap.backend.root.dataset("tests/samples/mc10events.root", "Events")
+            arrays = list(dataset._backends.values())[0].instantiate(0)
+            def fail(*args, **kwds):
+                raise AssertionError("read from file")
+            arrays._tree.arrays = fail
+            role = oamap.generator.DataRole("Electron.pt", list(dataset._backends)[0])
+            self.assertEqual(arrays.getall([role])[role].tolist(), sum(expect, []))
+
+            # the memory budget is respected
+            oamap.backend.root.cache = oamap.backend.root.ArrayCache(limitbytes=500)
+            arrays = list(dataset._backends.values())[0].instantiate(0)
+            arrays.getall([oamap.generator.DataRole(x, role.namespace) for x in ("Electron.pt", "Electron.eta", "Electron.phi")])
+            self.assertTrue(0 < oamap.backend.root.cache.numbytes <= 500)
+
+        finally:
+            oamap.backend.root.cache = oldcache
+            shutil.rmtree(tmpdir)
+
+    def test_executor(self):
+        try:
+            import concurrent.futures
+        except ImportError:
+            return
+
+        oldcache = oamap.backend.root.cache
+        try:
+            oamap.backend.root.cache = None
+            expect = [[(x.pt, x.eta) for x in event.Electron] for event in oamap.backend.root.dataset("tests/samples/mc10events.root", "Events")]
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                dataset = oamap.backend.root.dataset("tests/samples/mc10events.root", "Events", executor=executor)
+                self.assertEqual([[(x.pt, x.eta) for x in event.Electron] for event in dataset], expect)
+                self.assertEqual(list(dataset._backends.values())[0], oamap.backend.root.ROOTBackend(["tests/samples/mc10events.root"], "Events", None))
+        finally:
+            oamap.backend.root.cache = oldcache
+
+    def test_schemacache(self):
+        tmpdir = tempfile.mkdtemp()
+        oldcache = oamap.backend.root.schemacache
+        oldbuild = oamap.backend.root._buildschema
+        try:
+            oamap.backend.root.schemacache = oamap.backend.root.SchemaCache(tmpdir)
+            schema = oamap.backend.root.schema("tests/samples/mc10events.root", "Events")
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+
+            # same layout, new process: the schema comes from disk without walking the branches
+            oamap.backend.root.schemacache = oamap.backend.root.SchemaCache(tmpdir)
+            def fail(*args, **kwds):
+                raise AssertionError("schema was rebuilt")
+            oamap.backend.root._buildschema = fail
+            self.assertEqual(oamap.backend.root.schema("tests/samples/mc10events.root", "Events"), schema)
+            self.assertEqual(repr(oamap.backend.root.dataset("tests/samples/mc10events.root", "Events", namespace="")[0].Electron[0].pt), "28.555809")
+
+            # default namespaces depend on the path, but files with the same layout still share one entry
+            oamap.backend.root._buildschema = oldbuild
+            oamap.backend.root.schemacache = oamap.backend.root.SchemaCache(os.path.join(tmpdir, "default"))
+            copy = os.path.join(tmpdir, "copy.root")
+            shutil.copyfile("tests/samples/mc10events.root", copy)
+            one = oamap.backend.root.dataset("tests/samples/mc10events.root", "Events")
+            two = oamap.backend.root.dataset(copy, "Events")
+            self.assertEqual(len(os.listdir(os.path.join(tmpdir, "default"))), 1)
+            self.assertEqual(two.schema, one.schema.renamespace(**{list(one._backends)[0]: list(two._backends)[0]}))
+            self.assertEqual(set(node.namespace for node in two.schema.nodes()), set(two._backends))
+            self.assertEqual(repr(two[0].Electron[0].pt), "28.555809")
+
+        finally:
+            oamap.backend.root._buildschema = oldbuild
+            oamap.backend.root.schemacache = oldcache
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+import numpy
+
+from oamap.schema import *
+from oamap.backend.sharedmemory import *
+
+def attach(name, root):
+    db = SharedMemoryDatabase(name, root=root)
+    arrays = db[""].instantiate(0)
+    return [(obj.x, list(obj.y)) for obj in db.data.one], all(isinstance(x, numpy.memmap) for x in arrays.getall(["one/PART/obj-L-Fx-Di4"]).values())
+
+class TestBackendSharedmemory(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_database(self):
+        root = tempfile.mkdtemp()
+        try:
+            db = SharedMemoryDatabase("test", root=root)
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}])
+
+            db.data.two = db.data.one.define("z", lambda obj: obj.x + len(obj.y))
+            self.assertEqual([(obj.x, obj.z) for obj in db.data.two], [(1, 2), (2, 2), (3, 5)])
+
+            # another process attaches by name and maps the same arrays
+            try:
+                import concurrent.futures
+            except ImportError:
+                pass
+            else:
+                with concurrent.futures.ProcessPoolExecutor(1) as executor:
+                    values, mapped = executor.submit(attach, "test", root).result()
+                self.assertEqual(values, [(1, [1.1]), (2, []), (3, [3.3, 3.3])])
+                self.assertTrue(mapped)
+
+            db.unlink()
+            self.assertEqual(os.listdir(root), [])
+
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import shutil
+
+import unittest
+
+from oamap.schema import *
+import oamap.database
+from oamap.backend.sqlite import *
+
+class TestBackendSQLite(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def test_database(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.db")
+            db = SQLiteBlobDatabase(path)
+            db.fromdata("one", List(Record({"x": "int32", "y": "float64"})), [{"x": 1, "y": 1.1}, {"x": 2, "y": 2.2}, {"x": 3, "y": 3.3}], [{"x": 4, "y": 4.4}, {"x": 5, "y": 5.5}, {"x": 6, "y": 6.6}])
+
+            db.data.two = db.data.one.define("z", lambda obj: obj.x + obj.y)
+
+            self.assertEqual([(obj.x, obj.y, obj.z) for obj in db.data.two], [(1, 1.1, 2.1), (2, 2.2, 4.2), (3, 3.3, 6.3), (4, 4.4, 8.4), (5, 5.5, 10.5), (6, 6.6, 12.6)])
+            self.assertEqual(db.list(), ["one", "two"])
+            self.assertEqual(db.data.two.numpartitions, 2)
+
+            del db.data.one
+            self.assertEqual([(obj.x, obj.z) for obj in db.data.two], [(1, 2.1), (2, 4.2), (3, 6.3), (4, 8.4), (5, 10.5), (6, 12.6)])
+            del db.data.two
+            self.assertEqual(db.list(), [])
+
+            # no dataset refers to any array anymore
+            self.assertEqual(db[""]._sql().execute("SELECT COUNT(*) FROM arrays").fetchone()[0], 0)
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_reopen(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.db")
+            db = SQLiteBlobDatabase(path)
+            db.fromdata("one", List(Record({"x": "int32", "y": List("float64")})), [{"x": 1, "y": [1.1]}, {"x": 2, "y": []}, {"x": 3, "y": [3.3, 3.3]}])
+            db.fromdata("two", List("int32"), [4, 5])
+
+            db2 = oamap.database.SQLiteDatabase(path)
+            self.assertEqual(db2[""], SQLiteBackend(path))
+            self.assertEqual(db2.list(), ["one", "two"])
+            self.assertEqual([(obj.x, list(obj.y)) for obj in db2.data.one], [(1, [1.1]), (2, []), (3, [3.3, 3.3])])
+            self.assertRaises(KeyError, lambda: db2.data.three)
+
+            db2.fromdata("two", List("int32"), [6, 7, 8])
+            self.assertEqual(list(db.data.two), [6, 7, 8])
+
+            del db.data.one
+            del db.data.two
+            self.assertEqual(db2.list(), [])
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_transaction(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.db")
+            db = SQLiteBlobDatabase(path)
+            db.fromdata("one", List("int32"), [1, 2, 3])
+            def bad(ds):
+                raise RuntimeError("fail in the middle")
+            original, db._decref = db._decref, bad
+            self.assertRaises(RuntimeError, lambda: db.delete("one"))
+            db._decref = original
+
+            # the failed delete left both the record and its arrays in place
+            self.assertEqual(db.list(), ["one"])
+            self.assertEqual(list(db.data.one), [1, 2, 3])
+
+            del db.data.one
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_concurrent_replace(self):
+        try:
+            import concurrent.futures
+        except ImportError:
+            return
+        import threading
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.db")
+            db = SQLiteBlobDatabase(path)
+            db.fromdata("base", List(Record({"x": "int32"})), [{"x": 1}, {"x": 2}, {"x": 3}])
+            db.data.out = db.data.base.define("y", lambda obj: obj.x + 0.5)
+
+            # one writer's put is still running when another Database replaces the same dataset
+            release = threading.Event()
+            def slow(obj):
+                release.wait()
+                return obj.x * 10.0
+            with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                db1 = oamap.database.SQLiteDatabase(path, executor=executor)
+                db1.put("out", db1.data.base.define("z", slow))
+
+                db2 = oamap.database.SQLiteDatabase(path)
+                db2.data.out = db2.data.base.define("w", lambda obj: obj.x - 0.5)
+
+                release.set()
+                self.assertEqual([obj.z for obj in db1.get("out")], [10.0, 20.0, 30.0])
+
+            # the last commit wins and each replaced dataset was released exactly once
+            self.assertEqual([(obj.x, obj.z) for obj in db2.data.out], [(1, 10.0), (2, 20.0), (3, 30.0)])
+            names = [name for name, in db._sql().execute("SELECT name FROM arrays").fetchall()]
+            self.assertTrue(any(x.startswith("out-L-Fz") for x in names))
+            self.assertFalse(any(x.startswith("out-L-Fy") or x.startswith("out-L-Fw") for x in names))
+
+            del db.data.out
+            del db.data.base
+            self.assertEqual(db._sql().execute("SELECT COUNT(*) FROM arrays").fetchone()[0], 0)
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_commit_without_get(self):
+        try:
+            import concurrent.futures
+        except ImportError:
+            return
+        import threading
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "test.db")
+            db = SQLiteBlobDatabase(path)
+            db.fromdata("base", List(Record({"x": "int32"})), [{"x": 1}, {"x": 2}, {"x": 3}])
+
+            release = threading.Event()
+            def slow(obj):
+                release.wait()
+                return obj.x * 10
+            with concurrent.futures.ThreadPoolExecutor(1) as executor:
+                db1 = oamap.database.SQLiteDatabase(path, executor=executor)
+                db1.put("out", db1.data.base.define("z", slow))
+                try:
+                    # a put still running times out like a missing dataset
+                    self.assertRaises(KeyError, lambda: db1.get("out", timeout=0.05))
+                finally:
+                    release.set()
+
+            # the put was committed when its tasks finished, though db1 never asked for it
+            db2 = oamap.database.SQLiteDatabase(path)
+            self.assertEqual(db2.list(), ["base", "out"])
+            self.assertEqual([obj.z for obj in db2.data.out], [10, 20, 30])
+
+            del db.data.out
+            del db.data.base
+            self.assertEqual(db._sql().execute("SELECT COUNT(*) FROM arrays").fetchone()[0], 0)
+
+        finally:
+            shutil.rmtree(tmpdir)
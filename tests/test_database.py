@@ -167,3 +167,26 @@ class TestDatabase(unittest.TestCase):
 
         self.assertEqual(len(db._backends[db._namespace]._refcounts.get(0, {})), 0)
         self.assertEqual(len(db._backends[db._namespace]._refcounts.get(1, {})), 0)
+
+    def test_fromsources(self):
+        schema = List(Record({"x": "int32", "y": List("float64")}))
+        sources = [[{"x": 3*i + j, "y": [1.1]*j} for j in range(3)] for i in range(3)]
+
+        db = InMemoryDatabase()
+        db.fromsources("one", schema, sources)
+        self.assertEqual([obj.x for obj in db.data.one], list(range(9)))
+        self.assertEqual([len(obj.y) for obj in db.data.one], [0, 1, 2]*3)
+
+        try:
+            import concurrent.futures
+        except ImportError:
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            db.fromsources("two", schema, sources, executor=executor)
+        self.assertEqual([obj.x for obj in db.data.two], list(range(9)))
+
+        # partitions filled in other processes can't be collected into an in-memory DictBackend
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            self.assertRaises(ValueError, lambda: db.fromsources("three", schema, sources, executor=executor))
+        self.assertEqual(sorted(db.list()), ["one", "two"])
@@ -111,3 +111,17 @@ class TestFill(unittest.TestCase):
         self.assertEqual(value.next.next.next.next.label, columnar.next.next.next.next.label)
         self.assertEqual(value.next.next.next.next.next.label, columnar.next.next.next.next.next.label)
         self.assertEqual(value.next.next.next.next.next.next.label, columnar.next.next.next.next.next.next.label)
+
+    def test_fromiterdata_limits(self):
+        schema = List(Record({"x": Primitive("i8"), "y": List(Primitive("f8"))}))
+        values = [{"x": i, "y": [1.1]*i} for i in range(10)]
+
+        partitions = list(oamap.fill.fromiterdata(values, schema, limit=oamap.fill.MaxEntries(3)))
+        self.assertEqual([n for n, arrays in partitions], [3, 3, 3, 1])
+        self.assertEqual([x for n, arrays in partitions for x in oamap.proxy.tojson(schema(arrays))], values)
+
+        # same result from the built-in limit (running totals) and an equivalent per-array callback
+        fast = list(oamap.fill.fromiterdata(values, schema, limit=oamap.fill.MaxBytes(100)))
+        slow = list(oamap.fill.fromiterdata(values, schema, limit=lambda entries, arrayitems, arraybytes: sum(arraybytes.values()) <= 100))
+        self.assertEqual([n for n, arrays in fast], [n for n, arrays in slow])
+        self.assertEqual([x for n, arrays in fast for x in oamap.proxy.tojson(schema(arrays))], values)
@@ -246,6 +246,57 @@ class TestFillable(unittest.TestCase):
         a.update()
         self.assertEqual(a[:].tolist(), data)
 
+    def test_FillableContiguousArray1(self):
+        data = [0.0, 1.1, 2.2, 3.3, 4.4, 5.5, 6.6, 7.7, 8.8, 9.9]
+        a = FillableContiguousArray("f8", initialsize=3)
+        self.assertEqual(a[:].tolist(), [])
+        a.append(data[0])
+        self.assertEqual(a[:].tolist(), [])
+        a.append(data[1])
+        a.append(data[2])
+        a.append(data[3])
+        a.update()
+        self.assertEqual(a[:].tolist(), data[:4])
+        a.extend(data[4:])
+        a.update()
+        self.assertTrue(a.capacity >= 10)
+        self.assertEqual(a[:].tolist(), data)
+        self.assertTrue(a[:].base is a._data)
+        self.assertEqual(a[2:].tolist(), data[2:])
+        self.assertEqual(a[:-2].tolist(), data[:-2])
+        self.assertEqual(a[3::3].tolist(), data[3::3])
+        self.assertEqual(a[::-2].tolist(), data[::-2])
+        self.assertEqual(a[8:1:-2].tolist(), data[8:1:-2])
+        self.assertEqual(a[-1], data[-1])
+        self.assertRaises(IndexError, lambda: a[10])
+
+    def test_FillableContiguousArray2(self):
+        data = [0.0, 1.1, 2.2, 3.3, 4.4, 5.5, 6.6, 7.7, 8.8, 9.9]
+        a = FillableContiguousArray("f8", initialsize=2)
+        a.append(data[0])
+        a.append(data[1])
+        a.update()
+        view = a[:]
+        self.assertEqual(view.tolist(), data[:2])
+        a.append(999)
+        self.assertEqual(a[:].tolist(), data[:2])
+        a.revert()
+        self.assertEqual(a[:].tolist(), data[:2])
+        a.append(data[2])
+        a.update()
+        self.assertEqual(a[:].tolist(), data[:3])
+        a.extend([999, 999, 999, 999])
+        self.assertEqual(a[:].tolist(), data[:3])
+        a.revert()
+        self.assertEqual(a[:].tolist(), data[:3])
+        a.extend(data[3:5])
+        a.update()
+        self.assertEqual(a[:].tolist(), data[:5])
+        a.extend(data[5:])
+        a.update()
+        self.assertEqual(a[:].tolist(), data)
+        self.assertEqual(view.tolist(), data[:2])
+
     def test_FillableFile1(self):
         filename = tempfile.mktemp()
         try:
@@ -705,3 +756,123 @@ class TestFillable(unittest.TestCase):
             self.assertEqual(a[:].tolist(), data)
         finally:
             os.remove(filename)
+
+    def test_FillableFileBackground(self):
+        for cls in FillableFile, FillableNumpyFile:
+            filename = tempfile.mktemp()
+            try:
+                data = [0.0, 1.1, 2.2, 3.3, 4.4, 5.5, 6.6, 7.7, 8.8, 9.9]
+                a = cls(filename, "f8", chunksize=2, background=1)
+                a.append(data[0])
+                a.update()
+                self.assertEqual(a[:].tolist(), data[:1])
+                a.extend([999, 999, 999, 999, 999])
+                self.assertEqual(a[:].tolist(), data[:1])
+                a.revert()
+                self.assertEqual(a[:].tolist(), data[:1])
+                a.extend(data[1:7])
+                a.update()
+                self.assertEqual(a[:].tolist(), data[:7])
+                self.assertEqual(a[3], data[3])
+                self.assertEqual(a[-1], data[6])
+                a.extend(data[7:])
+                a.update()
+                a.close()
+                self.assertEqual(a[:].tolist(), data)
+                self.assertEqual(a[5], data[5])
+                if cls is FillableNumpyFile:
+                    self.assertTrue(self.array_equal(a[:], filename))
+            finally:
+                os.remove(filename)
+
+    def test_FillableMemmapFile(self):
+        filename = tempfile.mktemp()
+        try:
+            data = [0.0, 1.1, 2.2, 3.3, 4.4, 5.5, 6.6, 7.7, 8.8, 9.9]
+            a = FillableMemmapFile(filename, "f8", initialsize=3)
+            self.assertEqual(a[:].tolist(), [])
+            a.append(data[0])
+            a.append(data[1])
+            a.update()
+            self.assertEqual(a[:].tolist(), data[:2])
+            a.extend([999, 999, 999, 999])
+            self.assertEqual(a[:].tolist(), data[:2])
+            a.revert()
+            self.assertEqual(a[:].tolist(), data[:2])
+            a.extend(data[2:])
+            a.update()
+            self.assertTrue(a.capacity >= 10)
+            self.assertEqual(a[:].tolist(), data)
+            self.assertEqual(a[-1], data[-1])
+            self.assertEqual(a[8:2:-2].tolist(), data[8:2:-2])
+            a.append(999)
+            a.close()
+            self.assertEqual(os.path.getsize(filename), 10*8)
+            self.assertEqual(numpy.fromfile(filename, "f8").tolist(), data)
+            self.assertEqual(a[:].tolist(), data)
+        finally:
+            os.remove(filename)
+
+    def test_FillableMemmapNumpyFile(self):
+        filename = tempfile.mktemp()
+        try:
+            data = [0.0, 1.1, 2.2, 3.3, 4.4, 5.5, 6.6, 7.7, 8.8, 9.9]
+            a = FillableMemmapNumpyFile(filename, "f8", initialsize=3)
+            self.assertEqual(a[:].tolist(), [])
+            self.assertTrue(self.array_equal(a[:], filename))
+            a.append(data[0])
+            a.append(data[1])
+            a.update()
+            a.flush()
+            self.assertTrue(self.array_equal(a[:], filename))
+            a.append(999)
+            a.revert()
+            a.extend(data[2:5])
+            a.update()
+            writes = []
+            a._writelength = lambda: writes.append(len(a))
+            self.assertEqual(a[:].tolist(), data[:5])
+            self.assertEqual([a[i] for i in range(5)], data[:5])
+            self.assertEqual(writes, [])          # reading doesn't touch the header
+            del a._writelength
+            a.flush()
+            self.assertTrue(self.array_equal(a[:], filename))
+            self.assertEqual(a[:].tolist(), data[:5])
+            a.extend(data[5:])
+            a.update()
+            a.close()
+            self.assertTrue(self.array_equal(a[:], filename))
+            self.assertEqual(a[:].tolist(), data)
+        finally:
+            os.remove(filename)
+
+    def test_FillableCompressedFile(self):
+        for compression in "zlib", "lzma":
+            filename = tempfile.mktemp()
+            try:
+                data = [0.0, 1.1, 2.2, 3.3, 4.4, 5.5, 6.6, 7.7, 8.8, 9.9]
+                a = FillableCompressedFile(filename, "f8", chunksize=3, compression=compression)
+                self.assertEqual(a[:].tolist(), [])
+                a.append(data[0])
+                a.append(data[1])
+                a.update()
+                self.assertEqual(a[:].tolist(), data[:2])
+                a.extend([999, 999, 999, 999, 999])
+                self.assertEqual(a[:].tolist(), data[:2])
+                a.revert()
+                self.assertEqual(a[:].tolist(), data[:2])
+                a.extend(data[2:8])
+                a.update()
+                self.assertEqual(a[:].tolist(), data[:8])
+                a.extend(data[8:])
+                a.update()
+                a.append(999)
+                a.close()
+                self.assertEqual(a[:].tolist(), data)
+                self.assertEqual(a[4], data[4])
+                self.assertEqual(a[-1], data[-1])
+                self.assertEqual(a[1::2].tolist(), data[1::2])
+                self.assertEqual(a[8:1:-3].tolist(), data[8:1:-3])
+                self.assertEqual(a[5:5].tolist(), [])
+            finally:
+                os.remove(filename)
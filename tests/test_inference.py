@@ -476,3 +476,50 @@ class TestInference(unittest.TestCase):
         value["next"]["next"]["next"] = value
 
         self.assertTrue(value in linkedlist)        
+
+    def test_fromiterdata(self):
+        data = [{"one": i, "two": [1.1]*i} for i in range(100)] + [None, {"one": 3.14, "two": []}]
+        self.assertEqual(oamap.inference.fromiterdata(iter(data)), oamap.inference.fromdata(data))
+        self.assertEqual(oamap.inference.fromiterdata(data, first=10), oamap.inference.fromdata(data[:10]))
+        self.assertEqual(oamap.inference.fromiterdata(data, first=0, sample=len(data)), oamap.inference.fromdata(data))
+        self.assertEqual(list(oamap.inference._sampled(data, 0, 0, None)), [])
+        self.assertEqual(list(oamap.inference._sampled(data, 0, None, None)), [])
+        self.assertEqual(list(oamap.inference._sampled(data, 3, 0, None)), data[:3])
+        sampled = oamap.inference.fromiterdata(data, first=5, sample=3, seed=12345)
+        self.assertEqual(sampled, oamap.inference.fromiterdata(data, first=5, sample=3, seed=12345))
+        self.assertEqual(set(sampled.content.fields), set(["one", "two"]))
+        self.assertEqual(oamap.inference.fromdata(data, limit=10), oamap.inference.fromdata(data[:10]))
+
+        try:
+            import concurrent.futures
+        except ImportError:
+            return
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            self.assertEqual(oamap.inference.fromiterdata(data, executor=executor, chunksize=7), oamap.inference.fromdata(data))
+
+    def test_unifyall(self):
+        def intermediates(objs):
+            return [oamap.inference.buildintermediate(x, None, set()) for x in objs]
+        def union(objs):
+            return oamap.inference.unify(intermediates(objs))
+
+        # streaming and all-at-once unification agree, including the order of union possibilities
+        for objs in ([1], [1, "a"], [1, "a", True], [1, "a", True, "b", 2.5], [None, [1], {"x": 1}, [2.2], "a"]):
+            for extra in ([], [union([[1], {"x": 1}])], [union([True, "a"]), union([[1], 3])]):
+                one = oamap.inference.unify(intermediates(objs) + extra)
+                two = oamap.inference.unifyall(iter(intermediates(objs) + extra))
+                self.assertEqual(one.resolve(), two.resolve())
+
+        # possibilities are in order of first appearance, with a union's possibilities in the union's place
+        # (before, unify put the possibilities of unions first; inference from data never passes it a union)
+        self.assertEqual(oamap.inference.unify(intermediates([1, "a"]) + [union([[1], {"x": 1}])]).resolve(), oamap.inference.fromdata([1, "a", [1], {"x": 1}]).content)
+        self.assertEqual(oamap.inference.fromdata([1, "a", [1], {"x": 1}]).content, Union(["u1", List("u1", name="UTF8String"), List("u1"), Record({"x": "u1"})]))
+
+    def test_fromnames(self):
+        linkedlist = Record({"label": Primitive("i8")})
+        linkedlist["next"] = Pointer(linkedlist, nullable=True)
+        external = List(Pointer(Record({"a": "f8", "b": List("i4")})))
+        wide = List(Record(dict(("f{0}".format(i), List(Record({"x": "f8", "y": Union(["i4", Tuple(["f8", List("u1", nullable=True)])])}, name="Foo"))) for i in range(100))))
+        for schema in linkedlist, external, wide:
+            self.assertEqual(oamap.inference.fromnames(oamap.fillable.arrays(schema).keys()), schema)
+            self.assertEqual(oamap.inference.fromnames(oamap.fillable.arrays(schema.generator(prefix="x", delimiter="/")).keys(), prefix="x", delimiter="/"), schema)
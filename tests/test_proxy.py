@@ -30,6 +30,8 @@
 
 import unittest
 
+import numpy
+
 import oamap.proxy
 from oamap.schema import *
 
@@ -254,3 +256,86 @@ class TestProxy(unittest.TestCase):
         self.assertEqual(x.next.label, 1)
         self.assertEqual(x.next.next.label, 2)
         self.assertEqual(x.next.next.next, None)
+
+    def test_generator_cache(self):
+        linkedlist = Record({"label": Primitive("i8")})
+        linkedlist["next"] = Pointer(linkedlist, nullable=True)
+
+        one = linkedlist.generator()
+        two = linkedlist.generator()
+        self.assertIsNot(one, two)
+        self.assertNotEqual(one.id, two.id)
+        self.assertIs(two.fields["next"].target, two)
+        self.assertEqual(two.schema, linkedlist)
+        self.assertEqual(two.fields["next"].positions, one.fields["next"].positions)
+
+        # changing the schema after it has been cached must not return the old generator
+        linkedlist["label"].dtype = "f8"
+        three = linkedlist.generator()
+        self.assertEqual(three.fields["label"].dtype, numpy.dtype("f8"))
+        self.assertEqual(two.fields["label"].dtype, numpy.dtype("i8"))
+        self.assertEqual(linkedlist.generator(prefix="other").fields["label"].data, "other-Flabel-Df8")
+
+        # each generator handed out has its own schemas, so changing them can't reach the cache or other generators
+        self.assertIsNot(three.schema, linkedlist.generator().schema)
+        self.assertIs(three.fields["next"].schema.target, three.schema)
+        three.schema["label"].dtype = "i4"
+        four = linkedlist.generator()
+        self.assertEqual(four.schema["label"].dtype, numpy.dtype("f8"))
+        self.assertEqual(four.fields["label"].dtype, numpy.dtype("f8"))
+
+    def test_schema_hash(self):
+        one = Record({"x": List("f8"), "y": Union(["i4", Tuple(["f8", "bool"])])})
+        two = Record({"y": Union(["i4", Tuple(["f8", "bool"])]), "x": List("f8")})
+        self.assertEqual(hash(one), hash(two))
+        self.assertEqual(one, two)
+
+        # mutations through setters and item assignment invalidate the cached hashes
+        two["x"].content.nullable = True
+        self.assertNotEqual(hash(one), hash(two))
+        self.assertNotEqual(one, two)
+        two["x"].content = Primitive("f8")
+        self.assertEqual(one, two)
+        two["y"][1] = Tuple(["f8", "bool", "bool"])
+        self.assertNotEqual(hash(one), hash(two))
+        self.assertNotEqual(one, two)
+        del one["y"]
+        del two["y"]
+        self.assertEqual(hash(one), hash(two))
+
+        # cycles through Pointers
+        linkedlist1 = Record({"label": Primitive("i8")})
+        linkedlist1["next"] = Pointer(linkedlist1)
+        linkedlist2 = Record({"label": Primitive("i8")})
+        linkedlist2["next"] = Pointer(linkedlist2)
+        self.assertEqual(hash(linkedlist1), hash(linkedlist2))
+        self.assertEqual(linkedlist1, linkedlist2)
+        linkedlist2["label"].dtype = "i4"
+        self.assertNotEqual(linkedlist1, linkedlist2)
+
+        # nodes on the cycle aren't cached themselves, but changing them invalidates the root's cached hash
+        linkedlist3 = Record({"label": Primitive("i8")})
+        linkedlist3["next"] = Pointer(linkedlist3)
+        hash(linkedlist1)
+        linkedlist1["next"].nullable = True
+        linkedlist3["next"].nullable = True
+        self.assertEqual(hash(linkedlist1), hash(linkedlist3))
+        self.assertEqual(linkedlist1, linkedlist3)
+
+        # a node shared by several schemas invalidates all of them, and nothing else
+        shared = List("f8")
+        three = Record({"x": shared})
+        four = Tuple([shared, "i4"])
+        other = Record({"x": List("f8")})
+        hashes = hash(three), hash(four), hash(other)
+        shared.content.nullable = True
+        self.assertNotEqual(hash(three), hashes[0])
+        self.assertNotEqual(hash(four), hashes[1])
+        self.assertEqual(other.__dict__["_hashcache"], hashes[2])
+        self.assertEqual(three, Record({"x": List(Primitive("f8", nullable=True))}))
+
+        # pickled and copied schemas leave the caches behind
+        import copy
+        import pickle
+        self.assertEqual(pickle.loads(pickle.dumps(three)), three)
+        self.assertNotIn("_hashparents", copy.deepcopy(three)["x"].__dict__)